@@ -0,0 +1,362 @@
+# benchmarks/run.py
+"""Offline benchmarks against the local fixture server.
+
+Run from the project directory, e.g.:
+
+    python -m benchmarks.run http --products 200
+    python -m benchmarks.run amazon walmart --no-http-first --latency 0.2
+    python -m benchmarks.run amazon --no-http-first --no-early-exit   # baseline for early exit
+    python -m benchmarks.run main main-async --block-rate 0.05
+
+Every run is appended to benchmarks/results/history.jsonl and compared
+with the previous run of the same scenario and settings.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_DIR not in sys.path:
+    sys.path.insert(0, PROJECT_DIR)
+
+from benchmarks.server import FixtureServer  # noqa: E402
+from utils.watchdog import tree_usage  # noqa: E402
+
+RESULTS_DIR = os.path.join(PROJECT_DIR, 'benchmarks', 'results')
+HISTORY_FILE = os.path.join(RESULTS_DIR, 'history.jsonl')
+SCENARIOS = ['http', 'amazon', 'walmart', 'main', 'main-async']
+
+# Flag a regression when throughput drops or p95 grows by more than this
+REGRESSION_THRESHOLD = 0.10
+
+
+def make_products(server, count, sites=('Amazon', 'Walmart')):
+    """Products on the fixture server, alternating between sites"""
+    products = []
+    for index in range(count):
+        site = sites[index % len(sites)]
+        product_id = f"B{index:09d}" if site == 'Amazon' else str(100000 + index)
+        products.append({
+            'name': f"Benchmark {site} Product {product_id}",
+            'url': server.product_url(site, product_id),
+            'target_price': 1.00,  # below every fixture price, so no alerts fire
+            'site': site,
+        })
+    return products
+
+
+class RssSampler:
+    """Background sampler of peak RSS for this process and its browser children"""
+
+    def __init__(self, interval=0.2):
+        self.interval = interval
+        self.available = os.path.isdir('/proc')
+        self.peak_browser_kb = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            usage = tree_usage(os.getpid())
+            self.peak_browser_kb = max(self.peak_browser_kb, usage['rss_bytes'] // 1024)
+
+    def __enter__(self):
+        if self.available:
+            self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        if self.available:
+            self.thread.join()
+
+
+class PhaseTimer:
+    """Latency samples per phase"""
+
+    def __init__(self):
+        self.samples = {}
+
+    def record(self, phase, seconds):
+        self.samples.setdefault(phase, []).append(seconds)
+
+    def summary(self):
+        result = {}
+        for phase, values in self.samples.items():
+            values = np.asarray(values) * 1000
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            result[phase] = {'count': len(values), 'mean_ms': round(float(values.mean()), 2),
+                             'p50_ms': round(float(p50), 2), 'p95_ms': round(float(p95), 2),
+                             'p99_ms': round(float(p99), 2)}
+        return result
+
+
+def isolate(workdir, http_first, early_exit=True):
+    """Keep benchmark runs away from the real data files, alerts and pacing"""
+    from config import settings
+    from utils.fetch_cache import FetchCache
+    from utils.http_fetcher import HttpPriceFetcher
+
+    # Fresh in-memory fetch cache per run (and not saved over data/fetch_cache.json)
+    FetchCache._shared = FetchCache(path=None, ttl=settings.FETCH_CACHE_TTL)
+    HttpPriceFetcher._shared = None
+    # The fixture server is one host; measure the scrapers, not the rate limiter
+    settings.DEFAULT_DOMAIN_LIMIT = {'rate': 1000, 'burst': 1000, 'concurrency': 1000}
+    settings.DOMAIN_LIMITS = {}
+    settings.HTTP_FIRST = http_first
+    settings.NAVIGATION_EARLY_EXIT = early_exit
+    settings.ALERT_STATE_FILE = os.path.join(workdir, 'alert_state.json')
+    settings.ARCHIVE_DIR = os.path.join(workdir, 'archive')
+    settings.SESSION_DIR = os.path.join(workdir, 'sessions')
+
+
+def outcome_of(result):
+    from utils.scheduler import failure_kind
+
+    if result.get('success') and result.get('price'):
+        return result.get('tier', 'browser')
+    return 'blocked' if failure_kind(result) == 'blocked' else 'failed'
+
+
+def bench_http(products, timer, args):
+    """HTTP tier only - no browser"""
+    from utils.http_fetcher import HttpPriceFetcher
+
+    fetcher = HttpPriceFetcher.shared()
+    outcomes = {}
+    for product in products:
+        start = time.perf_counter()
+        result = fetcher.get_price(product['url'], product['site']) or {'success': False}
+        timer.record(f"fetch:{outcome_of(result)}", time.perf_counter() - start)
+        outcomes[outcome_of(result)] = outcomes.get(outcome_of(result), 0) + 1
+    return outcomes
+
+
+def bench_scraper(site, products, timer, args):
+    """One site's scraper class end to end (HTTP tier, then browser)"""
+    from scrapers import registry
+
+    products = [product for product in products if product['site'] == site]
+    scraper = registry.scraper_class(site)(headless=True, http_first=args.http_first, delay=None)
+    outcomes = {}
+    start = time.perf_counter()
+    scraper.start()
+    timer.record('browser_start', time.perf_counter() - start)
+    try:
+        for product in products:
+            start = time.perf_counter()
+            result = scraper.get_price(product['url'])
+            timer.record(f"get_price:{outcome_of(result)}", time.perf_counter() - start)
+            outcomes[outcome_of(result)] = outcomes.get(outcome_of(result), 0) + 1
+    finally:
+        scraper.close()
+    return outcomes
+
+
+def bench_main(products, timer, args, workdir, use_async):
+    """main.run_sequential / run_async with a throwaway store"""
+    import main
+    from config import settings
+    from utils.alerts import AlertDispatcher
+    from utils.session_store import SessionStore
+    from utils.storage import open_store
+
+    settings.PRODUCTS = products
+    settings.CATALOG_FILE = None
+    main.REQUEST_DELAY = None
+    main._store = open_store('sqlite', path=os.path.join(workdir, 'history.db'))
+    main._alerts = AlertDispatcher(digest_window=0)
+
+    outcomes = {}
+    handle_result = main.handle_result
+
+    def timed_handle_result(product, result):
+        outcomes[outcome_of(result)] = outcomes.get(outcome_of(result), 0) + 1
+        start = time.perf_counter()
+        handle_result(product, result)
+        timer.record('handle_result', time.perf_counter() - start)
+
+    # Every blocked page must burn its session; count the drops to check
+    invalidated = []
+    invalidate = SessionStore.invalidate
+
+    def counted_invalidate(store, session):
+        invalidated.append(session['site'])
+        invalidate(store, session)
+
+    main.handle_result = timed_handle_result
+    SessionStore.invalidate = counted_invalidate
+    try:
+        if use_async:
+            main.run_async()
+        else:
+            main.run_sequential()
+        start = time.perf_counter()
+        main._store.flush()
+        timer.record('flush', time.perf_counter() - start)
+    finally:
+        main.handle_result = handle_result
+        SessionStore.invalidate = invalidate
+        main.close_alerts()
+        main._store.close()
+        main._store = None
+    outcomes['sessions_invalidated'] = len(invalidated)
+    return outcomes
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_DIR,
+                              capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_scenario(scenario, args):
+    server = FixtureServer(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                           block_rate=args.block_rate, price_drift=args.price_drift,
+                           pad_kb=args.pad_kb, seed=args.seed)
+    timer = PhaseTimer()
+    with server, tempfile.TemporaryDirectory() as workdir, RssSampler() as sampler:
+        isolate(workdir, args.http_first, args.early_exit)
+        products = make_products(server, args.products)
+        outcomes = {}
+        start = time.perf_counter()
+        for _ in range(args.rounds):
+            if scenario == 'http':
+                counts = bench_http(products, timer, args)
+            elif scenario in ('amazon', 'walmart'):
+                counts = bench_scraper(scenario.capitalize(), products, timer, args)
+            else:
+                counts = bench_main(products, timer, args, workdir, scenario == 'main-async')
+            for outcome, count in counts.items():
+                outcomes[outcome] = outcomes.get(outcome, 0) + count
+        elapsed = time.perf_counter() - start
+    invalidated = outcomes.pop('sessions_invalidated', None)
+
+    pages = sum(len(values) for phase, values in timer.samples.items()
+                if phase.startswith(('fetch:', 'get_price:')) or phase == 'handle_result')
+    return {
+        'scenario': scenario,
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'revision': git_revision(),
+        'config': {
+            'products': args.products, 'rounds': args.rounds, 'http_first': args.http_first,
+            'early_exit': args.early_exit,
+            'latency': args.latency, 'jitter': args.jitter, 'error_rate': args.error_rate,
+            'block_rate': args.block_rate, 'price_drift': args.price_drift, 'pad_kb': args.pad_kb,
+        },
+        'pages': pages,
+        'elapsed_s': round(elapsed, 3),
+        'pages_per_sec': round(pages / elapsed, 2) if elapsed else None,
+        'outcomes': outcomes,
+        'sessions': None if invalidated is None else {'blocked': outcomes.get('blocked', 0),
+                                                      'invalidated': invalidated},
+        'phases': timer.summary(),
+        'rss_mb': {
+            'python_peak': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            'browser_peak': round(sampler.peak_browser_kb / 1024, 1) if sampler.available else None,
+        },
+        'bytes': {
+            'served': server.stats['bytes_sent'],
+            'per_page': round(server.stats['bytes_sent'] / pages) if pages else None,
+        },
+        'server': dict(server.stats),
+    }
+
+
+def previous_result(result):
+    """Last stored run of the same scenario and settings"""
+    if not os.path.exists(HISTORY_FILE):
+        return None
+    previous = None
+    with open(HISTORY_FILE) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if entry['scenario'] == result['scenario'] and entry['config'] == result['config']:
+                previous = entry
+    return previous
+
+
+def store_result(result):
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    with open(HISTORY_FILE, 'a') as f:
+        f.write(json.dumps(result) + '\n')
+
+
+def print_result(result, previous):
+    def delta(new, old, lower_is_better=False):
+        if not old or new is None:
+            return ''
+        change = (new - old) / old
+        worse = change > REGRESSION_THRESHOLD if lower_is_better else change < -REGRESSION_THRESHOLD
+        return f" ({change:+.0%} vs {previous['revision'] or 'previous'}{' ⚠️ regression' if worse else ''})"
+
+    print(f"\n{'='*60}")
+    print(f"📏 {result['scenario']}: {result['pages']} pages in {result['elapsed_s']:.2f}s "
+          f"= {result['pages_per_sec']} pages/sec"
+          f"{delta(result['pages_per_sec'], previous and previous['pages_per_sec'])}")
+    print(f"   outcomes: {result['outcomes']}")
+    for phase, stats in sorted(result['phases'].items()):
+        old = previous and previous['phases'].get(phase, {}).get('p95_ms')
+        print(f"   {phase:<22} n={stats['count']:<5} p50 {stats['p50_ms']:>8.1f} ms  "
+              f"p95 {stats['p95_ms']:>8.1f} ms  p99 {stats['p99_ms']:>8.1f} ms"
+              f"{delta(stats['p95_ms'], old, lower_is_better=True)}")
+    sessions = result.get('sessions')
+    if sessions and sessions['invalidated'] < sessions['blocked']:
+        print(f"   ⚠️ {sessions['blocked']} blocked results but only {sessions['invalidated']} "
+              f"sessions invalidated - blocked sessions are being kept")
+    elif sessions:
+        print(f"   sessions: {sessions['invalidated']} invalidated for {sessions['blocked']} blocked results")
+    browser = result['rss_mb']['browser_peak']
+    print(f"   RSS peak: python {result['rss_mb']['python_peak']} MB, "
+          f"browser {browser if browser is not None else 'n/a'} MB")
+    print(f"   bytes served: {result['bytes']['served'] / 1_000_000:.1f} MB "
+          f"({result['bytes']['per_page']} per page)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline scraper benchmarks")
+    parser.add_argument('scenarios', nargs='*', default=['http'], metavar='scenario',
+                        help=f"what to drive: {', '.join(SCENARIOS)} (default http)")
+    parser.add_argument('--products', type=int, default=100)
+    parser.add_argument('--rounds', type=int, default=1, help="passes over the product list")
+    parser.add_argument('--no-http-first', dest='http_first', action='store_false',
+                        help="skip the HTTP tier so every page goes through the browser")
+    parser.add_argument('--no-early-exit', dest='early_exit', action='store_false',
+                        help="wait for the full load event on every product page (NAVIGATION_EARLY_EXIT off)")
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--jitter', type=float, default=0.02)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--block-rate', type=float, default=0.0)
+    parser.add_argument('--price-drift', type=float, default=0.0)
+    parser.add_argument('--pad-kb', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--no-save', dest='save', action='store_false',
+                        help="don't append the results to the history file")
+    args = parser.parse_args()
+    unknown = [scenario for scenario in args.scenarios if scenario not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+
+    for scenario in args.scenarios:
+        result = run_scenario(scenario, args)
+        print_result(result, previous_result(result))
+        if args.save:
+            store_result(result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+# benchmarks/server.py
+import argparse
+import hashlib
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# Path -> (site, product page fixture, block page fixture)
+ROUTES = [
+    (re.compile(r'^/amazon/dp/([A-Z0-9]{10})$'), 'Amazon', 'amazon_product.html', 'amazon_captcha.html'),
+    (re.compile(r'^/walmart/ip/[^/]+/(\d+)$'), 'Walmart', 'walmart_product.html', 'walmart_blocked.html'),
+]
+
+# Sub-resources the fixture pages reference, so a browser has something to fetch (or block)
+STATIC_TYPES = {
+    '.css': ('text/css', 4000),
+    '.js': ('application/javascript', 20000),
+    '.jpg': ('image/jpeg', 60000),
+    '.jpeg': ('image/jpeg', 60000),
+}
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), encoding='utf-8') as f:
+        return f.read()
+
+
+class FixtureServer:
+    """Local stand-in for Amazon/Walmart product pages.
+
+    Serves the recorded fixtures with simulated latency (latency +/- jitter
+    seconds), a share of 503 errors (error_rate), block/captcha pages
+    (block_rate) and price changes between requests (price_drift). Pages
+    carry an ETag so conditional requests get 304s. Counts requests and
+    bytes sent.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.05, jitter=0.02, error_rate=0.0,
+                 block_rate=0.0, price_drift=0.0, pad_kb=200, etag=True, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.block_rate = block_rate
+        self.price_drift = price_drift
+        self.etag = etag
+        self.random = random.Random(seed)
+        self.fixtures = {name: load_fixture(name) for name in os.listdir(FIXTURES_DIR)}
+        # Real product pages are hundreds of KB; pad the fixtures to match
+        self.padding = ('lorem ipsum dolor sit amet ' * (pad_kb * 40))[:pad_kb * 1024]
+        self.prices = {}
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'products': 0, 'blocked': 0, 'errors': 0,
+                      'not_modified': 0, 'static': 0, 'not_found': 0, 'bytes_sent': 0}
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                server.handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def product_url(self, site, product_id):
+        if site == 'Amazon':
+            return f"{self.base_url}/amazon/dp/{product_id}"
+        return f"{self.base_url}/walmart/ip/benchmark-product/{product_id}"
+
+    def price_of(self, product_id):
+        """Stable price per product, occasionally moved when price_drift is set"""
+        with self.lock:
+            price = self.prices.get(product_id)
+            if price is None:
+                seed = int(hashlib.md5(product_id.encode()).hexdigest()[:8], 16)
+                price = self.prices[product_id] = round(20 + seed % 58000 / 100, 2)
+            elif self.price_drift and self.random.random() < self.price_drift:
+                price = self.prices[product_id] = round(price * self.random.uniform(0.9, 1.1), 2)
+            return price
+
+    def _count(self, key, sent=0):
+        with self.lock:
+            self.stats['requests'] += 1
+            self.stats[key] += 1
+            self.stats['bytes_sent'] += sent
+
+    def _send(self, handler, status, body=b'', content_type='text/html; charset=utf-8', headers=None):
+        handler.send_response(status)
+        handler.send_header('Content-Type', content_type)
+        handler.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        if body:
+            handler.wfile.write(body)
+        return len(body)
+
+    def handle(self, handler):
+        path = handler.path.split('?', 1)[0]
+        extension = os.path.splitext(path)[1]
+        if extension in STATIC_TYPES:
+            content_type, size = STATIC_TYPES[extension]
+            self._count('static', self._send(handler, 200, b'\0' * size, content_type))
+            return
+
+        for pattern, site, product_fixture, block_fixture in ROUTES:
+            match = pattern.match(path)
+            if match:
+                break
+        else:
+            self._count('not_found', self._send(handler, 404, b'Not found'))
+            return
+
+        delay = self.latency + self.random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+        roll = self.random.random()
+        if roll < self.error_rate:
+            self._count('errors', self._send(handler, 503, b'Service Unavailable'))
+            return
+        if roll < self.error_rate + self.block_rate:
+            body = self.fixtures[block_fixture].encode()
+            self._count('blocked', self._send(handler, 200, body))
+            return
+
+        product_id = match.group(1)
+        price = self.price_of(product_id)
+        etag = f'"{product_id}-{price:.2f}"'
+        if self.etag and handler.headers.get('If-None-Match') == etag:
+            self._count('not_modified', self._send(handler, 304, headers={'ETag': etag}))
+            return
+
+        whole, fraction = f"{price:.2f}".split('.')
+        page = (self.fixtures[product_fixture]
+                .replace('{{title}}', f"Benchmark {site} Product {product_id}")
+                .replace('{{price}}', f"{price:.2f}")
+                .replace('{{whole}}', whole)
+                .replace('{{fraction}}', fraction)
+                .replace('{{id}}', product_id)
+                .replace('{{padding}}', self.padding))
+        headers = {'ETag': etag} if self.etag else {}
+        self._count('products', self._send(handler, 200, page.encode(), headers=headers))
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve benchmark fixture pages")
+    parser.add_argument('--port', type=int, default=8400)
+    parser.add_argument('--latency', type=float, default=0.05, help="seconds added to every page")
+    parser.add_argument('--jitter', type=float, default=0.02, help="+/- seconds of random latency")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of 503 responses")
+    parser.add_argument('--block-rate', type=float, default=0.0, help="share of captcha/block pages")
+    parser.add_argument('--price-drift', type=float, default=0.0, help="chance a price moves per request")
+    parser.add_argument('--pad-kb', type=int, default=200, help="page padding in KB")
+    args = parser.parse_args()
+
+    server = FixtureServer(port=args.port, latency=args.latency, jitter=args.jitter,
+                           error_rate=args.error_rate, block_rate=args.block_rate,
+                           price_drift=args.price_drift, pad_kb=args.pad_kb)
+    print(f"🧪 Fixture server on {server.base_url}")
+    print(f"   e.g. {server.product_url('Amazon', 'B0BENCH001')}")
+    print(f"        {server.product_url('Walmart', '100001')}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n🛑 Stopped - {server.stats}")
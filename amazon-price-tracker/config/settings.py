@@ -41,13 +41,174 @@ PRODUCTS = [
     }
 ]
 
+# Large catalogs: stream products from a file instead of PRODUCTS above.
+# .csv / .jsonl with name, url, target_price (site optional - taken from the
+# URL's domain), or a SQLite .db with those columns in CATALOG_TABLE
+CATALOG_FILE = os.getenv("CATALOG_FILE")
+CATALOG_TABLE = "products"
+
 # Email settings
 SMTP_SERVER = "smtp.gmail.com"
 SMTP_PORT = 587
 EMAIL_SENDER = os.getenv("EMAIL_SENDER")
 EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")
 EMAIL_RECEIVER = os.getenv("EMAIL_RECEIVER")
+SMTP_USE_TLS = True              # STARTTLS when the server offers it; off for a local test server
+
+# Alert dispatch: alerts are de-duplicated and sent as one digest per window
+ALERT_DIGEST_WINDOW = 60         # seconds to collect alerts before sending a digest
+ALERT_DEDUPE_TTL = 24 * 60 * 60  # don't repeat an alert for the same product and price within this
+ALERT_MAX_RETRIES = 3
+ALERT_STATE_FILE = "data/alert_state.json"
 
 # File paths
 DATA_FILE = "data/price_history.csv"
-REPORT_FILE = "data/reports/price_report.xlsx"
\ No newline at end of file
+DB_FILE = "data/price_history.db"
+REPORT_FILE = "data/reports/price_report.xlsx"
+REPORT_CHUNK_SIZE = 250000       # history rows read per chunk when building the report
+REPORT_DAILY_DAYS = 90           # days of daily bars per product on each site's sheet
+
+# Price history storage: "sqlite" (WAL, batched commits) or "csv" (append-only)
+STORAGE_BACKEND = "sqlite"
+STORAGE_BATCH_SIZE = 50
+
+# Raw rows newer than this stay uncompacted; older days become intervals + OHLC bars
+HISTORY_HOT_DAYS = 7
+
+# Async engine limits
+MAX_CONCURRENCY = 8
+SITE_CONCURRENCY = {
+    "Amazon": 3,
+    "Walmart": 2
+}
+REQUEST_DELAY = (2, 4)
+
+# Per-domain pacing: token bucket (requests/second + burst) and in-flight cap
+DOMAIN_LIMITS = {
+    "amazon.com": {"rate": 0.2, "burst": 2, "concurrency": 2},
+    "walmart.com": {"rate": 0.15, "burst": 1, "concurrency": 1}
+}
+DEFAULT_DOMAIN_LIMIT = {"rate": 0.2, "burst": 1, "concurrency": 1}
+
+# Adaptive polling (daemon mode), in seconds
+SCHEDULE_FILE = "data/schedule.db"
+MIN_POLL_INTERVAL = 15 * 60
+MAX_POLL_INTERVAL = 24 * 60 * 60
+DEFAULT_POLL_INTERVAL = 60 * 60
+# Products within this fraction above target are polled at the fastest rate
+TARGET_PROXIMITY = 0.10
+
+
+# Shared browser pool
+BROWSER_POOL_SIZE = 1
+MAX_NAVIGATIONS_PER_CONTEXT = 50
+
+# Memory watchdog: sample the browser process tree and page JS heaps between jobs,
+# restarting the browser or recycling a context before a small VM runs out of memory
+WATCHDOG_ENABLED = True
+WATCHDOG_BROWSER_RSS_MB = 1536   # driver + browsers + renderers; restart the browser above this
+WATCHDOG_CONTEXT_HEAP_MB = 256   # one page's JS heap; recycle its context above this
+WATCHDOG_INTERVAL = 30           # seconds between process-tree samples
+WATCHDOG_HEAP_CHECK_EVERY = 10   # navigations between JS heap checks of a page
+
+# Listing pages: price many products per navigation from search results and wishlists;
+# only products missing from them get their own product page (sequential runs only).
+# Walmart can't search by item id, so it batches nothing unless LISTING_URLS lists its pages
+LISTING_ENABLED = True
+LISTING_BATCH_SIZE = 20          # products per search (Amazon searches by ASIN)
+LISTING_MIN_BATCH = 3            # fewer products of a site than this go straight to their pages
+LISTING_URLS = {}                # e.g. {"Walmart": ["https://www.walmart.com/lists/..."]}, read once per run
+
+# Early-exit navigation: stop loading a product page once its price (or a block page)
+# is in the DOM instead of waiting for the load event; off = full page loads
+NAVIGATION_EARLY_EXIT = True
+
+# Resource blocking - we only need the DOM text for price and title
+BLOCK_RESOURCES = True
+BLOCKED_RESOURCE_TYPES = ["image", "media", "font"]
+BLOCKED_DOMAINS = [
+    "google-analytics.com",
+    "googletagmanager.com",
+    "googlesyndication.com",
+    "doubleclick.net",
+    "adsrvr.org",
+    "facebook.net",
+    "scorecardresearch.com",
+    "criteo.com",
+    "bing.com",
+]
+SITE_RESOURCE_RULES = {
+    "Amazon": {
+        "block_domains": ["amazon-adsystem.com", "fls-na.amazon.com", "unagi.amazon.com"]
+    },
+    "Walmart": {
+        "block_domains": ["beacon.walmart.com", "b.wal.co", "crcldu.com", "quantummetric.com"]
+    }
+}
+
+# HTTP fast path - try plain requests + embedded JSON before launching a page
+HTTP_FIRST = True
+HTTP_TIMEOUT = 10
+HTTP_POOL_SIZE = 10
+
+# Conditional-fetch cache: ETag/Last-Modified + price-region fingerprint per product
+FETCH_CACHE_ENABLED = True
+FETCH_CACHE_FILE = "data/fetch_cache.json"
+FETCH_CACHE_TTL = 6 * 60 * 60
+FETCH_CACHE_MAX_ENTRIES = 10000
+
+# Per-selector hit rates, kept across runs to find dead selectors
+SELECTOR_STATS_FILE = "data/selector_stats.json"
+
+# Durable job queue for multi-process workers (--enqueue / --workers N)
+QUEUE_FILE = "data/jobs.db"
+QUEUE_VISIBILITY_TIMEOUT = 180   # seconds a leased job stays invisible before another worker may take it
+QUEUE_MAX_ATTEMPTS = 3           # failed attempts before a job is dead-lettered
+QUEUE_RETRY_DELAY = 60           # base backoff between attempts, doubled each time
+QUEUE_SERVER_PORT = 8765         # --queue-server: share the queue with workers on other hosts
+QUEUE_SERVER_HOST = "127.0.0.1"  # loopback only; any other address also needs QUEUE_SERVER_TOKEN
+QUEUE_SERVER_TOKEN = os.getenv("QUEUE_SERVER_TOKEN")  # shared secret the server checks and workers send
+WORKER_COUNT = 2
+
+# Instrumentation: per-phase timings and counters (off unless enabled here or with --metrics)
+METRICS_ENABLED = False
+METRICS_FILE = "data/metrics.prom"   # Prometheus text file, rewritten at the end of each run
+METRICS_LOG_FILE = None              # e.g. "data/metrics.jsonl" for one JSON line per span/event
+METRICS_PORT = None                  # serve /metrics on this port while running
+
+# Page archive: keep every fetched page (compressed) so parser fixes can be replayed offline
+ARCHIVE_ENABLED = False          # or per run: main.py run --archive
+ARCHIVE_DIR = "data/archive"
+ARCHIVE_COMPRESSION_LEVEL = 6    # zlib level; 1 is faster, 9 smaller
+
+# Retries: failed products are requeued with jittered exponential backoff instead of sleeping
+RETRY_MAX_ATTEMPTS = 3
+RETRY_BASE_DELAY = 30            # seconds before the first retry, doubled for each further one
+RETRY_MAX_DELAY = 600            # cap; one-shot runs skip a site whose circuit stays open longer
+
+# Per-domain circuit breaker: stop hitting a site that keeps blocking us or timing out
+BREAKER_THRESHOLD = 3            # consecutive blocks/timeouts that open the circuit
+BREAKER_COOLDOWN = 300           # seconds a domain is shed before a probe request
+BREAKER_MAX_COOLDOWN = 3600      # cooldown doubles after each failed probe, up to this
+
+# Browser server: `main.py browser-server` keeps one Chromium running; runs on this
+# host attach to it over CDP instead of launching their own
+BROWSER_SERVER_PORT = 9222
+BROWSER_SERVER_URL = None        # attach to this endpoint (e.g. "http://127.0.0.1:9222") instead
+BROWSER_SERVER_FILE = "data/browser_server.json"
+
+# Per-site browser sessions (cookies/localStorage) kept between runs
+SESSIONS_ENABLED = True
+SESSION_DIR = "data/sessions"
+SESSION_SLOTS = 3                # sessions rotated per site
+SESSION_MAX_AGE = 12 * 3600      # seconds before a session is started fresh
+SESSION_MAX_USES = 200           # contexts opened on one session before it is started fresh
+
+# Validation: each batch of new prices is checked before it is stored or alerted on;
+# suspect ones are quarantined (main.py quarantine) instead
+VALIDATION_ENABLED = True
+VALIDATION_WINDOW = 20                  # recent prices per product the outlier check compares against
+VALIDATION_MIN_HISTORY = 5              # prices a product needs before the outlier check applies
+VALIDATION_MAX_Z = 6.0                  # robust (median/MAD) z-score above which a price is an outlier
+VALIDATION_MIN_CHANGE = 0.3             # ...and it must also be at least this far from the median
+VALIDATION_TARGET_RATIO = (0.05, 10.0)  # price / target_price outside this is quarantined
@@ -1,104 +1,1018 @@
 # main.py
-import pandas as pd
-from datetime import datetime
-import os
 import time
-from scrapers.amazon_scraper import AmazonScraper
-from scrapers.walmart_scraper import WalmartScraper
-from config.settings import PRODUCTS, DATA_FILE
+_STARTED = time.perf_counter()
+
+import argparse
+import sys
+# Heavy modules (Playwright, pandas, requests) are imported inside the
+# commands that need them so short commands start fast.
+from config.settings import (
+    MAX_CONCURRENCY,
+    SITE_CONCURRENCY,
+    REQUEST_DELAY,
+    BROWSER_POOL_SIZE,
+    MAX_NAVIGATIONS_PER_CONTEXT,
+    HTTP_FIRST,
+    SELECTOR_STATS_FILE,
+    WORKER_COUNT,
+    QUEUE_SERVER_PORT,
+    METRICS_ENABLED
+)
+
+_store = None
+_alerts = None
+
+def get_store():
+    """Price history store configured in settings"""
+    global _store
+    if _store is None:
+        from utils.storage import open_store
+        _store = open_store()
+        _store.on_write = alert_on_write
+    return _store
+
+def alert_on_write(records):
+    """Alert on prices once they are stored (quarantined ones never reach here)"""
+    for record in records:
+        check_price_alert(record['price'], record['target_price'], record['product_name'],
+                          record['site'], record.get('url'))
+
+def get_catalog():
+    """Tracked products (CATALOG_FILE or PRODUCTS), streamed with canonical ids and no duplicates"""
+    from utils.catalog import Catalog
+    return Catalog.from_settings()
+
+def print_catalog_stats(catalog):
+    """Say what the catalog pass dropped, if anything"""
+    stats = catalog.stats
+    if stats['duplicates'] or stats['skipped']:
+        print(f"📚 Catalog: {stats['products']} products from {stats['rows']} rows "
+              f"({stats['duplicates']} duplicates merged, {stats['skipped']} skipped - "
+              f"run validate-config for details)")
+
+def get_alerts():
+    """Background alert dispatcher configured in settings"""
+    global _alerts
+    if _alerts is None:
+        from utils.alerts import AlertDispatcher
+        _alerts = AlertDispatcher.from_settings()
+    return _alerts
+
+def close_alerts():
+    """Send any pending alert digest before exiting"""
+    global _alerts
+    if _alerts is not None:
+        _alerts.close()
+        _alerts = None
 
 def load_existing_data():
     """Load existing price history if it exists"""
-    if os.path.exists(DATA_FILE):
-        return pd.read_csv(DATA_FILE)
-    else:
-        return pd.DataFrame(columns=['timestamp', 'product_name', 'price', 'url', 'target_price', 'site'])
+    return get_store().read_history()
 
 def save_data(new_data):
-    """Save price data to CSV"""
-    df = load_existing_data()
-    df = pd.concat([df, pd.DataFrame([new_data])], ignore_index=True)
-    df.to_csv(DATA_FILE, index=False)
-    print(f"💾 Data saved to {DATA_FILE}")
-
-def check_price_alert(price, target_price, product_name, site):
-    """Check if price is below target"""
+    """Queue price data for the history store (written in batches)"""
+    store = get_store()
+    store.add(new_data)
+    print(f"💾 Data queued for {getattr(store, 'path', 'storage')}")
+
+def check_price_alert(price, target_price, product_name, site, url=None):
+    """Check if price is below target and hand the alert to the dispatcher"""
     if price and target_price and price <= target_price:
         print(f"🔔 ALERT! {site} - {product_name} is ${price:.2f} (below target ${target_price:.2f})")
+        get_alerts().submit({
+            'product_name': product_name,
+            'site': site,
+            'price': price,
+            'target_price': target_price,
+            'url': url
+        })
         return True
     return False
 
-def main():
-    print("🚀 Starting Multi-Site Price Tracker...")
-    print(f"📊 Tracking {len(PRODUCTS)} products across Amazon & Walmart\n")
+def handle_result(product, result):
+    """Save a scraped price (checked against the target once it passes validation)"""
+    from utils.metrics import metrics
     
-    # Initialize scrapers
-    amazon = AmazonScraper(headless=True)
-    walmart = WalmartScraper(headless=True)
+    success = result['success'] and result['price']
+    metrics.incr('scrapes', site=product['site'],
+                 outcome=result.get('tier', 'browser') if success else 'failed')
+    if success:
+        # Prepare data for saving
+        price_data = {
+            'timestamp': result['timestamp'],
+            'product_name': product['name'],
+            'price': result['price'],
+            'url': product['url'],
+            'target_price': product['target_price'],
+            'site': product['site']
+        }
+        
+        # Queue for validation, storage and alerts
+        save_data(price_data)
+        
+        tier = result.get('tier', 'browser')
+        print(f"💰 Price: ${result['price']:.2f} (via {tier})")
+    else:
+        print(f"❌ Could not get price")
+
+def print_blocking_stats():
+    """Show how much the resource blocker saved"""
+    from utils.resource_blocker import ResourceBlocker
+    
+    for site, stats in ResourceBlocker.all_stats().items():
+        saved_mb = stats['bytes_saved_estimate'] / 1_000_000
+        received_mb = stats['bytes_received'] / 1_000_000
+        print(f"🚫 [{site}] blocked {stats['requests_blocked']} requests "
+              f"(~{saved_mb:.1f} MB saved), received {received_mb:.1f} MB")
+
+def save_fetch_cache():
+    """Persist the conditional-fetch cache and report how much work it saved"""
+    from utils.fetch_cache import FetchCache
+    
+    cache = FetchCache._shared
+    if cache is None:
+        return
+    cache.save()
+    stats = cache.stats()
+    print(f"🗃️ Fetch cache: {stats['hits_not_modified']} not-modified, "
+          f"{stats['hits_fingerprint']} unchanged-price hits, {stats['misses']} misses "
+          f"({stats['hit_rate']:.0%} hit rate)")
+
+def print_selector_stats(stats):
+    """Persist selector hit rates and point out selectors that never match"""
+    stats.save()
+    for site, field, selector in stats.dead_selectors():
+        print(f"🪦 [{site}] {field} selector never matches: {selector}")
+
+def get_scraper(scrapers, site, pool, delay):
+    """Scraper for site from the registry, created and started on first use"""
+    from scrapers import registry
+    
+    if site not in scrapers:
+        scraper_class = registry.scraper_class(site)
+        if scraper_class is None:
+            return None
+        scraper = scraper_class(headless=True, pool=pool, http_first=HTTP_FIRST, delay=delay)
+        scraper.start()
+        scrapers[site] = scraper
+    return scrapers[site]
+
+def run_sequential():
+    """Check products one at a time"""
+    from utils.browser_pool import BrowserPool
+    from utils.browser_server import browser_endpoint
+    from utils.session_store import SessionStore
+    from utils.metrics import metrics
+    from utils.watchdog import ResourceWatchdog
+    from utils.scheduler import (DomainBreakers, DomainLimiter, RetryPolicy, RetryQueue,
+                                 domain_of, failure_kind)
+    from scrapers.listing import ListingBatcher
+    
+    # One driver and browser pool shared by every site's scraper
+    pool = BrowserPool(
+        headless=True,
+        browsers=BROWSER_POOL_SIZE,
+        max_navigations=MAX_NAVIGATIONS_PER_CONTEXT,
+        endpoint=browser_endpoint(),
+        sessions=SessionStore.from_settings(),
+        watchdog=ResourceWatchdog.from_settings()
+    )
+    scrapers = {}
+    
+    # Per-domain token buckets pace the loop instead of a fixed sleep
+    limiter = DomainLimiter.from_settings()
+    # Failures wait out their backoff in a queue while the other products go ahead
+    retry_policy = RetryPolicy.from_settings()
+    breakers = DomainBreakers.from_settings()
+    retries = RetryQueue()
+    # The catalog is read lazily; only products waiting on a retry are held in memory
+    catalog = get_catalog()
+    # Listing pages price most products in batches; only their misses reach the loop below
+    listings = ListingBatcher.from_settings(
+        lambda site: get_scraper(scrapers, site, pool, None), limiter, breakers)
+    pending = listings.filter(catalog, handle_result) if listings else iter(catalog)
     
     try:
-        amazon.start()
-        walmart.start()
-        
-        for product in PRODUCTS:
+        while True:
+            job = retries.pop_ready()
+            if job is None:
+                product = next(pending, None)
+                if product is None:
+                    if not retries:
+                        break
+                    time.sleep(retries.seconds_until_next())
+                    continue
+                job = (product, 1)
+            product, attempt = job
+            
+            domain = domain_of(product['url'])
+            wait = breakers.allow(domain)
+            if wait:
+                if wait <= retry_policy.max_delay:
+                    retries.push(job, wait)
+                else:
+                    metrics.incr('scrapes', site=product['site'], outcome='shed')
+                    print(f"⏭️ Skipping {product['name']}: {domain} circuit open for {wait / 60:.0f} more min")
+                continue
+            
             print(f"{'='*60}")
-            print(f"Checking: {product['name']}")
+            print(f"Checking: {product['name']}" + (f" (attempt {attempt})" if attempt > 1 else ''))
             print(f"🏬 Store: {product['site']}")
             
-            # Choose correct scraper
-            if product['site'] == 'Amazon':
-                result = amazon.get_price(product['url'])
-            elif product['site'] == 'Walmart':
-                result = walmart.get_price(product['url'])
-            else:
+            # No random delay on top: it would sleep while holding the limiter's slot
+            scraper = get_scraper(scrapers, product['site'], pool, None)
+            if scraper is None:
                 print(f"❌ Unknown site: {product['site']}")
                 continue
             
-            if result['success'] and result['price']:
-                # Prepare data for saving
-                price_data = {
-                    'timestamp': result['timestamp'],
-                    'product_name': product['name'],
-                    'price': result['price'],
-                    'url': product['url'],
-                    'target_price': product['target_price'],
-                    'site': product['site']
-                }
-                
-                # Save to CSV
-                save_data(price_data)
-                
-                # Check for alerts
-                check_price_alert(
-                    result['price'], 
-                    product['target_price'], 
-                    product['name'],
-                    product['site']
-                )
-                
-                print(f"💰 Price: ${result['price']:.2f}")
-            else:
-                print(f"❌ Could not get price")
+            limiter.acquire(domain)
+            try:
+                with metrics.span('scrape', site=product['site']):
+                    result = scraper.get_price(product['url'])
+            finally:
+                limiter.release(domain)
+            
+            kind = failure_kind(result)
+            breakers.record(domain, kind)
+            if retry_policy.should_retry(attempt, kind):
+                delay = retry_policy.delay(attempt)
+                metrics.incr('retries', operation='scrape', reason=kind)
+                print(f"🔄 {kind}: retry {attempt + 1}/{retry_policy.max_attempts} in {delay:.0f}s")
+                retries.push((product, attempt + 1), delay)
+                continue
             
-            # Wait between products
-            time.sleep(3)
+            handle_result(product, result)
             
     finally:
-        amazon.close()
-        walmart.close()
+        for scraper in scrapers.values():
+            scraper.close()
+        stats = pool.stats()
+        pool.close()
+        print(f"\n🧰 Browser pool: {stats['contexts_created']} contexts, "
+              f"{stats['contexts_recycled']} recycled ({stats['recycled_on_block']} on block, "
+              f"{stats['recycled_on_memory']} on memory), {stats['browser_restarts']} browser restarts, "
+              f"{stats['navigations']} navigations")
+        if listings and listings.stats['pages']:
+            print(f"📋 Listing pages: {listings.stats['hits']} products priced from "
+                  f"{listings.stats['pages']} pages, {listings.stats['misses']} needed their own page")
+        print_blocking_stats()
+        print_catalog_stats(catalog)
+
+def run_async():
+    """Check products concurrently, saving each result as it arrives"""
+    from scrapers.async_engine import AsyncScrapeEngine
+    from utils.browser_server import browser_endpoint
+    from utils.scheduler import DomainBreakers, RetryPolicy
+    from utils.session_store import SessionStore
+    from utils.watchdog import ResourceWatchdog
+    
+    def on_result(product, result):
+        print(f"{'='*60}")
+        print(f"Checked: [{product['site']}] {product['name']}")
+        handle_result(product, result)
+    
+    engine = AsyncScrapeEngine(
+        headless=True,
+        max_concurrency=MAX_CONCURRENCY,
+        site_concurrency=SITE_CONCURRENCY,
+        delay=REQUEST_DELAY,
+        on_result=on_result,
+        http_first=HTTP_FIRST,
+        retry_policy=RetryPolicy.from_settings(),
+        breakers=DomainBreakers.from_settings(),
+        endpoint=browser_endpoint(),
+        sessions=SessionStore.from_settings(),
+        watchdog=ResourceWatchdog.from_settings()
+    )
+    catalog = get_catalog()
+    engine.run_sync(catalog, keep_results=False)
+    print_blocking_stats()
+    print_catalog_stats(catalog)
+
+def run_daemon():
+    """Poll products forever, each on its own adaptive interval"""
+    import asyncio
+    from scrapers.async_engine import AsyncScrapeEngine
+    from utils.browser_server import browser_endpoint
+    from utils.scheduler import DomainBreakers, DomainLimiter, PollSchedule, PollingDaemon
+    from utils.session_store import SessionStore
+    from utils.watchdog import ResourceWatchdog
+    
+    schedule = PollSchedule.from_settings()
+    count = schedule.sync_products(get_catalog())
+    print(f"🛰️ Scheduler daemon tracking {count} products (Ctrl+C to stop)")
+    
+    def on_result(product, result):
+        print(f"{'='*60}")
+        print(f"Checked: [{product['site']}] {product['name']}")
+        handle_result(product, result)
+        get_store().flush()
+    
+    # Token buckets do the pacing, so no extra random delay
+    engine = AsyncScrapeEngine(headless=True, delay=None, http_first=HTTP_FIRST,
+                               endpoint=browser_endpoint(), sessions=SessionStore.from_settings(),
+                               watchdog=ResourceWatchdog.from_settings())
+    daemon = PollingDaemon(
+        engine,
+        schedule,
+        DomainLimiter.from_settings(),
+        on_result=on_result,
+        max_in_flight=MAX_CONCURRENCY,
+        breakers=DomainBreakers.from_settings()
+    )
+    try:
+        asyncio.run(daemon.run())
+    except KeyboardInterrupt:
+        print("\n🛑 Scheduler stopped")
+    finally:
+        save_fetch_cache()
+        schedule.close()
+
+def enqueue_products(queue_url=None):
+    """Producer: put every tracked product on the durable job queue"""
+    from itertools import islice
+    from utils.job_queue import open_queue
+
+    catalog = get_catalog()
+    products = iter(catalog)
+    queue = open_queue(queue_url)
+    added = 0
+    try:
+        # Batches keep a large catalog to one transaction (or request) per thousand products
+        while batch := [(product, product['id']) for product in islice(products, 1000)]:
+            added += queue.enqueue_many(batch)
+        stats = queue.stats()
+    finally:
+        queue.close()
+    total = catalog.stats['products']
+    print(f"📥 Enqueued {added} products ({total - added} already queued); "
+          f"{stats['ready']} ready, {stats['leased']} leased, {stats['dead']} dead-lettered")
+    print_catalog_stats(catalog)
+
+def run_worker(index=0, queue_url=None, share=1, exit_when_empty=True, metrics_enabled=False):
+    """Worker process: lease jobs, scrape with its own browser, ack or retry"""
+    import os
+    import socket
+    from utils.browser_pool import BrowserPool
+    from utils.browser_server import browser_endpoint
+    from utils.session_store import SessionStore
+    from utils.job_queue import open_queue
+    from utils.metrics import metrics
+    from utils.scheduler import DomainBreakers, DomainLimiter, RetryPolicy, domain_of, failure_kind
+    from utils.watchdog import ResourceWatchdog
+    from config.settings import QUEUE_RETRY_DELAY, QUEUE_VISIBILITY_TIMEOUT, METRICS_FILE, METRICS_LOG_FILE
+
+    worker_id = f"{socket.gethostname()}:{os.getpid()}:{index}"
+    if metrics_enabled and not metrics.enabled:
+        # Spawned processes start with metrics off; each writes its own text file
+        metrics.configure(path=METRICS_FILE.replace('.prom', f'-worker{index}.prom'),
+                          log_path=METRICS_LOG_FILE, worker=str(index))
+    queue = open_queue(queue_url)
+    pool = BrowserPool(
+        headless=True,
+        browsers=BROWSER_POOL_SIZE,
+        max_navigations=MAX_NAVIGATIONS_PER_CONTEXT,
+        endpoint=browser_endpoint(),
+        sessions=SessionStore.from_settings(),
+        watchdog=ResourceWatchdog.from_settings()
+    )
+    scrapers = {}
+    # Workers share the per-domain budget instead of each taking all of it
+    limiter = DomainLimiter.from_settings(share=share)
+    retry_policy = RetryPolicy.from_settings(base_delay=QUEUE_RETRY_DELAY)
+    breakers = DomainBreakers.from_settings()
+    done = 0
+
+    try:
+        while True:
+            job = queue.lease(worker_id)
+            if job is None:
+                stats = queue.stats()
+                if exit_when_empty and stats['ready'] + stats['leased'] == 0:
+                    break
+                time.sleep(5)  # retries pending or other workers still busy
+                continue
+
+            product = job['payload']
+            domain = domain_of(product['url'])
+            wait = breakers.allow(domain)
+            if wait:
+                # Site is walling this worker: hand the job back untried
+                queue.defer(job['id'], worker_id, delay=wait)
+                continue
+            print(f"{'='*60}")
+            print(f"[{worker_id}] Checking: [{product['site']}] {product['name']} "
+                  f"(attempt {job['attempts']})")
+
+            # Token buckets pace the workers, so no extra random delay
+            scraper = get_scraper(scrapers, product['site'], pool, None)
+            if scraper is None:
+                result = {'success': False, 'error': f"Unknown site: {product['site']}"}
+            else:
+                # Renew the lease while waiting on the domain's budget and again before the scrape,
+                # so it can't expire and hand the job to a second worker
+                renew = lambda: queue.extend(job['id'], worker_id)
+                limiter.acquire(domain, heartbeat=renew, every=QUEUE_VISIBILITY_TIMEOUT / 3)
+                try:
+                    if not renew():
+                        print(f"⚠️ [{worker_id}] Lost the lease on {product['name']}; leaving it to its new owner")
+                        continue
+                    with metrics.span('scrape', site=product['site']):
+                        result = scraper.get_price(product['url'])
+                except Exception as e:
+                    result = {'success': False, 'error': str(e)}
+                finally:
+                    limiter.release(domain)
+
+            kind = failure_kind(result)
+            breakers.record(domain, kind)
+            if kind is None:
+                handle_result(product, result)
+                get_store().flush()  # durable before the ack
+                queue.ack(job['id'], worker_id)
+                done += 1
+            else:
+                delay = retry_policy.delay(job['attempts'])
+                metrics.incr('retries', operation='queue_job', reason=kind)
+                queue.nack(job['id'], worker_id, error=result.get('error', 'Price not found'),
+                           delay=delay)
+                print(f"❌ [{worker_id}] {result.get('error', 'Price not found')} - "
+                      f"retry in {delay:.0f}s unless out of attempts")
+    finally:
+        for scraper in scrapers.values():
+            scraper.close()
+        pool.close()
+        queue.close()
+        save_fetch_cache()
+        close_alerts()
+        if _store is not None:
+            _store.close()
+        metrics.close()
+        print(f"👷 [{worker_id}] finished {done} jobs")
+
+def run_workers(count, queue_url=None):
+    """Start N worker processes, each with its own browser, and wait for them"""
+    import multiprocessing
+    from utils.metrics import metrics
+
+    # spawn: Playwright's driver threads don't survive fork
+    context = multiprocessing.get_context('spawn')
+    workers = [
+        context.Process(target=run_worker, args=(index, queue_url, count, True, metrics.enabled),
+                        name=f"worker-{index}")
+        for index in range(count)
+    ]
+    print(f"👷 Starting {count} workers")
+    for worker in workers:
+        worker.start()
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        print("\n🛑 Stopping workers")
+        for worker in workers:
+            worker.terminate()
+            worker.join()
+
+def serve_queue(port, host=None):
+    """Expose the local job queue over HTTP for workers on other hosts"""
+    from utils.job_queue import JobQueue, QueueServer
+    from config.settings import QUEUE_SERVER_HOST, QUEUE_SERVER_TOKEN
+
+    host = host or QUEUE_SERVER_HOST
+    try:
+        server = QueueServer(JobQueue.from_settings(), host=host, port=port, token=QUEUE_SERVER_TOKEN)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return
+    print(f"📡 Serving job queue on {host}:{port} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n🛑 Queue server stopped")
+    finally:
+        server.shutdown()
+        server.queue.close()
+
+def serve_browser(port=None):
+    """Keep one browser running so short runs attach to it instead of launching"""
+    from utils.browser_server import BrowserServer
+
+    server = BrowserServer.from_settings(port).start()
+    print(f"🌐 Browser server on {server.endpoint} - runs on this host attach automatically (Ctrl+C to stop)")
+    try:
+        server.wait()
+    except KeyboardInterrupt:
+        print("\n🛑 Browser server stopped")
+    finally:
+        server.stop()
+
+def manage_sessions(clear=False, site=None):
+    """List stored per-site browser sessions, or delete them"""
+    from scrapers.registry import site_names
+    from utils.session_store import SessionStore
+    from config.settings import SESSION_DIR, SESSION_SLOTS
+
+    store = SessionStore(SESSION_DIR, slots=SESSION_SLOTS)
+    if clear:
+        print(f"🧹 Removed {store.clear(site)} stored sessions")
+        return
+    rows = store.summary([site] if site else site_names())
+    if not rows:
+        print("No stored sessions")
+    for name, slot, age, uses, cookies in rows:
+        print(f"  • [{name}] slot {slot}: {age / 3600:.1f}h old, {uses} uses, {cookies} cookies")
+
+def show_quarantine(scan=False):
+    """List quarantined prices, or flag suspect rows already in the stored history"""
+    from utils.validation import PriceValidator, REASONS
+    
+    store = get_store()
+    if scan:
+        history = store.read_history()
+        if history.empty:
+            print("No price history yet")
+            return
+        validator = store.validator or PriceValidator()
+        flagged = validator.scan(history)
+        suspect = flagged[flagged['reason'].notna()]
+        print(f"🧪 {len(suspect)} of {len(flagged)} stored prices look wrong")
+        for reason in REASONS:
+            rows = suspect[suspect['reason'] == reason]
+            if len(rows):
+                print(f"  {reason}: {len(rows)}")
+            for _, row in rows.head(5).iterrows():
+                hint = f" (probably ${row['suggested_price']:.2f})" if row['suggested_price'] == row['suggested_price'] else ''
+                price = f"${row['price']:.2f}" if row['price'] == row['price'] else '—'
+                print(f"    • {row['timestamp']} [{row['site']}] {row['product_name']}: {price}{hint}")
+        return
+    rows = store.quarantined()
+    if not rows:
+        print("Nothing quarantined")
+    for row in rows:
+        # Rows quarantined as 'invalid' may have no price at all (blank in the CSV store's file)
+        price = f"${float(row['price']):.2f}" if row['price'] not in (None, '') else '—'
+        print(f"  • {row['quarantined_at']} [{row['site']}] {row['product_name']}: {price} ({row['reason']})")
+
+def compact_history():
+    """Fold old raw history into month partitions and rollups"""
+    from utils.history import PriceHistory
+    from config.settings import HISTORY_HOT_DAYS
+    
+    store = get_store()
+    if not hasattr(store, 'conn'):
+        print("❌ Compaction needs the sqlite storage backend")
+        return
+    summary = PriceHistory(store).compact(hot_days=HISTORY_HOT_DAYS)
+    print(f"🗜️ Compacted {summary['rows']} rows into {summary['intervals']} intervals "
+          f"across {len(summary['months'])} month partitions")
+
+def show_history(product, since=None, until=None, level='auto'):
+    """One product's prices over a range, read from only the partitions and rollup level it needs"""
+    from datetime import datetime, timedelta
+    from utils.history import PriceHistory
+    
+    store = get_store()
+    if not hasattr(store, 'conn'):
+        print("❌ History queries need the sqlite storage backend")
+        return
+    entry = store.latest(product)
+    if entry is None:
+        wanted = product.lower()
+        matches = [entry for entry in store.latest_prices()
+                   if wanted in entry['product_id'].lower() or wanted in entry['product_name'].lower()]
+        if len(matches) != 1:
+            print(f"❌ {len(matches)} products match '{product}'" + (':' if matches else ''))
+            for match in matches[:20]:
+                print(f"  • {match['product_id']} [{match['site']}] {match['product_name']}")
+            return
+        entry = matches[0]
+    
+    until = until or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    since = since or (datetime.strptime(until[:10], '%Y-%m-%d') - timedelta(days=30)).strftime('%Y-%m-%d')
+    history = PriceHistory(store).query(entry['product_id'], since, until, level)
+    print(f"📈 [{entry['site']}] {entry['product_name']} ({entry['product_id']}), {since} to {until}")
+    if history.empty:
+        print("No prices in that range")
+    elif 'timestamp' in history:
+        for row in history.itertuples(index=False):
+            print(f"  {row.timestamp}  ${row.price:.2f}")
+    else:
+        for row in history.itertuples(index=False):
+            print(f"  {row.period}  open ${row.open:.2f}  low ${row.low:.2f}  high ${row.high:.2f}  "
+                  f"close ${row.close:.2f}  ({int(row.samples)} samples)")
+
+def print_summary():
+    """Record count and latest prices from the latest-price index - no history scan"""
+    store = get_store()
+    print(f"\n📊 Total records in database: {store.count()}")
+    
+    latest = store.latest_prices()
+    if latest:
+        print("\n📈 Latest prices by store:")
+        for entry in latest:
+            change = ''
+            if entry['previous_price'] is not None and entry['previous_price'] != entry['last_price']:
+                change = f" (was ${entry['previous_price']:.2f})"
+            print(f"  • [{entry['site']}] {entry['product_name']}: ${entry['last_price']:.2f}{change}"
+                  f" | low ${entry['min_price']:.2f}")
+
+def list_products():
+    """Print the tracked products from the catalog"""
+    catalog = get_catalog()
+    for product in catalog:
+        target = f"${product['target_price']:.2f}" if product['target_price'] else 'none'
+        print(f"  • [{product['site']}] {product['name']} - target {target}")
+        print(f"    {product['id']}  {product['url']}")
+    print(f"\n📦 {catalog.stats['products']} products from {catalog.label}")
+    print_catalog_stats(catalog)
+
+def write_report(html=False, force=False):
+    """Excel (and optionally HTML) report from the history store"""
+    import os
+    from utils.report import ReportGenerator
+    from config.settings import REPORT_FILE, REPORT_CHUNK_SIZE, REPORT_DAILY_DAYS
+    
+    generator = ReportGenerator(get_store(), REPORT_FILE, get_catalog(), chunksize=REPORT_CHUNK_SIZE,
+                                daily_days=REPORT_DAILY_DAYS)
+    html_path = os.path.splitext(REPORT_FILE)[0] + '.html' if html else None
+    generator.generate(force=force, html_path=html_path)
+
+def check_alerts():
+    """Compare the latest stored prices against targets without scraping"""
+    store = get_store()
+    alerts = 0
+    for product in get_catalog():
+        entry = store.latest(product['id'])
+        if entry and check_price_alert(entry['last_price'], product['target_price'], product['name'],
+                                       product['site'], product['url']):
+            alerts += 1
+    print(f"🔔 {alerts} products at or below target")
+    return alerts
+
+def validate_config():
+    """Check settings for mistakes before a run; returns the number of errors"""
+    from config import settings
+    from scrapers import registry
+    from utils.urls import canonical_id, domain_of
+    
+    catalog = get_catalog()
+    errors, warnings = [], []
+    seen = {}
+    count = 0
+    for index, product in enumerate(catalog.rows()):
+        count += 1
+        label = product.get('name') or f"product #{index + 1}"
+        missing = [key for key in ('name', 'url', 'target_price') if not product.get(key)]
+        if missing:
+            errors.append(f"{label}: missing {', '.join(missing)}")
+            continue
+        try:
+            target_price = float(product['target_price'])
+        except (TypeError, ValueError):
+            target_price = 0
+        if target_price <= 0:
+            errors.append(f"{label}: target_price must be a positive number")
+        # Catalog files may leave the site out; it comes from the URL's domain then
+        site = registry.site_for_domain(domain_of(product['url']))
+        if product.get('site') and product['site'] not in registry.SITES:
+            errors.append(f"{label}: no scraper registered for site '{product['site']}'")
+        elif site is None:
+            errors.append(f"{label}: no scraper registered for {domain_of(product['url'])}")
+        elif product.get('site') and site != product['site']:
+            errors.append(f"{label}: URL is not on a {product['site']} domain")
+        key = canonical_id(product['url'])
+        if key in seen:
+            warnings.append(f"{label}: same product as {seen[key]} ({key})")
+        seen.setdefault(key, label)
+    
+    for site in settings.SITE_CONCURRENCY:
+        if site not in registry.SITES:
+            warnings.append(f"SITE_CONCURRENCY: unknown site '{site}'")
+    for domain, limit in {**settings.DOMAIN_LIMITS, 'default': settings.DEFAULT_DOMAIN_LIMIT}.items():
+        if not limit.get('rate', 0) > 0:
+            errors.append(f"DOMAIN_LIMITS[{domain}]: rate must be > 0")
+    low, high = settings.REQUEST_DELAY
+    if low > high:
+        errors.append("REQUEST_DELAY: minimum is larger than maximum")
+    if settings.STORAGE_BACKEND not in ('sqlite', 'csv'):
+        errors.append(f"STORAGE_BACKEND: unknown backend '{settings.STORAGE_BACKEND}'")
+    if not (settings.EMAIL_SENDER and settings.EMAIL_PASSWORD and settings.EMAIL_RECEIVER):
+        warnings.append("EMAIL_SENDER/EMAIL_PASSWORD/EMAIL_RECEIVER not set - alerts are console-only")
+    
+    for message in errors:
+        print(f"❌ {message}")
+    for message in warnings:
+        print(f"⚠️ {message}")
+    if not errors:
+        print(f"✅ Config OK: {count} products from {catalog.label}, {len(warnings)} warnings")
+    return len(errors)
+
+def replay_archive(site=None, product=None, since=None, until=None, latest=False, jobs=None,
+                   output=None, backfill=False, rebuild_index=False):
+    """Re-run today's parsers over archived pages - no network, every core"""
+    import csv
+    from utils.page_archive import PageArchive, replay
+    from config.settings import ARCHIVE_DIR
+    
+    archive = PageArchive(ARCHIVE_DIR)
+    try:
+        if rebuild_index:
+            print(f"🗂️ Rebuilt archive index: {archive.rebuild_index()} pages")
+        stats = archive.stats()
+        print(f"🗄️ Archive: {stats['pages']} pages of {stats['products']} products, "
+              f"{stats['raw_bytes'] / 1_000_000:.1f} MB stored in {stats['stored_bytes'] / 1_000_000:.1f} MB "
+              f"({stats['ratio']:.1f}x)")
+        entries = archive.entries(site=site, product=product, since=since, until=until, latest_only=latest)
+    finally:
+        archive.close()
+    if not entries:
+        print("Nothing to replay")
+        return []
+    
+    start = time.perf_counter()
+    results = sorted(replay(ARCHIVE_DIR, entries, jobs=jobs), key=lambda result: result['id'])
+    elapsed = time.perf_counter() - start
+    
+    counts = {'same': 0, 'changed': 0, 'recovered': 0, 'lost': 0, 'blocked': 0, 'still_missing': 0}
+    for result in results:
+        old, new = result['price'], result['new_price']
+        if result['source'] == 'blocked':
+            result['change'] = 'blocked'
+        elif old is None:
+            result['change'] = 'recovered' if new is not None else 'still_missing'
+        elif new is None:
+            result['change'] = 'lost'
+        else:
+            result['change'] = 'same' if abs(old - new) < 0.005 else 'changed'
+        counts[result['change']] += 1
+    
+    print(f"🔁 Replayed {len(results)} pages in {elapsed:.2f}s ({len(results) / elapsed:.0f} pages/sec)")
+    print("   " + ', '.join(f"{name.replace('_', ' ')} {count}" for name, count in counts.items()))
+    shown = [result for result in results if result['change'] in ('changed', 'recovered', 'lost')]
+    for result in shown[:20]:
+        old = f"${result['price']:.2f}" if result['price'] is not None else 'none'
+        new = f"${result['new_price']:.2f}" if result['new_price'] is not None else 'none'
+        print(f"  • [{result['site']}] {result['product_key']} {result['fetched_at']}: {old} → {new}"
+              f" ({result['source'] or 'no match'})")
+    if len(shown) > 20:
+        print(f"  … and {len(shown) - 20} more")
+    
+    if output:
+        columns = ['id', 'fetched_at', 'site', 'product_key', 'url', 'tier', 'status', 'price',
+                   'new_price', 'source', 'change']
+        with open(output, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=columns, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(results)
+        print(f"📝 Replay results written to {output}")
+    
+    if backfill:
+        # Only fetches that never produced a price have no history row to collide with
+        recovered = {result['product_key'] for result in results if result['change'] == 'recovered'}
+        products = {product['id']: product for product in get_catalog() if product['id'] in recovered}
+        store = get_store()
+        added = 0
+        for result in results:
+            if result['change'] != 'recovered':
+                continue
+            product = products.get(result['product_key'], {})
+            store.add({
+                'timestamp': result['fetched_at'],
+                'product_name': product.get('name', result['product_key']),
+                'price': result['new_price'],
+                'url': result['url'],
+                'target_price': product.get('target_price'),
+                'site': result['site']
+            })
+            added += 1
+        store.flush()
+        print(f"💾 Backfilled {added} recovered prices into {getattr(store, 'path', 'storage')}")
+    return results
+
+def main(use_async=False, archive=False):
+    from scrapers.extraction import ExtractionPlan
+    
+    if archive:
+        from utils.page_archive import PageArchive
+        PageArchive.enable()
+    
+    print("🚀 Starting Multi-Site Price Tracker...")
+    catalog = get_catalog()
+    print(f"📊 Tracking {catalog.count()} products from {catalog.label}\n")
+    
+    selector_stats = ExtractionPlan.use_stats_file(SELECTOR_STATS_FILE)
+    
+    if use_async:
+        run_async()
+    else:
+        run_sequential()
+    
+    print_selector_stats(selector_stats)
+    save_fetch_cache()
+    get_store().flush()
+    if archive:
+        PageArchive.shared().close()
     
     print(f"\n{'='*60}")
     print("✅ Price tracking complete!")
+    print_summary()
+
+def profile_imports():
+    """Time every import from here on, per top-level package"""
+    import builtins
+    import importlib
+    import threading
     
-    # Show summary
-    df = load_existing_data()
-    print(f"\n📊 Total records in database: {len(df)}")
+    timings = {}
+    local = threading.local()
     
-    if len(df) > 0:
-        print("\n📈 Latest prices by store:")
-        latest = df.groupby('product_name').last().reset_index()
-        for _, row in latest.iterrows():
-            print(f"  • [{row['site']}] {row['product_name']}: ${row['price']:.2f}")
+    def timed(original):
+        def wrapper(name, *args, **kwargs):
+            # Only the outermost import is timed; nested ones are part of it
+            if getattr(local, 'depth', 0) or name in sys.modules:
+                return original(name, *args, **kwargs)
+            local.depth = 1
+            start = time.perf_counter()
+            try:
+                return original(name, *args, **kwargs)
+            finally:
+                local.depth = 0
+                package = name.split('.')[0]
+                timings[package] = timings.get(package, 0.0) + time.perf_counter() - start
+        return wrapper
+    
+    builtins.__import__ = timed(builtins.__import__)
+    importlib.import_module = timed(importlib.import_module)
+    return timings
+
+def print_metrics_summary():
+    """Where the run spent its time, plus counter totals, and write the metrics file"""
+    from utils.metrics import metrics
+    
+    rows = metrics.summary()
+    if rows:
+        print("\n⏱️ Time by phase (most first):")
+        for name, labels, count, total, mean, longest, errors in rows[:15]:
+            label = ','.join(f"{key}={value}" for key, value in sorted(labels.items()))
+            failed = f", {errors} errors" if errors else ''
+            print(f"   {name:<16} {label:<28} n={count:<5} total {total:8.2f}s  "
+                  f"mean {mean * 1000:8.1f} ms  max {longest * 1000:8.1f} ms{failed}")
+    totals = metrics.counter_totals()
+    if totals:
+        print("📟 " + ', '.join(f"{name}={value}" for name, value in sorted(totals.items())))
+    path = metrics.write()
+    if path:
+        print(f"📈 Metrics written to {path}")
+
+def print_startup_profile(ready_at, timings):
+    """Report time to a ready CLI and what the command imported lazily"""
+    print(f"\n⏱️ Startup: {(ready_at - _STARTED) * 1000:.0f} ms to a ready CLI "
+          f"(module imports + argument parsing)")
+    lazy = sum(timings.values())
+    print(f"⏱️ Lazy imports: {lazy * 1000:.0f} ms "
+          f"of {(time.perf_counter() - _STARTED) * 1000:.0f} ms total")
+    for package, seconds in sorted(timings.items(), key=lambda item: -item[1])[:10]:
+        if seconds >= 0.001:
+            print(f"   {package:<24} {seconds * 1000:7.1f} ms")
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Multi-site price tracker")
+    parser.add_argument('--profile-startup', action='store_true',
+                        help="report import and startup time when the command finishes")
+    parser.add_argument('--metrics', action='store_true',
+                        help="time each phase and count outcomes (also METRICS_ENABLED in settings)")
+    parser.add_argument('--metrics-port', type=int, metavar='PORT',
+                        help="serve Prometheus metrics on PORT while the command runs")
+    commands = parser.add_subparsers(dest='command', metavar='COMMAND')
+    
+    run = commands.add_parser('run', help="check every product once (default)")
+    run.add_argument('--async', dest='use_async', action='store_true',
+                     help="scrape products concurrently with the asyncio engine")
+    run.add_argument('--archive', action='store_true',
+                     help="keep every fetched page in the archive for offline replay (ARCHIVE_DIR)")
+    commands.add_parser('list', help="list tracked products")
+    report = commands.add_parser('report', help="show the latest prices from the store")
+    report.add_argument('--xlsx', action='store_true',
+                        help="also write the Excel report to REPORT_FILE (changed sheets only)")
+    report.add_argument('--html', action='store_true',
+                        help="also write the summary as HTML next to REPORT_FILE")
+    report.add_argument('--force', action='store_true',
+                        help="recompute every sheet even if its data hasn't changed")
+    commands.add_parser('check-alerts', help="check stored prices against targets without scraping")
+    commands.add_parser('validate-config', help="check settings for mistakes")
+    commands.add_parser('daemon', help="keep running, polling each product on an adaptive schedule")
+    
+    import_csv = commands.add_parser('import-csv', help="import a price_history.csv into the SQLite store")
+    import_csv.add_argument('path')
+    commands.add_parser('rebuild-index', help="regenerate the latest-price index from the full history")
+    commands.add_parser('compact', help="compact old history into intervals and OHLC rollups")
+    history = commands.add_parser('history', help="one product's prices over a date range")
+    history.add_argument('product', help="canonical id (amazon:B0863TXGM3) or part of its id or name")
+    history.add_argument('--since', metavar='TIMESTAMP', help="default: 30 days before --until")
+    history.add_argument('--until', metavar='TIMESTAMP', help="default: now")
+    history.add_argument('--level', choices=['auto', 'raw', 'daily', 'weekly'], default='auto',
+                         help="raw points or OHLC bars (auto: by range length)")
+    replay = commands.add_parser('replay', help="re-extract prices from archived pages, offline")
+    replay.add_argument('--site')
+    replay.add_argument('--product', help="canonical id (amazon:B0863TXGM3) or part of the URL")
+    replay.add_argument('--since', metavar='TIMESTAMP', help="e.g. 2026-02-11 or '2026-02-11 18:00:00'")
+    replay.add_argument('--until', metavar='TIMESTAMP')
+    replay.add_argument('--latest', action='store_true', help="only the newest page of each product")
+    replay.add_argument('--jobs', type=int, help="worker processes (default: one per core)")
+    replay.add_argument('--output', metavar='CSV', help="write every replayed page's old and new price")
+    replay.add_argument('--backfill', action='store_true',
+                        help="store prices recovered from fetches that originally got none")
+    replay.add_argument('--rebuild-index', action='store_true',
+                        help="rebuild the archive index from the data file first")
+    
+    enqueue = commands.add_parser('enqueue', help="put every tracked product on the durable job queue")
+    workers = commands.add_parser('workers', help="drain the job queue with worker processes")
+    workers.add_argument('count', type=int, nargs='?', default=WORKER_COUNT,
+                         help=f"number of worker processes (default {WORKER_COUNT})")
+    for command in (enqueue, workers):
+        command.add_argument('--queue-url', metavar='URL',
+                             help="use a queue served by queue-server instead of the local queue file")
+    queue_server = commands.add_parser('queue-server', help="serve the local job queue to other hosts")
+    queue_server.add_argument('port', type=int, nargs='?', default=QUEUE_SERVER_PORT)
+    queue_server.add_argument('--host', help="address to listen on (QUEUE_SERVER_HOST, loopback by default)")
+    browser_server = commands.add_parser('browser-server',
+                                         help="keep a browser running for runs on this host to attach to")
+    browser_server.add_argument('port', type=int, nargs='?', help="debugging port (BROWSER_SERVER_PORT)")
+    sessions = commands.add_parser('sessions', help="list stored per-site browser sessions")
+    sessions.add_argument('site', nargs='?')
+    sessions.add_argument('--clear', action='store_true', help="delete them (all sites, or SITE)")
+    quarantine = commands.add_parser('quarantine', help="list prices held back by validation")
+    quarantine.add_argument('--scan', action='store_true',
+                            help="flag suspect prices already in the stored history instead")
+    return parser
+
+def run_command(args):
+    """Dispatch a parsed command line; returns the process exit code"""
+    command = args.command or 'run'
+    if command == 'run':
+        main(use_async=getattr(args, 'use_async', False), archive=getattr(args, 'archive', False))
+    elif command == 'list':
+        list_products()
+    elif command == 'report':
+        print_summary()
+        if args.xlsx or args.html:
+            write_report(html=args.html, force=args.force)
+    elif command == 'check-alerts':
+        check_alerts()
+    elif command == 'validate-config':
+        return 1 if validate_config() else 0
+    elif command == 'daemon':
+        run_daemon()
+    elif command == 'import-csv':
+        from utils.storage import open_store
+        with open_store('sqlite') as store:
+            store.import_csv(args.path)
+    elif command == 'rebuild-index':
+        count = get_store().rebuild_latest_index()
+        print(f"🗂️ Rebuilt latest-price index for {count} products")
+    elif command == 'compact':
+        compact_history()
+    elif command == 'history':
+        show_history(args.product, args.since, args.until, args.level)
+    elif command == 'replay':
+        replay_archive(args.site, args.product, args.since, args.until, args.latest, args.jobs,
+                       args.output, args.backfill, args.rebuild_index)
+    elif command == 'enqueue':
+        enqueue_products(args.queue_url)
+    elif command == 'workers':
+        run_workers(args.count, args.queue_url)
+    elif command == 'queue-server':
+        serve_queue(args.port, args.host)
+    elif command == 'browser-server':
+        serve_browser(args.port)
+    elif command == 'sessions':
+        manage_sessions(args.clear, args.site)
+    elif command == 'quarantine':
+        show_quarantine(args.scan)
+    return 0
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    args = build_parser().parse_args()
+    timings = profile_imports() if args.profile_startup else None
+    ready_at = time.perf_counter()
+    
+    metrics = None
+    if args.metrics or args.metrics_port or METRICS_ENABLED:
+        from utils.metrics import metrics
+        metrics.configure_from_settings(enabled=True)
+        if args.metrics_port:
+            metrics.serve(args.metrics_port)
+    
+    try:
+        exit_code = run_command(args)
+    finally:
+        close_alerts()
+        if _store is not None:
+            _store.close()
+        if metrics is not None:
+            print_metrics_summary()
+            metrics.close()
+        if timings is not None:
+            print_startup_profile(ready_at, timings)
+    sys.exit(exit_code)
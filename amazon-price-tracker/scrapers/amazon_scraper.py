@@ -1,104 +1,175 @@
 # scrapers/amazon_scraper.py
-from playwright.sync_api import sync_playwright
+import asyncio
+import re
 import time
 import random
 from datetime import datetime
+from utils.anti_detection import PageValidator
+from utils.browser_pool import BrowserPool
+from utils.http_fetcher import HttpPriceFetcher
+from utils.metrics import metrics
+from utils.page_archive import PageArchive
+from scrapers.extraction import ExtractionPlan, rule
+from scrapers.listing import ListingPlan
+from scrapers.navigation import EarlyExit
+
+# Selectors Amazon uses, in priority order - all run in one page.evaluate
+EXTRACTION_PLAN = ExtractionPlan('Amazon', {
+    'price': [
+        # Full "$1,264.30"; a-price-whole alone is "1,264." and loses the cents
+        rule('.a-price .a-offscreen'),
+        rule('span.a-price-whole'),
+        rule('#price_inside_buybox'),
+        rule('.a-price-range'),
+        rule('.a-color-price'),
+        rule('#_price.olpWrapper.a-size-small'),
+    ],
+    'symbol': [
+        rule('span.a-price-symbol'),
+    ],
+    # Use more specific selector to avoid hidden input with same id
+    'title': [
+        rule('span#productTitle'),
+    ],
+})
+
+# Product pages are ready once the plan's first-choice price and title nodes are parsed;
+# the DOM fills in document order, so extraction then picks what a full load would
+NAVIGATION = EarlyExit(
+    'Amazon',
+    price=[EXTRACTION_PLAN.fields['price'][0]['selector']],
+    title=[EXTRACTION_PLAN.fields['title'][0]['selector']],
+    block=['form[action*="validateCaptcha"]'],
+    block_titles=['robot check']
+)
+
+# Set extra headers to avoid detection
+EXTRA_HEADERS = {
+    'Accept-Language': 'en-US,en;q=0.9',
+    'Accept-Encoding': 'gzip, deflate, br',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+}
+
+
+def parse_price(price_text):
+    """Extract the first number from Amazon price text"""
+    if not price_text:
+        return None
+    # Clean up price text
+    price_text = price_text.replace('$', '').replace(',', '').strip()
+    price_match = re.search(r'(\d+\.?\d*)', price_text)
+    if price_match:
+        return float(price_match.group(1))
+    return None
+
+
+def short_title(title):
+    """Trim product title for display"""
+    if title:
+        title = title.strip()
+    return title[:50] + '...' if title and len(title) > 50 else title
+
+
+def build_result(url, extracted):
+    """Turn extraction plan output into a scraper result"""
+    values = extracted['values']
+    price_text = values.get('price')
+    
+    return {
+        'success': True,
+        'price': parse_price(price_text),
+        'currency_symbol': values.get('symbol'),
+        'title': short_title(values.get('title')),
+        'url': url,
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'site': 'Amazon',
+        'tier': 'browser',
+        'matched_selector': extracted['matched'].get('price')
+    }
+
+
+# Search results, category pages and wishlists: one card per product, keyed by data-asin.
+# A search for several ASINs joined with '|' lists each of them.
+LISTING_PLAN = ListingPlan(
+    'Amazon',
+    card='[data-asin]:not([data-asin=""])',
+    price=['.a-price:not([data-a-strike]) .a-offscreen'],
+    parse_price=parse_price,
+    link='a[href*="/dp/"]',
+    title='h2',
+    id_attr='data-asin',
+    id_prefix='amazon',
+    search='https://www.amazon.com/s?k={query}'
+)
+
 
 class AmazonScraper:
-    def __init__(self, headless=True):
+    def __init__(self, headless=True, pool=None, http_first=True, delay=(2, 4)):
         self.headless = headless
-        self.browser = None
+        # Random pause before each product; None when a scheduler paces requests
+        self.delay = delay
+        self.pool = pool
+        # Plain HTTP is tried before the browser when enabled
+        self.http_fetcher = HttpPriceFetcher.shared() if http_first else None
+        self.owns_pool = pool is None
+        self.lease = None
         self.page = None
         
     def start(self):
-        """Launch browser"""
-        self.playwright = sync_playwright().start()
-        self.browser = self.playwright.chromium.launch(
-            headless=self.headless,
-            args=['--disable-blink-features=AutomationControlled']
-        )
-        self.page = self.browser.new_page()
-        
-        # Set extra headers to avoid detection
-        self.page.set_extra_http_headers({
-            'Accept-Language': 'en-US,en;q=0.9',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-        })
+        """Lease a page from the shared pool (or a private one)"""
+        if self.pool is None:
+            self.pool = BrowserPool(headless=self.headless)
+        self.lease = self.pool.lease('Amazon', extra_http_headers=EXTRA_HEADERS)
+        self.page = self.lease.page
         
     def close(self):
-        """Close browser"""
-        if self.browser:
-            self.browser.close()
-        if self.playwright:
-            self.playwright.stop()
+        """Release the page, and the browser if we launched it"""
+        if self.lease:
+            self.pool.release(self.lease)
+            self.lease = None
+        if self.owns_pool and self.pool:
+            self.pool.close()
+            self.pool = None
     
     def get_price(self, url):
         """Get product price from Amazon page"""
         try:
             # Add random delay to avoid detection
-            time.sleep(random.uniform(2, 4))
-            
-            print(f"🔍 Visiting: {url}")
-            self.page.goto(url, timeout=30000)
-            
-            # Try different price selectors Amazon uses
-            price_selectors = [
-                'span.a-price-whole',
-                '.a-price .a-offscreen',
-                '#price_inside_buybox',
-                '.a-price-range',
-                '.a-color-price',
-                '#_price.olpWrapper.a-size-small'
-            ]
-
-            price_symbol_selectors = [
-                'span.a-price-symbol'
-            ]
-            
-            price = None
-            price_text = None
-            price_symbol =None
+            if self.delay:
+                time.sleep(random.uniform(*self.delay))
             
-            for symbol_selector in price_symbol_selectors:
-                element = self.page.locator(symbol_selector).first
-                if element.count() > 0:
-                    price_symbol = element.text_content()
-                    if price_symbol:
-                        break
-
-
-            for selector in price_selectors:
-                element = self.page.locator(selector).first
-                #print(element)
-                if element.count() > 0:
-                    price_text = element.text_content()
-                    if price_text:
-                        break
+            # Fast path: embedded JSON over plain HTTP
+            if self.http_fetcher:
+                result = self.http_fetcher.get_price(url, 'Amazon')
+                if result:
+                    return result
             
-            if price_text:
-                # Clean up price text
-                price_text = price_text.replace('$', '').replace(',', '').strip()
-                # Extract first number found
-                import re
-                print("----------"+price_text)
-                price_match = re.search(r'(\d+\.?\d*)', price_text)
-                if price_match:
-                    price = float(price_match.group(1))
+            print(f"🔍 Visiting: {url}")
+            self.page = self.lease.get_page()
+            with metrics.span('navigation', site='Amazon'):
+                state = NAVIGATION.goto(self.page, url, timeout=30000)
+            self.lease.navigated()
             
-            # Get product title - use more specific selector to avoid hidden input with same id
-            title = self.page.locator('span#productTitle').first.text_content()
-            if title:
-                title = title.strip()
+            # Captcha walls have no price; report them so breakers and session rotation see a block.
+            # The readiness probe already tells a price page from a wall; any other state gets the full check
+            if state == 'blocked' or (state != 'price' and PageValidator.is_blocked(self.page)):
+                metrics.event('blocked', site='Amazon', tier='browser', url=url)
+                archive = PageArchive.shared()
+                if archive:
+                    archive.capture(self.page, url, 'Amazon', status='blocked')
+                self.lease.mark_blocked()
+                return {'success': False, 'error': 'Blocked', 'url': url, 'site': 'Amazon'}
             
-            return {
-                'success': True,
-                'price': price,
-                'title': title[:50] + '...' if title and len(title) > 50 else title,
-                'url': url,
-                'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            }
+            # Price, symbol and title in a single round-trip
+            extracted = EXTRACTION_PLAN.run(self.page)
+            result = build_result(url, extracted)
+            archive = PageArchive.shared()
+            if archive:
+                archive.capture(self.page, url, 'Amazon', result)
+            if self.http_fetcher:
+                self.http_fetcher.remember(url, result)
+            return result
             
         except Exception as e:
             print(f"❌ Error scraping {url}: {str(e)}")
@@ -108,6 +179,67 @@ class AmazonScraper:
                 'url': url,
                 'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             }
+    
+    def get_listing(self, url):
+        """Price every product card on a search, category or wishlist page: {canonical id: result},
+        or None if the page is a block page"""
+        try:
+            if self.delay:
+                time.sleep(random.uniform(*self.delay))
+            
+            print(f"📋 Listing: {url}")
+            self.page = self.lease.get_page()
+            with metrics.span('navigation', site='Amazon', tier='listing'):
+                self.page.goto(url, timeout=30000)
+            self.lease.navigated()
+            
+            if PageValidator.is_blocked(self.page):
+                metrics.event('blocked', site='Amazon', tier='listing', url=url)
+                self.lease.mark_blocked()
+                return None
+            return LISTING_PLAN.run(self.page, url)
+            
+        except Exception as e:
+            print(f"❌ Error reading listing {url}: {str(e)}")
+            return {}
+
+async def fetch_price_async(page, url, delay=(2, 4)):
+    """Async variant of AmazonScraper.get_price for the concurrent engine"""
+    try:
+        if delay:
+            await asyncio.sleep(random.uniform(*delay))
+
+        print(f"🔍 Visiting: {url}")
+        with metrics.span('navigation', site='Amazon'):
+            state = await NAVIGATION.goto_async(page, url, timeout=30000)
+
+        reason = "⚠️ Block marker seen during navigation" if state == 'blocked' else None
+        if state not in ('price', 'blocked'):
+            verdict = await PageValidator.inspect_async(page)
+            reason = verdict.reason if verdict.blocked else None
+        if reason:
+            metrics.event('blocked', site='Amazon', tier='browser', url=url, reason=reason)
+            archive = PageArchive.shared()
+            if archive:
+                await archive.capture_async(page, url, 'Amazon', status='blocked')
+            return {'success': False, 'error': 'Blocked', 'url': url, 'site': 'Amazon'}
+
+        extracted = await EXTRACTION_PLAN.run_async(page)
+        result = build_result(url, extracted)
+        archive = PageArchive.shared()
+        if archive:
+            await archive.capture_async(page, url, 'Amazon', result)
+        return result
+
+    except Exception as e:
+        print(f"❌ Error scraping {url}: {str(e)}")
+        return {
+            'success': False,
+            'error': str(e),
+            'url': url,
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'site': 'Amazon'
+        }
 
 # Simple test function
 def test_scraper():
@@ -0,0 +1,232 @@
+# scrapers/async_engine.py
+import asyncio
+import itertools
+import random
+from playwright.async_api import async_playwright
+from utils.anti_detection import BrowserLauncher, STEALTH_SCRIPT
+from utils.resource_blocker import ResourceBlocker
+from utils.http_fetcher import HttpPriceFetcher
+from utils.metrics import metrics
+from utils.scheduler import failure_kind
+from utils.session_store import pinned_options, session_options
+from utils.urls import domain_of
+from scrapers import registry
+
+
+class AsyncScrapeEngine:
+    """Scrape many products concurrently with one browser and bounded concurrency"""
+
+    def __init__(self, headless=True, max_concurrency=8, site_concurrency=None,
+                 delay=(2, 4), on_result=None, block_resources=True, http_first=True,
+                 retry_policy=None, breakers=None, endpoint=None, sessions=None, watchdog=None):
+        self.headless = headless
+        # Optional: attach to a running browser server, reuse per-site sessions (SessionStore)
+        self.endpoint = endpoint
+        self.sessions = sessions
+        # Optional ResourceWatchdog: swap in a fresh browser once the current one grows too big
+        self.watchdog = watchdog
+        self._playwright = None
+        self._connected = False
+        self._swaps = {}       # browser handed to fetch() -> the browser that replaced it
+        self._contexts = {}    # browser -> contexts open on it
+        self._retiring = set()
+        self._swap_lock = asyncio.Lock()
+        # Optional: requeue failures with backoff (RetryPolicy), shed walled sites (DomainBreakers)
+        self.retry_policy = retry_policy
+        self.breakers = breakers
+        self.http_first = http_first
+        self.block_resources = block_resources
+        self.max_concurrency = max_concurrency
+        self.site_concurrency = site_concurrency or {}
+        self.delay = delay
+        self.on_result = on_result
+
+    def _site_semaphore(self, site):
+        """Per-site limit, falling back to the global limit"""
+        if site not in self._site_limits:
+            limit = self.site_concurrency.get(site, self.max_concurrency)
+            self._site_limits[site] = asyncio.Semaphore(limit)
+        return self._site_limits[site]
+
+    async def fetch(self, browser, product):
+        """Fetch one product (HTTP tier, then its own browser context) with no pacing"""
+        fetcher = registry.async_fetcher(product['site'])
+        if fetcher is None:
+            return {'success': False, 'error': f"Unknown site: {product['site']}"}
+
+        # Fast path: plain HTTP in a worker thread, browser only if it fails
+        if self.http_first:
+            result = await asyncio.to_thread(
+                HttpPriceFetcher.shared().get_price, product['url'], product['site']
+            )
+            if result:
+                return result
+
+        browser = await self._current_browser(browser)
+        # Counted before any await so a browser being retired isn't closed under this page
+        self._contexts[browser] = self._contexts.get(browser, 0) + 1
+        context = session = result = None
+        try:
+            options = BrowserLauncher.context_options()
+            if self.sessions:
+                session = await asyncio.to_thread(self.sessions.checkout, product['site'])
+                options = session_options(session, options)
+                if not session['options']:
+                    session['options'] = pinned_options(options)
+            context = await browser.new_context(**options)
+            await context.add_init_script(STEALTH_SCRIPT)
+            blocker = ResourceBlocker.for_site(product['site']) if self.block_resources else None
+            if blocker:
+                await blocker.attach_async(context)
+            page = await context.new_page()
+            result = await fetcher(page, product['url'], delay=None)
+            if self.http_first:
+                HttpPriceFetcher.shared().remember(product['url'], result)
+            return result
+        finally:
+            if context is not None:
+                if session:
+                    await self._keep_session(context, session, result)
+                await context.close()
+            self._contexts[browser] = self._contexts.get(browser, 1) - 1
+            if browser in self._retiring and not self._contexts[browser]:
+                await self._close(browser)
+
+    async def _keep_session(self, context, session, result):
+        """Save the context's cookies for the next run, or drop the session if it got blocked"""
+        try:
+            if failure_kind(result) == 'blocked':
+                await asyncio.to_thread(self.sessions.invalidate, session)
+            elif result is not None:
+                state = await context.storage_state()
+                await asyncio.to_thread(self.sessions.save, session, state)
+        except Exception as e:
+            print(f"⚠️ Could not save {session['site']} session: {str(e)}")
+
+    async def _attempt(self, browser, product):
+        """Fetch one product within the site and global limits"""
+        # Take the site slot first so a busy site doesn't hold global slots while waiting
+        async with self._site_semaphore(product['site']):
+            if self.delay:
+                await asyncio.sleep(random.uniform(*self.delay))
+            async with self._global_limit:
+                with metrics.span('scrape', site=product['site']):
+                    return await self.fetch(browser, product)
+
+    async def _scrape(self, browser, product):
+        """Fetch a product, retrying with backoff; waits hold no slots so other products keep going"""
+        domain = domain_of(product['url'])
+        max_wait = self.retry_policy.max_delay if self.retry_policy else 0
+        attempt = 1
+        while True:
+            if self.breakers:
+                wait = self.breakers.allow(domain)
+                if wait:
+                    if wait > max_wait:
+                        return product, {'success': False, 'error': f"Circuit open for {domain}",
+                                         'site': product['site']}
+                    await asyncio.sleep(wait)
+                    continue
+
+            result = await self._attempt(browser, product)
+            kind = failure_kind(result)
+            if self.breakers:
+                self.breakers.record(domain, kind)
+            if not (self.retry_policy and self.retry_policy.should_retry(attempt, kind)):
+                return product, result
+
+            delay = self.retry_policy.delay(attempt)
+            attempt += 1
+            metrics.incr('retries', operation='scrape', reason=kind)
+            print(f"🔄 [{product['site']}] {product['name']}: {kind}, "
+                  f"retry {attempt}/{self.retry_policy.max_attempts} in {delay:.0f}s")
+            await asyncio.sleep(delay)
+
+    async def _current_browser(self, browser):
+        """Browser for the next context: `browser`, or a fresh one that replaced it after the
+        watchdog found the browser tree too big; the old one closes once its pages finish"""
+        if not (self.watchdog and self._playwright and not self._connected):
+            return self._swaps.get(browser, browser)
+        async with self._swap_lock:
+            current = self._swaps.get(browser, browser)
+            if not self.watchdog.browser_over_limit():
+                return current
+            self._swaps[browser] = await self._launch_browser(self._playwright)
+            self.watchdog.restarted()
+            print("♻️ Started a fresh browser to release memory; the old one closes when its pages finish")
+            if self._contexts.get(current):
+                self._retiring.add(current)
+            else:
+                await self._close(current)
+            return self._swaps[browser]
+
+    async def _close(self, browser):
+        self._retiring.discard(browser)
+        self._contexts.pop(browser, None)
+        try:
+            await browser.close()
+        except Exception:
+            pass
+
+    async def _launch_browser(self, playwright):
+        return await playwright.chromium.launch(
+            headless=self.headless,
+            args=BrowserLauncher.chromium_args()
+        )
+
+    async def launch(self, playwright):
+        """Attach to the browser server if there is one, else launch the engine's browser"""
+        self._playwright = playwright
+        if self.endpoint:
+            try:
+                browser = await playwright.chromium.connect_over_cdp(self.endpoint)
+                self._connected = True
+                return browser
+            except Exception as e:
+                print(f"⚠️ Browser server at {self.endpoint} unavailable ({str(e)}); launching instead")
+        return await self._launch_browser(playwright)
+
+    async def close(self, browser):
+        """Close a browser from launch() and any browser that replaced it"""
+        for replaced in [self._swaps.pop(browser, None), *self._retiring, browser]:
+            if replaced is not None:
+                await self._close(replaced)
+
+    async def run(self, products, keep_results=True):
+        """Scrape all products, handing each result to on_result as it completes.
+
+        products may be any iterable (a streamed catalog); only a window of
+        them is turned into tasks at a time, so memory doesn't grow with its size.
+        """
+        self._global_limit = asyncio.Semaphore(self.max_concurrency)
+        self._site_limits = {}
+        results = []
+        products = iter(products)
+        window = self.max_concurrency * 4
+
+        async with async_playwright() as playwright:
+            browser = await self.launch(playwright)
+            pending = set()
+            try:
+                while True:
+                    for product in itertools.islice(products, window - len(pending)):
+                        pending.add(asyncio.create_task(self._scrape(browser, product)))
+                    if not pending:
+                        break
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for finished in done:
+                        product, result = finished.result()
+                        if keep_results:
+                            results.append((product, result))
+                        if self.on_result:
+                            self.on_result(product, result)
+            finally:
+                for task in pending:
+                    task.cancel()
+                await self.close(browser)
+
+        return results
+
+    def run_sync(self, products, keep_results=True):
+        """Blocking entry point for scripts"""
+        return asyncio.run(self.run(products, keep_results))
@@ -0,0 +1,162 @@
+# scrapers/extraction.py
+import json
+import os
+import re
+
+from utils.html_query import parse_html, select_one
+from utils.metrics import metrics
+
+# Walks every field's rules in priority order inside the page, so a whole
+# extraction costs one driver round-trip no matter how many selectors miss.
+EXTRACT_JS = """
+(spec) => {
+    const out = {values: {}, matched: {}, tried: {}};
+    for (const [field, rules] of Object.entries(spec)) {
+        out.tried[field] = [];
+        for (const rule of rules) {
+            out.tried[field].push(rule.selector);
+            let el = null;
+            try {
+                el = document.querySelector(rule.selector);
+            } catch (e) {
+                el = null;
+            }
+            if (!el) continue;
+            let value = rule.attr ? el.getAttribute(rule.attr) : el.textContent;
+            if (value && rule.regex) {
+                const m = value.match(new RegExp(rule.regex));
+                value = m ? (m[1] || m[0]) : null;
+            }
+            if (value && value.trim()) {
+                out.values[field] = value.trim();
+                out.matched[field] = rule.selector;
+                break;
+            }
+        }
+    }
+    return out;
+}
+"""
+
+
+def evaluate_html(document, spec):
+    """EXTRACT_JS over a parsed document (utils.html_query), with the same output shape"""
+    out = {'values': {}, 'matched': {}, 'tried': {}}
+    for field, rules in spec.items():
+        out['tried'][field] = []
+        for rule in rules:
+            out['tried'][field].append(rule['selector'])
+            try:
+                element = select_one(document, rule['selector'])
+            except ValueError:
+                element = None
+            if element is None:
+                continue
+            value = element.get(rule['attr']) if rule['attr'] else element.text
+            if value and rule['regex']:
+                match = re.search(rule['regex'], value)
+                value = (match.group(1) if match.groups() and match.group(1) else match.group(0)) if match else None
+            if value and value.strip():
+                out['values'][field] = value.strip()
+                out['matched'][field] = rule['selector']
+                break
+    return out
+
+
+def rule(selector, attr=None, regex=None):
+    """One prioritized way to read a field"""
+    return {'selector': selector, 'attr': attr, 'regex': regex}
+
+
+class SelectorStats:
+    """Per-selector hit rates across runs, for spotting dead selectors"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.counts = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self.counts = json.load(f)
+            except (OSError, ValueError):
+                self.counts = {}
+
+    def record(self, site, field, tried, matched):
+        """Count a hit for the matched selector and a miss for each one tried before it"""
+        for selector in tried:
+            key = f"{site}|{field}|{selector}"
+            entry = self.counts.setdefault(key, {'attempts': 0, 'hits': 0})
+            entry['attempts'] += 1
+            if selector == matched:
+                entry['hits'] += 1
+
+    def hit_rates(self):
+        """{(site, field, selector): (hits, attempts, rate)}"""
+        rates = {}
+        for key, entry in self.counts.items():
+            site, field, selector = key.split('|', 2)
+            attempts = entry['attempts']
+            rates[(site, field, selector)] = (entry['hits'], attempts, entry['hits'] / attempts if attempts else 0.0)
+        return rates
+
+    def dead_selectors(self, min_attempts=20):
+        """Selectors that were tried often enough and never matched"""
+        return sorted(
+            key for key, (hits, attempts, _) in self.hit_rates().items()
+            if attempts >= min_attempts and hits == 0
+        )
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'w') as f:
+            json.dump(self.counts, f, indent=2, sort_keys=True)
+
+
+class ExtractionPlan:
+    """Declarative per-site spec of fields -> prioritized selector rules"""
+
+    stats = SelectorStats()
+
+    def __init__(self, site, fields):
+        self.site = site
+        self.fields = fields
+
+    def _finish(self, raw):
+        for field in self.fields:
+            tried, matched = raw['tried'].get(field, []), raw['matched'].get(field)
+            self.stats.record(self.site, field, tried, matched)
+            misses = len(tried) - (1 if matched else 0)
+            if misses:
+                metrics.incr('selector_misses', misses, site=self.site, field=field)
+            if not matched:
+                metrics.incr('field_not_found', site=self.site, field=field)
+        return {
+            'values': raw['values'],
+            'matched': raw['matched'],
+        }
+
+    def run(self, page):
+        """Extract every field with a single page.evaluate (sync API)"""
+        with metrics.span('extraction', site=self.site):
+            raw = page.evaluate(EXTRACT_JS, self.fields)
+        return self._finish(raw)
+
+    async def run_async(self, page):
+        """Extract every field with a single page.evaluate (async API)"""
+        with metrics.span('extraction', site=self.site):
+            raw = await page.evaluate(EXTRACT_JS, self.fields)
+        return self._finish(raw)
+
+    def run_html(self, page_html):
+        """Same extraction over saved HTML, in Python - for replaying archived pages"""
+        with metrics.span('extraction', site=self.site, tier='offline'):
+            raw = evaluate_html(parse_html(page_html), self.fields)
+        return self._finish(raw)
+
+    @classmethod
+    def use_stats_file(cls, path):
+        """Load persisted hit rates so they accumulate across runs"""
+        cls.stats = SelectorStats(path)
+        return cls.stats
@@ -0,0 +1,231 @@
+# scrapers/listing.py
+from datetime import datetime
+from urllib.parse import quote, urljoin
+
+from utils.metrics import metrics
+from utils.urls import canonical_id
+
+# Reads every product card on the page in one driver round-trip
+LISTING_JS = """
+(spec) => {
+    const text = (root, selector) => {
+        let el = null;
+        try {
+            el = selector ? root.querySelector(selector) : null;
+        } catch (e) {
+            el = null;
+        }
+        const value = el ? el.textContent.trim() : '';
+        return value || null;
+    };
+    const cards = [];
+    for (const card of document.querySelectorAll(spec.card)) {
+        let price = null;
+        for (const selector of spec.price) {
+            const value = text(card, selector);
+            if (value && /\\d/.test(value)) {
+                price = value;
+                break;
+            }
+        }
+        const link = spec.link ? card.querySelector(spec.link) : null;
+        cards.push({
+            id: spec.id_attr ? card.getAttribute(spec.id_attr) : null,
+            href: link ? link.getAttribute('href') : null,
+            price: price,
+            title: text(card, spec.title),
+        });
+    }
+    return cards;
+}
+"""
+
+
+class ListingPlan:
+    """Where product cards sit on a site's search, category and wishlist pages.
+
+    One page.evaluate returns every card's id or link, price and title;
+    match() keys the priced cards by canonical product id, so a listing
+    page prices every tracked product on it with a single navigation.
+    """
+
+    def __init__(self, site, card, price, parse_price, link=None, title=None, id_attr=None, id_prefix=None,
+                 search=None):
+        self.site = site
+        self.parse_price = parse_price
+        self.spec = {
+            'card': card,
+            'price': list(price),
+            'link': link,
+            'title': title,
+            'id_attr': id_attr,
+        }
+        # Cards carrying the product id as an attribute skip the link parse
+        self.id_prefix = id_prefix
+        # Search URL template with a {query} slot, for sites that can search by product id
+        self.search = search
+
+    def search_url(self, product_ids):
+        """Search results page listing these canonical ids, or None if the site can't search by id"""
+        if not self.search or not product_ids:
+            return None
+        query = '|'.join(product_id.split(':', 1)[-1] for product_id in product_ids)
+        return self.search.format(query=quote(query, safe=''))
+
+    def match(self, cards, url):
+        """{canonical id: result} for every card with a price; the first card of a product wins"""
+        found = {}
+        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        for card in cards:
+            price = self.parse_price(card.get('price'))
+            if not price:
+                continue
+            href = urljoin(url, card['href']) if card.get('href') else None
+            if card.get('id') and self.id_prefix:
+                key = f"{self.id_prefix}:{card['id'].strip().upper()}"
+            elif href:
+                key = canonical_id(href)
+            else:
+                continue
+            if key in found:
+                continue
+            title = card.get('title')
+            found[key] = {
+                'success': True,
+                'price': price,
+                'title': title[:50] + '...' if title and len(title) > 50 else title,
+                'url': href,
+                'timestamp': timestamp,
+                'site': self.site,
+                'tier': 'listing',
+                'listing_url': url,
+            }
+        metrics.incr('listing_cards', len(cards), site=self.site)
+        return found
+
+    def run(self, page, url):
+        """Price every card on a loaded listing page"""
+        with metrics.span('extraction', site=self.site, tier='listing'):
+            cards = page.evaluate(LISTING_JS, self.spec)
+        return self.match(cards, url)
+
+
+class ListingBatcher:
+    """Prices tracked products from listing pages so most never need a navigation of their own.
+
+    LISTING_URLS pages (wishlists, categories) are read once up front.
+    The catalog is then taken `batch_size` products at a time, and each
+    site that can search by product id gets one search for the batch's
+    products. filter() hands every priced product to on_hit and yields the
+    misses, which go on to their own product pages as before. Only the
+    sequential run batches; the async engine, queue workers and daemon
+    visit every product page.
+    """
+
+    def __init__(self, scraper_for, limiter=None, breakers=None, batch_size=20, min_batch=3,
+                 listing_urls=None):
+        self.scraper_for = scraper_for
+        self.limiter = limiter
+        self.breakers = breakers
+        self.batch_size = max(1, batch_size)
+        # A search only pays off when it covers several products
+        self.min_batch = min_batch
+        self.listing_urls = listing_urls or {}
+        self.listed = None
+        self.stats = {'pages': 0, 'hits': 0, 'misses': 0}
+
+    @classmethod
+    def from_settings(cls, scraper_for, limiter=None, breakers=None):
+        """Batcher configured in settings, or None when listing pages are off"""
+        from config import settings
+
+        if not getattr(settings, 'LISTING_ENABLED', False):
+            return None
+        return cls(
+            scraper_for,
+            limiter=limiter,
+            breakers=breakers,
+            batch_size=settings.LISTING_BATCH_SIZE,
+            min_batch=settings.LISTING_MIN_BATCH,
+            listing_urls=settings.LISTING_URLS
+        )
+
+    def _read(self, site, url):
+        """{canonical id: result} from one listing page; {} if it can't be read or is blocked"""
+        from utils.scheduler import domain_of
+
+        scraper = self.scraper_for(site)
+        if scraper is None or not hasattr(scraper, 'get_listing'):
+            return {}
+        domain = domain_of(url)
+        if self.breakers and self.breakers.allow(domain):
+            return {}
+        if self.limiter:
+            self.limiter.acquire(domain)
+        try:
+            with metrics.span('scrape', site=site, tier='listing'):
+                found = scraper.get_listing(url)
+        finally:
+            if self.limiter:
+                self.limiter.release(domain)
+        if self.breakers:
+            # A walled listing counts against the domain like a walled product page, so the
+            # batch's misses don't each walk into the same block; an empty page proves nothing
+            if found is None:
+                self.breakers.record(domain, 'blocked')
+            else:
+                self.breakers.record(domain, None if found else 'error')
+        self.stats['pages'] += 1
+        metrics.incr('listing_pages', site=site)
+        return found or {}
+
+    def _read_listings(self):
+        self.listed = {}
+        for site, urls in self.listing_urls.items():
+            for url in urls:
+                for key, result in self._read(site, url).items():
+                    self.listed.setdefault(key, result)
+        if self.listed:
+            print(f"📋 {len(self.listed)} priced products on {self.stats['pages']} listing pages")
+
+    def _search(self, batch, on_hit):
+        from scrapers import registry
+
+        sites = {}
+        for product in batch:
+            sites.setdefault(product['site'], []).append(product)
+
+        for site, products in sites.items():
+            plan = registry.listing(site) if len(products) >= self.min_batch else None
+            url = plan.search_url([product['id'] for product in products]) if plan else None
+            found = self._read(site, url) if url else {}
+            for product in products:
+                result = found.get(product['id'])
+                if result:
+                    self._hit(product, result, on_hit)
+                else:
+                    self.stats['misses'] += 1
+                    metrics.incr('listing_misses', site=site)
+                    yield product
+
+    def _hit(self, product, result, on_hit):
+        self.stats['hits'] += 1
+        print(f"{'='*60}")
+        print(f"Checking: {product['name']} (from listing page)")
+        on_hit(product, result)
+
+    def filter(self, products, on_hit):
+        """Products still needing their own page; the rest go to on_hit(product, result)"""
+        if self.listed is None:
+            self._read_listings()
+        batch = []
+        for product in products:
+            result = self.listed.pop(product['id'], None)
+            if result:
+                self._hit(product, result, on_hit)
+                continue
+            batch.append(product)
+            if len(batch) >= self.batch_size:
+                yield from self._search(batch, on_hit)
+                batch = []
+        yield from self._search(batch, on_hit)
@@ -0,0 +1,110 @@
+# scrapers/navigation.py
+import time
+
+from utils.metrics import metrics
+
+# Truthy once the page holds what we came for: the price (and title), a block page,
+# or a finished load that has neither
+READY_JS = """
+(spec) => {
+    const found = (selectors, needDigit) => selectors.some(selector => {
+        let el = null;
+        try {
+            el = document.querySelector(selector);
+        } catch (e) {
+            el = null;
+        }
+        return !!el && (!needDigit || /\\d/.test(el.textContent));
+    });
+    const title = (document.title || '').toLowerCase();
+    if (found(spec.block, false) || spec.block_titles.some(marker => title.includes(marker))) {
+        return 'blocked';
+    }
+    if (found(spec.price, true) && (!spec.title.length || found(spec.title, false))) {
+        return 'price';
+    }
+    return document.readyState === 'complete' ? 'loaded' : false;
+}
+"""
+
+STOP_JS = "() => window.stop()"
+
+
+def early_exit_enabled():
+    from config import settings
+
+    return getattr(settings, 'NAVIGATION_EARLY_EXIT', False)
+
+
+class EarlyExit:
+    """Navigation that returns as soon as a product page is usable, not when it has loaded.
+
+    goto() waits only for the response to commit, then races the site's
+    readiness condition (price and title nodes present, or a block-page
+    marker) against the timeout, and calls window.stop() so the rest of the
+    page (scripts, ads, lazy widgets) never loads. Extraction then runs on
+    the DOM as it is. The commit and ready phases are timed separately
+    under 'navigation_commit' and 'navigation_ready', and 'navigation_exit'
+    counts how each one ended; with NAVIGATION_EARLY_EXIT off, goto() is a
+    plain full-load page.goto for comparison.
+    """
+
+    def __init__(self, site, price, title=(), block=(), block_titles=(), poll_ms=50):
+        self.site = site
+        self.spec = {
+            'price': list(price),
+            'title': list(title),
+            'block': list(block),
+            'block_titles': [marker.lower() for marker in block_titles],
+        }
+        self.poll_ms = poll_ms
+
+    def _finish(self, state):
+        metrics.incr('navigation_exit', site=self.site, state=state)
+        if state not in ('price', 'blocked'):
+            print(f"⏳ {self.site} page not ready early ({state}), extracting anyway")
+        return state
+
+    def goto(self, page, url, timeout=30000):
+        """Navigate (sync API); returns 'price', 'blocked', 'loaded', 'timeout' or 'load' when disabled"""
+        from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+
+        if not early_exit_enabled():
+            page.goto(url, timeout=timeout)
+            return 'load'
+        started = time.perf_counter()
+        with metrics.span('navigation_commit', site=self.site):
+            page.goto(url, timeout=timeout, wait_until='commit')
+        remaining = max(1000, timeout - (time.perf_counter() - started) * 1000)
+        try:
+            with metrics.span('navigation_ready', site=self.site):
+                handle = page.wait_for_function(READY_JS, arg=self.spec, timeout=remaining,
+                                                polling=self.poll_ms)
+                state = handle.json_value()
+        except PlaywrightTimeoutError:
+            state = 'timeout'
+        if state != 'loaded':
+            page.evaluate(STOP_JS)
+        return self._finish(state)
+
+    async def goto_async(self, page, url, timeout=30000):
+        """goto() for async API pages"""
+        from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+        if not early_exit_enabled():
+            await page.goto(url, timeout=timeout)
+            return 'load'
+        started = time.perf_counter()
+        with metrics.span('navigation_commit', site=self.site):
+            await page.goto(url, timeout=timeout, wait_until='commit')
+        remaining = max(1000, timeout - (time.perf_counter() - started) * 1000)
+        try:
+            with metrics.span('navigation_ready', site=self.site):
+                handle = await page.wait_for_function(READY_JS, arg=self.spec, timeout=remaining,
+                                                      polling=self.poll_ms)
+                state = await handle.json_value()
+        except PlaywrightTimeoutError:
+            state = 'timeout'
+        if state != 'loaded':
+            await page.evaluate(STOP_JS)
+        return self._finish(state)
@@ -0,0 +1,91 @@
+# scrapers/registry.py
+from importlib import import_module
+
+# Site name -> where its scraper lives. Modules are only imported when a
+# site is actually scraped, so config checks and reports never load Playwright.
+SITES = {
+    'Amazon': {
+        'module': 'scrapers.amazon_scraper',
+        'scraper': 'AmazonScraper',
+        'fetch_async': 'fetch_price_async',
+        'plan': 'EXTRACTION_PLAN',
+        'build_result': 'build_result',
+        'listing': 'LISTING_PLAN',
+        'domains': ['amazon.com'],
+    },
+    'Walmart': {
+        'module': 'scrapers.walmart_scraper',
+        'scraper': 'WalmartScraper',
+        'fetch_async': 'fetch_price_async',
+        'plan': 'EXTRACTION_PLAN',
+        'build_result': 'build_result',
+        'listing': 'LISTING_PLAN',
+        'domains': ['walmart.com'],
+    },
+}
+
+# domain -> site, built on first lookup and rebuilt after register()
+_domain_sites = None
+
+
+def register(site, module, scraper, fetch_async='fetch_price_async', domains=(),
+             plan='EXTRACTION_PLAN', build_result='build_result', listing=None):
+    """Add a site without importing its module"""
+    SITES[site] = {
+        'module': module,
+        'scraper': scraper,
+        'fetch_async': fetch_async,
+        'plan': plan,
+        'build_result': build_result,
+        'listing': listing,
+        'domains': list(domains),
+    }
+    global _domain_sites
+    _domain_sites = None
+
+
+def site_names():
+    return list(SITES)
+
+
+def domain_sites():
+    """{domain: site} for every registered domain"""
+    global _domain_sites
+    if _domain_sites is None:
+        _domain_sites = {domain: site for site, entry in SITES.items() for domain in entry['domains']}
+    return _domain_sites
+
+
+def site_for_domain(domain):
+    """Site registered for a domain (as returned by scheduler.domain_of), or None"""
+    return domain_sites().get(domain)
+
+
+def _load(site, attribute):
+    entry = SITES.get(site)
+    if entry is None or not entry.get(attribute):
+        return None
+    return getattr(import_module(entry['module']), entry[attribute])
+
+
+def scraper_class(site):
+    """Sync scraper class for a site (imports its browser dependencies)"""
+    return _load(site, 'scraper')
+
+
+def async_fetcher(site):
+    """fetch_price_async(page, url, delay) for a site"""
+    return _load(site, 'fetch_async')
+
+
+def extraction(site):
+    """(ExtractionPlan, build_result) for a site, for re-extracting saved pages"""
+    plan = _load(site, 'plan')
+    if plan is None:
+        return None
+    return plan, _load(site, 'build_result')
+
+
+def listing(site):
+    """ListingPlan for a site's search/category pages, or None if it has none"""
+    return _load(site, 'listing')
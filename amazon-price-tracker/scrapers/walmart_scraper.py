@@ -1,83 +1,210 @@
 # scrapers/walmart_scraper.py
+import asyncio
+import random
 import re
 from datetime import datetime
 from utils.anti_detection import (
-    BrowserLauncher, 
     PageValidator, 
     AntiDetection, 
     ScraperHelper
 )
+from utils.browser_pool import BrowserPool
+from utils.http_fetcher import HttpPriceFetcher
+from utils.metrics import metrics
+from utils.page_archive import PageArchive
+from scrapers.extraction import ExtractionPlan, rule
+from scrapers.listing import ListingPlan
+from scrapers.navigation import EarlyExit
+
+# Only accept a price element whose text actually holds a number
+PRICE_NUMBER = r'(\d+\.?\d*)'
+
+EXTRACTION_PLAN = ExtractionPlan('Walmart', {
+    'price': [
+        rule('[data-automation-id="product-price"]', regex=PRICE_NUMBER),
+        rule('[itemprop="price"]', regex=PRICE_NUMBER),
+        rule('.price-now', regex=PRICE_NUMBER),
+        rule('.prod-price', regex=PRICE_NUMBER),
+    ],
+    'title': [
+        rule('h1'),
+    ],
+})
+
+
+def parse_price(price_text):
+    """Extract number from Walmart price text"""
+    if not price_text:
+        return None
+    price_match = re.search(r'(\d+\.?\d*)', price_text)
+    if price_match:
+        return float(price_match.group(1))
+    return None
+
+
+def build_result(url, extracted):
+    """Turn extraction plan output into a scraper result"""
+    price = parse_price(extracted['values'].get('price'))
+    title = extracted['values'].get('title')
+    
+    if price:
+        return {
+            'success': True,
+            'price': price,
+            'title': title[:50] + '...' if title and len(title) > 50 else title,
+            'url': url,
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'site': 'Walmart',
+            'tier': 'browser',
+            'matched_selector': extracted['matched'].get('price')
+        }
+    else:
+        return {'success': False, 'error': 'Price not found', 'site': 'Walmart'}
+
+
+# Stop loading once the first-choice price and the title are in the DOM, or the
+# PerimeterX challenge shows up
+NAVIGATION = EarlyExit(
+    'Walmart',
+    price=[EXTRACTION_PLAN.fields['price'][0]['selector']],
+    title=[EXTRACTION_PLAN.fields['title'][0]['selector']],
+    block=['#px-captcha'],
+    block_titles=['robot or human']
+)
+
+
+# Search, category and list pages; cards are matched by their /ip/ link. Walmart
+# has no search by item id, so only LISTING_URLS pages are read.
+LISTING_PLAN = ListingPlan(
+    'Walmart',
+    card='[data-item-id]',
+    price=['[data-automation-id="product-price"]', '[itemprop="price"]'],
+    parse_price=parse_price,
+    link='a[href*="/ip/"]',
+    title='[data-automation-id="product-title"]'
+)
+
 
 class WalmartScraper:
-    def __init__(self, headless=True):
+    def __init__(self, headless=True, pool=None, http_first=True, delay=(2, 4)):
         self.headless = headless
-        self.browser = None
+        # Random pause before each product; None when a scheduler paces requests
+        self.delay = delay
+        self.pool = pool
+        # Plain HTTP is tried before the browser when enabled
+        self.http_fetcher = HttpPriceFetcher.shared() if http_first else None
+        self.owns_pool = pool is None
+        self.lease = None
         self.page = None
-        self.playwright = None
         
     def start(self):
-        """Launch Chromium browser"""
-        self.playwright, self.browser, self.page = BrowserLauncher.launch_chromium(
-            headless=self.headless
-        )
+        """Lease a Chromium page from the shared pool (or a private one)"""
+        if self.pool is None:
+            self.pool = BrowserPool(headless=self.headless)
+        self.lease = self.pool.lease('Walmart')
+        self.page = self.lease.page
         
     def close(self):
-        """Close browser"""
-        if self.browser:
-            self.browser.close()
-        if self.playwright:
-            self.playwright.stop()
+        """Release the page, and the browser if we launched it"""
+        if self.lease:
+            self.pool.release(self.lease)
+            self.lease = None
+        if self.owns_pool and self.pool:
+            self.pool.close()
+            self.pool = None
     
     def get_price(self, url):
         """Get product price from Walmart"""
         try:
             # Simple delay
-            AntiDetection.human_delay(2, 4)
+            if self.delay:
+                AntiDetection.human_delay(*self.delay)
+            
+            # Fast path: embedded JSON over plain HTTP
+            if self.http_fetcher:
+                result = self.http_fetcher.get_price(url, 'Walmart')
+                if result:
+                    return result
             
             # Go to page
-            self.page.goto(url, timeout=30000)
+            self.page = self.lease.get_page()
+            with metrics.span('navigation', site='Walmart'):
+                state = NAVIGATION.goto(self.page, url, timeout=30000)
+            self.lease.navigated()
             
-            # Check if blocked
-            if PageValidator.is_blocked(self.page):
+            # Check if blocked (the readiness probe has already sorted 'price' and 'blocked' pages)
+            if state == 'blocked' or (state != 'price' and PageValidator.is_blocked(self.page)):
+                metrics.event('blocked', site='Walmart', tier='browser', url=url)
+                archive = PageArchive.shared()
+                if archive:
+                    archive.capture(self.page, url, 'Walmart', status='blocked')
+                self.lease.mark_blocked()
                 return {'success': False, 'error': 'Blocked', 'site': 'Walmart'}
             
-            # Try price selectors
-            price_selectors = [
-                '[data-automation-id="product-price"]',
-                '[itemprop="price"]',
-                '.price-now',
-                '.prod-price'
-            ]
-            
-            price = None
-            for selector in price_selectors:
-                element = self.page.locator(selector).first
-                if element.count() > 0:
-                    price_text = element.text_content()
-                    if price_text:
-                        # Extract number
-                        price_match = re.search(r'(\d+\.?\d*)', price_text)
-                        if price_match:
-                            price = float(price_match.group(1))
-                            break
+            # Price and title in a single round-trip
+            extracted = EXTRACTION_PLAN.run(self.page)
+            result = build_result(url, extracted)
+            archive = PageArchive.shared()
+            if archive:
+                archive.capture(self.page, url, 'Walmart', result)
+            if self.http_fetcher:
+                self.http_fetcher.remember(url, result)
+            return result
+                
+        except Exception as e:
+            return {'success': False, 'error': str(e), 'site': 'Walmart'}
+    
+    def get_listing(self, url):
+        """Price every product card on a search, category or list page: {canonical id: result},
+        or None if the page is a block page"""
+        try:
+            if self.delay:
+                AntiDetection.human_delay(*self.delay)
             
-            # Get title
-            title = self.page.locator('h1').first.text_content()
+            self.page = self.lease.get_page()
+            with metrics.span('navigation', site='Walmart', tier='listing'):
+                self.page.goto(url, timeout=30000)
+            self.lease.navigated()
             
-            if price:
-                return {
-                    'success': True,
-                    'price': price,
-                    'title': title[:50] + '...' if title and len(title) > 50 else title,
-                    'url': url,
-                    'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                    'site': 'Walmart'
-                }
-            else:
-                return {'success': False, 'error': 'Price not found', 'site': 'Walmart'}
+            if PageValidator.is_blocked(self.page):
+                metrics.event('blocked', site='Walmart', tier='listing', url=url)
+                self.lease.mark_blocked()
+                return None
+            return LISTING_PLAN.run(self.page, url)
                 
         except Exception as e:
-            return {'success': False, 'error': str(e), 'site': 'Walmart'}
+            print(f"❌ Error reading listing {url}: {str(e)}")
+            return {}
+
+async def fetch_price_async(page, url, delay=(2, 4)):
+    """Async variant of WalmartScraper.get_price for the concurrent engine"""
+    try:
+        if delay:
+            await asyncio.sleep(random.uniform(*delay))
+
+        with metrics.span('navigation', site='Walmart'):
+            state = await NAVIGATION.goto_async(page, url, timeout=30000)
+
+        reason = "⚠️ Block marker seen during navigation" if state == 'blocked' else None
+        if state not in ('price', 'blocked'):
+            verdict = await PageValidator.inspect_async(page)
+            reason = verdict.reason if verdict.blocked else None
+        if reason:
+            metrics.event('blocked', site='Walmart', tier='browser', url=url, reason=reason)
+            archive = PageArchive.shared()
+            if archive:
+                await archive.capture_async(page, url, 'Walmart', status='blocked')
+            return {'success': False, 'error': 'Blocked', 'site': 'Walmart'}
+
+        extracted = await EXTRACTION_PLAN.run_async(page)
+        result = build_result(url, extracted)
+        archive = PageArchive.shared()
+        if archive:
+            await archive.capture_async(page, url, 'Walmart', result)
+        return result
+
+    except Exception as e:
+        return {'success': False, 'error': str(e), 'site': 'Walmart'}
 
 # Test
 def test_scraper():
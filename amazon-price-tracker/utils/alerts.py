@@ -0,0 +1,265 @@
+# utils/alerts.py
+import json
+import os
+import queue
+import smtplib
+import threading
+import time
+from email.message import EmailMessage
+
+from utils.metrics import metrics
+from utils.urls import canonical_id
+
+
+def alert_key(event):
+    """Dedupe key: the product plus the price it alerted at"""
+    product = canonical_id(event['url']) if event.get('url') else f"{event['site']}:{event['product_name']}"
+    return f"{product}@{event['price']:.2f}"
+
+
+def format_digest(events):
+    """Subject and plain-text body for a batch of alerts"""
+    if len(events) == 1:
+        event = events[0]
+        subject = f"Price alert: {event['product_name']} is ${event['price']:.2f}"
+    else:
+        subject = f"Price alerts: {len(events)} products at or below target"
+
+    lines = []
+    for event in sorted(events, key=lambda e: (e['site'], e['product_name'])):
+        lines.append(f"[{event['site']}] {event['product_name']}")
+        lines.append(f"    ${event['price']:.2f} (target ${event['target_price']:.2f})")
+        if event.get('url'):
+            lines.append(f"    {event['url']}")
+        lines.append('')
+    return subject, '\n'.join(lines)
+
+
+class SmtpConnection:
+    """One SMTP session reused across digests, reopened when the server drops it"""
+
+    # Servers close idle sessions; check with NOOP before reusing an old one
+    IDLE_CHECK = 60
+
+    def __init__(self, host, port, username=None, password=None, use_tls=True, timeout=30):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.timeout = timeout
+        self.smtp = None
+        self.last_used = 0.0
+        self.connections_opened = 0
+
+    def _connect(self):
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        smtp.ehlo()
+        if self.use_tls and smtp.has_extn('starttls'):
+            smtp.starttls()
+            smtp.ehlo()
+        if self.username and self.password:
+            smtp.login(self.username, self.password)
+        self.connections_opened += 1
+        return smtp
+
+    def _alive(self):
+        if self.smtp is None:
+            return False
+        if time.monotonic() - self.last_used < self.IDLE_CHECK:
+            return True
+        try:
+            return self.smtp.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def send(self, message):
+        if not self._alive():
+            self.close()
+            self.smtp = self._connect()
+        try:
+            self.smtp.send_message(message)
+        except (smtplib.SMTPServerDisconnected, OSError):
+            # Stale session: one reconnect, then let the caller's retry handle it
+            self.close()
+            self.smtp = self._connect()
+            self.smtp.send_message(message)
+        self.last_used = time.monotonic()
+
+    def close(self):
+        if self.smtp is not None:
+            try:
+                self.smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.smtp = None
+
+
+class AlertDispatcher:
+    """Takes alert events off the scrape path and delivers them as digests.
+
+    submit() only enqueues. A background thread drops alerts already sent
+    for the same product and price within `dedupe_ttl`, collects the rest
+    for `digest_window` seconds, and sends one email per window over a
+    reused SMTP connection with retries. Without email credentials the
+    digests are only printed.
+    """
+
+    def __init__(self, sender=None, receiver=None, smtp_server=None, smtp_port=587, password=None,
+                 use_tls=True, digest_window=60, dedupe_ttl=24 * 3600, max_retries=3,
+                 state_path=None, max_queue=10000):
+        self.sender = sender
+        self.receiver = receiver
+        self.digest_window = digest_window
+        self.dedupe_ttl = dedupe_ttl
+        self.max_retries = max_retries
+        self.state_path = state_path
+        self.connection = None
+        if sender and receiver and smtp_server:
+            self.connection = SmtpConnection(smtp_server, smtp_port, sender, password, use_tls)
+
+        self.events = queue.Queue(maxsize=max_queue)
+        self.sent = self._load_state()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stats = {'submitted': 0, 'deduplicated': 0, 'dropped': 0,
+                      'alerts_sent': 0, 'digests_sent': 0, 'send_failures': 0}
+
+    @classmethod
+    def from_settings(cls):
+        from config import settings
+
+        return cls(
+            sender=settings.EMAIL_SENDER,
+            receiver=settings.EMAIL_RECEIVER,
+            smtp_server=settings.SMTP_SERVER,
+            smtp_port=settings.SMTP_PORT,
+            password=settings.EMAIL_PASSWORD,
+            use_tls=settings.SMTP_USE_TLS,
+            digest_window=settings.ALERT_DIGEST_WINDOW,
+            dedupe_ttl=settings.ALERT_DEDUPE_TTL,
+            max_retries=settings.ALERT_MAX_RETRIES,
+            state_path=settings.ALERT_STATE_FILE
+        )
+
+    def _load_state(self):
+        """Keys already alerted on, kept across runs so cron jobs don't repeat themselves"""
+        if self.state_path and os.path.exists(self.state_path):
+            try:
+                with open(self.state_path) as f:
+                    return json.load(f)
+            except (OSError, ValueError):
+                pass
+        return {}
+
+    def _save_state(self):
+        if not self.state_path:
+            return
+        now = time.time()
+        with self.lock:
+            self.sent = {key: at for key, at in self.sent.items() if now - at < self.dedupe_ttl}
+            state = dict(self.sent)
+        os.makedirs(os.path.dirname(self.state_path) or '.', exist_ok=True)
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+
+    def submit(self, event):
+        """Queue an alert event; never blocks the caller"""
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name='alert-dispatcher', daemon=True)
+            self.thread.start()
+        self.stats['submitted'] += 1
+        metrics.incr('alerts', site=event.get('site'), outcome='submitted')
+        try:
+            self.events.put_nowait(event)
+        except queue.Full:
+            self.stats['dropped'] += 1
+            metrics.incr('alerts', site=event.get('site'), outcome='dropped')
+
+    def _is_new(self, event):
+        key = alert_key(event)
+        now = time.time()
+        with self.lock:
+            sent_at = self.sent.get(key)
+            if sent_at is not None and now - sent_at < self.dedupe_ttl:
+                self.stats['deduplicated'] += 1
+                metrics.incr('alerts', site=event.get('site'), outcome='deduplicated')
+                return False
+            self.sent[key] = now
+        return True
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            event = self.events.get()
+            if event is None:
+                break
+            batch = [event] if self._is_new(event) else []
+
+            # Coalesce everything that arrives within the window into one digest
+            deadline = time.monotonic() + self.digest_window
+            while True:
+                remaining = deadline - time.monotonic()
+                try:
+                    event = self.events.get(timeout=max(0.0, remaining)) if remaining > 0 \
+                        else self.events.get_nowait()
+                except queue.Empty:
+                    break
+                if event is None:
+                    stopping = True
+                    break
+                if self._is_new(event):
+                    batch.append(event)
+
+            if batch:
+                with metrics.span('alert_delivery'):
+                    self._deliver(batch)
+
+    def _deliver(self, events):
+        subject, body = format_digest(events)
+        if self.connection is None:
+            print(f"📣 {subject}\n{body}")
+            self.stats['digests_sent'] += 1
+            self.stats['alerts_sent'] += len(events)
+            return
+
+        message = EmailMessage()
+        message['Subject'] = subject
+        message['From'] = self.sender
+        message['To'] = self.receiver
+        message.set_content(body)
+
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                self.connection.send(message)
+                self.stats['digests_sent'] += 1
+                self.stats['alerts_sent'] += len(events)
+                metrics.incr('alert_digests', outcome='sent')
+                print(f"📧 Sent alert digest ({len(events)} products) to {self.receiver}")
+                return
+            except (smtplib.SMTPException, OSError) as e:
+                self.connection.close()
+                print(f"⚠️ Alert email attempt {attempt}/{self.max_retries} failed: {str(e)}")
+                if attempt < self.max_retries:
+                    metrics.incr('retries', operation='alert_email')
+                    time.sleep(2 ** attempt)
+
+        # Undelivered: forget the keys so the next run alerts again
+        self.stats['send_failures'] += 1
+        metrics.incr('alert_digests', outcome='failed')
+        with self.lock:
+            for event in events:
+                self.sent.pop(alert_key(event), None)
+
+    def close(self, timeout=30):
+        """Flush pending alerts immediately and stop the thread"""
+        if self.thread is not None:
+            self.digest_window = 0
+            self.events.put(None)
+            self.thread.join(timeout)
+            self.thread = None
+        if self.connection is not None:
+            self.connection.close()
+        self._save_state()
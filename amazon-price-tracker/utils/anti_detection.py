@@ -1,7 +1,43 @@
 # utils/anti_detection.py
 from playwright.sync_api import sync_playwright, TimeoutError
+from utils.resource_blocker import ResourceBlocker
+from utils.metrics import metrics
+from collections import namedtuple
+import html as html_lib
 import random
+import re
 import time
+import weakref
+
+# Chromium flags shared by every launcher
+CHROMIUM_ARGS = [
+    '--disable-blink-features=AutomationControlled',
+    '--disable-dev-shm-usage',
+    '--no-sandbox',
+    '--disable-web-security',
+    '--disable-features=IsolateOrigins,site-per-process',
+    '--disable-site-isolation-trials',
+]
+
+STEALTH_ARGS = [
+    '--disable-automation',
+    '--disable-infobars',
+]
+
+# Stealth: remove webdriver property
+STEALTH_SCRIPT = """
+    Object.defineProperty(navigator, 'webdriver', {
+        get: () => undefined
+    });
+    
+    Object.defineProperty(navigator, 'plugins', {
+        get: () => [1, 2, 3, 4, 5]
+    });
+    
+    Object.defineProperty(navigator, 'languages', {
+        get: () => ['en-US', 'en']
+    });
+"""
 
 class AntiDetection:
     """Anti-detection strategies for web scraping"""
@@ -65,52 +101,189 @@ class AntiDetection:
             pass
 
 
+# Result of one pass over a page: both checks answered together
+PageVerdict = namedtuple(
+    'PageVerdict',
+    ['blocked', 'has_content', 'score', 'block_hits', 'content_hits', 'reason']
+)
+
+# Visible text and title only - far smaller than page.content() and
+# ignores words that only appear inside scripts and attributes
+PAGE_TEXT_JS = """
+() => ({
+    title: document.title || '',
+    text: document.body ? document.body.innerText.slice(0, 50000) : '',
+    url: location.href
+})
+"""
+
+
 class PageValidator:
     """Validate page state and detect blocks"""
     
+    # Bot detection indicators and how strongly each one suggests a block.
+    # Generic words like 'robot' and 'human' show up on normal product pages
+    # (robot vacuums, reviews...) so they only count alongside stronger signals.
+    BLOCK_INDICATORS = {
+        'verify you are human': 5,
+        "make sure you're not a robot": 5,
+        'robot check': 5,
+        'bot detected': 5,
+        'press & hold': 4,
+        'captcha': 4,
+        'unusual traffic': 4,
+        'automated access': 4,
+        'too many requests': 4,
+        '403 forbidden': 4,
+        'access denied': 3,
+        'security check': 2,
+        'ddos': 2,
+        'please confirm': 1,
+        'blocked': 1,
+        'robot': 1,
+        'human': 0.5,
+    }
+    
+    # Matches in the <title> count this many times over
+    TITLE_WEIGHT = 2
+    
+    BLOCKED_URLS = ['captcha', 'robot', 'verify', 'denied', 'blocked']
+    URL_WEIGHT = 5
+    
+    BLOCK_THRESHOLD = 4
+    
+    # Common content indicators
+    CONTENT_INDICATORS = [
+        'price',
+        'product',
+        'add to cart',
+        'buy now',
+        'item',
+        'in stock'
+    ]
+    
+    # One alternation over every indicator, longest first so phrases win over their words
+    _PATTERN = re.compile(
+        r'\b(?:' + '|'.join(
+            re.escape(indicator) for indicator in
+            sorted(set(BLOCK_INDICATORS) | set(CONTENT_INDICATORS), key=len, reverse=True)
+        ) + r')\b'
+    )
+    _URL_PATTERN = re.compile('|'.join(BLOCKED_URLS))
+    
+    # page -> verdict for the current navigation
+    _cache = weakref.WeakKeyDictionary()
+    _watched = weakref.WeakSet()
+    
+    @staticmethod
+    def check_text(text, title='', url=''):
+        """Score visible text, title and URL in a single pass each"""
+        text_hits = set(PageValidator._PATTERN.findall(text.lower()))
+        title_hits = set(PageValidator._PATTERN.findall(title.lower()))
+        
+        block_hits = {}
+        for hit in text_hits | title_hits:
+            weight = PageValidator.BLOCK_INDICATORS.get(hit)
+            if weight:
+                block_hits[hit] = weight * (PageValidator.TITLE_WEIGHT if hit in title_hits else 1)
+        score = sum(block_hits.values())
+        reason = None
+        if block_hits:
+            reason = f"⚠️ Block detected: '{max(block_hits, key=block_hits.get)}'"
+        
+        # Check URL for redirects to bot pages
+        url_match = PageValidator._URL_PATTERN.search(url.lower())
+        if url_match:
+            block_hits['url:' + url_match.group(0)] = PageValidator.URL_WEIGHT
+            score += PageValidator.URL_WEIGHT
+            reason = f"⚠️ Redirect to bot page: {url}"
+        
+        content_hits = sorted(
+            hit for hit in text_hits | title_hits if hit in PageValidator.CONTENT_INDICATORS
+        )
+        blocked = score >= PageValidator.BLOCK_THRESHOLD
+        return PageVerdict(
+            blocked=blocked,
+            has_content=bool(content_hits),
+            score=score,
+            block_hits=block_hits,
+            content_hits=content_hits,
+            reason=reason if blocked else None
+        )
+    
+    @staticmethod
+    def _watch(page):
+        """Drop the cached verdict whenever the main frame navigates"""
+        if page in PageValidator._watched:
+            return
+        PageValidator._watched.add(page)
+        
+        def on_navigated(frame):
+            if frame == page.main_frame:
+                PageValidator._cache.pop(page, None)
+        page.on('framenavigated', on_navigated)
+    
+    @staticmethod
+    def inspect(page):
+        """Verdict for the page's current document, computed once per navigation"""
+        verdict = PageValidator._cache.get(page)
+        if verdict is None:
+            with metrics.span('block_check', tier='browser'):
+                signals = page.evaluate(PAGE_TEXT_JS)
+                verdict = PageValidator.check_text(signals['text'], signals['title'], signals['url'])
+            PageValidator._watch(page)
+            PageValidator._cache[page] = verdict
+        return verdict
+    
+    @staticmethod
+    async def inspect_async(page):
+        """inspect() for async API pages"""
+        verdict = PageValidator._cache.get(page)
+        if verdict is None:
+            with metrics.span('block_check', tier='browser'):
+                signals = await page.evaluate(PAGE_TEXT_JS)
+                verdict = PageValidator.check_text(signals['text'], signals['title'], signals['url'])
+            PageValidator._watch(page)
+            PageValidator._cache[page] = verdict
+        return verdict
+    
     @staticmethod
     def is_blocked(page):
         """Check if page shows bot detection"""
         try:
-            page_text = page.content().lower()
-            
-            # Common bot detection indicators
-            blocked_indicators = [
-                'robot',
-                'human',
-                'verify you are human',
-                'captcha',
-                'access denied',
-                'unusual traffic',
-                'please confirm',
-                'security check',
-                'automated access',
-                'too many requests',
-                '403 forbidden',
-                'blocked',
-                'ddos',
-                'bot detected'
-            ]
-            
-            # Check page text
-            for indicator in blocked_indicators:
-                if indicator in page_text:
-                    print(f"⚠️ Block detected: '{indicator}'")
-                    return True
-            
-            # Check URL for redirects to bot pages
-            current_url = page.url.lower()
-            blocked_urls = ['captcha', 'robot', 'verify', 'denied', 'blocked']
-            for blocked in blocked_urls:
-                if blocked in current_url:
-                    print(f"⚠️ Redirect to bot page: {current_url}")
-                    return True
-            
-            return False
-            
+            verdict = PageValidator.inspect(page)
+            if verdict.blocked:
+                print(verdict.reason)
+            return verdict.blocked
         except:
             return False
     
+    @staticmethod
+    def html_to_text(page_html):
+        """Visible-ish text and title from raw HTML"""
+        title_match = re.search(r'<title[^>]*>(.*?)</title>', page_html, re.IGNORECASE | re.DOTALL)
+        # Embedded scripts mention 'robot', 'blocked' etc. all the time - only look at markup
+        text = re.sub(r'<(script|style|noscript)\b.*?</\1>', ' ', page_html,
+                      flags=re.IGNORECASE | re.DOTALL)
+        text = html_lib.unescape(re.sub(r'<[^>]+>', ' ', text))
+        title = html_lib.unescape(title_match.group(1)) if title_match else ''
+        return text, title
+    
+    @staticmethod
+    def check_html(page_html, url):
+        """Same verdict as inspect(), for HTML fetched without a browser"""
+        with metrics.span('block_check', tier='http'):
+            text, title = PageValidator.html_to_text(page_html)
+            return PageValidator.check_text(text, title, url)
+    
+    @staticmethod
+    def is_blocked_html(page_html, url):
+        """Same check as is_blocked, for HTML fetched without a browser"""
+        verdict = PageValidator.check_html(page_html, url)
+        if verdict.blocked:
+            print(verdict.reason)
+        return verdict.blocked
+    
     @staticmethod
     def wait_for_stable_network(page, timeout=10000):
         """Wait for network to be idle"""
@@ -125,21 +298,7 @@ class PageValidator:
     def page_has_content(page):
         """Check if page actually has product content"""
         try:
-            # Check for common content indicators
-            content_indicators = [
-                'price',
-                'product',
-                'add to cart',
-                'buy now',
-                'item',
-                'in stock'
-            ]
-            
-            page_text = page.content().lower()
-            for indicator in content_indicators:
-                if indicator in page_text:
-                    return True
-            return False
+            return PageValidator.inspect(page).has_content
         except:
             return False
 
@@ -148,62 +307,56 @@ class BrowserLauncher:
     """Launch browsers with anti-detection configs"""
     
     @staticmethod
-    def launch_chromium(headless=True, use_stealth=True):
+    def chromium_args(use_stealth=True):
+        """Launch args for Chromium"""
+        args = list(CHROMIUM_ARGS)
+        if use_stealth:
+            args.extend(STEALTH_ARGS)
+        return args
+    
+    @staticmethod
+    def context_options():
+        """Randomized context settings shared by sync and async launchers"""
+        return {
+            'viewport': AntiDetection.get_random_viewport(),
+            'user_agent': AntiDetection.get_random_user_agent(),
+            'locale': 'en-US',
+            'timezone_id': 'America/New_York',
+            'permissions': ['geolocation'],
+            'device_scale_factor': 1,
+            'has_touch': False
+        }
+    
+    @staticmethod
+    def prepare_context(context, site=None, use_stealth=True, block_resources=True):
+        """Install stealth script and resource blocking on a new context"""
+        if use_stealth:
+            context.add_init_script(STEALTH_SCRIPT)
+        if block_resources:
+            blocker = ResourceBlocker.for_site(site)
+            if blocker:
+                blocker.attach(context)
+        return context
+    
+    @staticmethod
+    def launch_chromium(headless=True, use_stealth=True, site=None, block_resources=True):
         """Launch Chromium with anti-detection args"""
         playwright = sync_playwright().start()
         
-        args = [
-            '--disable-blink-features=AutomationControlled',
-            '--disable-dev-shm-usage',
-            '--no-sandbox',
-            '--disable-web-security',
-            '--disable-features=IsolateOrigins,site-per-process',
-            '--disable-site-isolation-trials',
-        ]
-        
-        if use_stealth:
-            args.extend([
-                '--disable-automation',
-                '--disable-infobars',
-            ])
-        
         browser = playwright.chromium.launch(
             headless=headless,
-            args=args
+            args=BrowserLauncher.chromium_args(use_stealth)
         )
         
-        context = browser.new_context(
-            viewport=AntiDetection.get_random_viewport(),
-            user_agent=AntiDetection.get_random_user_agent(),
-            locale='en-US',
-            timezone_id='America/New_York',
-            permissions=['geolocation'],
-            device_scale_factor=1,
-            has_touch=False
-        )
+        context = browser.new_context(**BrowserLauncher.context_options())
+        BrowserLauncher.prepare_context(context, site, use_stealth, block_resources)
         
         page = context.new_page()
         
-        # Stealth: remove webdriver property
-        if use_stealth:
-            page.add_init_script("""
-                Object.defineProperty(navigator, 'webdriver', {
-                    get: () => undefined
-                });
-                
-                Object.defineProperty(navigator, 'plugins', {
-                    get: () => [1, 2, 3, 4, 5]
-                });
-                
-                Object.defineProperty(navigator, 'languages', {
-                    get: () => ['en-US', 'en']
-                });
-            """)
-        
         return playwright, browser, page
     
     @staticmethod
-    def launch_firefox(headless=True):
+    def launch_firefox(headless=True, site=None, block_resources=True):
         """Launch Firefox (good for Walmart)"""
         playwright = sync_playwright().start()
         
@@ -216,12 +369,13 @@ class BrowserLauncher:
             user_agent=AntiDetection.get_random_user_agent(),
             locale='en-US'
         )
+        BrowserLauncher.prepare_context(context, site, False, block_resources)
         
         page = context.new_page()
         return playwright, browser, page
     
     @staticmethod
-    def launch_webkit(headless=True):
+    def launch_webkit(headless=True, site=None, block_resources=True):
         """Launch WebKit/Safari"""
         playwright = sync_playwright().start()
         
@@ -234,6 +388,7 @@ class BrowserLauncher:
             user_agent=AntiDetection.get_random_user_agent(),
             locale='en-US'
         )
+        BrowserLauncher.prepare_context(context, site, False, block_resources)
         
         page = context.new_page()
         return playwright, browser, page
@@ -270,10 +425,12 @@ class ScraperHelper:
                     return result
                 else:
                     print(f"🔄 Retry {attempt + 1}/{max_retries}...")
+                    metrics.incr('retries', operation='scrape')
                     time.sleep(delay * (attempt + 1))  # Exponential backoff
             except Exception as e:
                 print(f"⚠️ Attempt {attempt + 1} failed: {str(e)}")
                 if attempt < max_retries - 1:
+                    metrics.incr('retries', operation='scrape')
                     time.sleep(delay * (attempt + 1))
         
         return {'success': False, 'error': 'Max retries exceeded'}
\ No newline at end of file
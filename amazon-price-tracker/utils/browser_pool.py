@@ -0,0 +1,220 @@
+# utils/browser_pool.py
+from contextlib import contextmanager
+from playwright.sync_api import sync_playwright
+from utils.anti_detection import BrowserLauncher
+from utils.session_store import pinned_options, session_options
+
+
+class PageLease:
+    """A context/page handed out by BrowserPool to one scraper"""
+
+    def __init__(self, pool, browser_index, site, context_kwargs):
+        self.pool = pool
+        self.browser_index = browser_index
+        self.site = site
+        self.context_kwargs = context_kwargs
+        self.context = None
+        self.page = None
+        self.session = None
+        self.navigations = 0
+        self.blocked = False
+
+    def navigated(self):
+        """Count a navigation made with this lease"""
+        self.navigations += 1
+
+    def mark_blocked(self):
+        """Flag the context as burned so it is recycled before the next use"""
+        self.blocked = True
+
+    def get_page(self):
+        """Return a usable page, recycling the context first if it is due"""
+        self.pool.check(self)
+        return self.page
+
+
+class BrowserPool:
+    """One Playwright driver, a few browsers, and leased contexts shared by all scrapers"""
+
+    def __init__(self, headless=True, browsers=1, max_navigations=50, use_stealth=True,
+                 block_resources=True, endpoint=None, sessions=None, watchdog=None):
+        self.headless = headless
+        # Optional: attach to a running browser server (CDP endpoint) instead of
+        # launching, and reuse per-site cookies/storage from a SessionStore
+        self.endpoint = endpoint
+        self.sessions = sessions
+        # Optional ResourceWatchdog: recycle contexts / restart browsers that grow too big
+        self.watchdog = watchdog
+        self.connected = False
+        self.browser_count = max(1, browsers)
+        self.max_navigations = max_navigations
+        self.use_stealth = use_stealth
+        self.block_resources = block_resources
+        self.playwright = None
+        self.browsers = []
+        self.leases = []
+        self.counters = {
+            'contexts_created': 0,
+            'contexts_recycled': 0,
+            'recycled_on_block': 0,
+            'recycled_on_memory': 0,
+            'browser_restarts': 0,
+            'navigations': 0
+        }
+
+    def start(self):
+        """Start the driver and launch the browsers"""
+        if self.playwright:
+            return self
+        self.playwright = sync_playwright().start()
+        if self.endpoint:
+            try:
+                # One connection is enough: the server browser already runs its own processes
+                self.browsers.append(self.playwright.chromium.connect_over_cdp(self.endpoint))
+                self.connected = True
+                return self
+            except Exception as e:
+                print(f"⚠️ Browser server at {self.endpoint} unavailable ({str(e)}); launching instead")
+        for _ in range(self.browser_count):
+            self.browsers.append(self._launch_browser())
+        return self
+
+    def _launch_browser(self):
+        return self.playwright.chromium.launch(
+            headless=self.headless,
+            args=BrowserLauncher.chromium_args(self.use_stealth)
+        )
+
+    def _open_context(self, lease):
+        """Create a fresh context and page for a lease"""
+        options = BrowserLauncher.context_options()
+        options.update(lease.context_kwargs)
+        if self.sessions:
+            lease.session = self.sessions.checkout(lease.site)
+            options = session_options(lease.session, options)
+            if not lease.session['options']:
+                lease.session['options'] = pinned_options(options)
+        lease.context = self.browsers[lease.browser_index].new_context(**options)
+        BrowserLauncher.prepare_context(
+            lease.context, lease.site, self.use_stealth, self.block_resources
+        )
+        lease.page = lease.context.new_page()
+        lease.navigations = 0
+        lease.blocked = False
+        self.counters['contexts_created'] += 1
+
+    def _close_context(self, lease):
+        if lease.context and lease.session:
+            # A blocked session is burned; anything else is kept for the next run
+            try:
+                if lease.blocked:
+                    self.sessions.invalidate(lease.session)
+                else:
+                    self.sessions.save(lease.session, lease.context.storage_state())
+            except Exception as e:
+                print(f"⚠️ Could not save {lease.site} session: {str(e)}")
+            lease.session = None
+        if lease.context:
+            try:
+                lease.context.close()
+            except Exception:
+                pass
+        self.counters['navigations'] += lease.navigations
+        lease.context = None
+        lease.page = None
+
+    def lease(self, site=None, **context_kwargs):
+        """Hand out a context/page on the least loaded browser"""
+        self.start()
+        loads = [0] * len(self.browsers)
+        for active in self.leases:
+            loads[active.browser_index] += 1
+        browser_index = loads.index(min(loads))
+
+        lease = PageLease(self, browser_index, site, context_kwargs)
+        self._open_context(lease)
+        self.leases.append(lease)
+        return lease
+
+    def release(self, lease):
+        """Return a lease and close its context"""
+        self._close_context(lease)
+        if lease in self.leases:
+            self.leases.remove(lease)
+
+    @contextmanager
+    def leased(self, site=None, **context_kwargs):
+        """Context-manager form of lease()/release()"""
+        lease = self.lease(site, **context_kwargs)
+        try:
+            yield lease
+        finally:
+            self.release(lease)
+
+    def check(self, lease):
+        """Between jobs: recycle a lease's context after too many navigations, a block or
+        heap growth, and restart the browsers once the watchdog finds them too big"""
+        if self.watchdog and not self.connected and self.watchdog.browser_over_limit():
+            self.restart_browsers()
+            return
+        if lease.blocked:
+            self.counters['recycled_on_block'] += 1
+        elif self.max_navigations and lease.navigations >= self.max_navigations:
+            pass
+        elif (self.watchdog and self.watchdog.heap_check_due(lease.navigations)
+              and self.watchdog.page_over_limit(lease.page, lease.site)):
+            self.counters['recycled_on_memory'] += 1
+        else:
+            return
+        self._close_context(lease)
+        self._open_context(lease)
+        self.counters['contexts_recycled'] += 1
+
+    def restart_browsers(self):
+        """Relaunch every browser (renderer memory only comes back this way); each lease
+        gets a fresh context on the new browser, so scrapers carry on with their next job"""
+        for lease in self.leases:
+            self._close_context(lease)
+        for browser in self.browsers:
+            try:
+                browser.close()
+            except Exception:
+                pass
+        self.browsers = [self._launch_browser() for _ in range(self.browser_count)]
+        for lease in self.leases:
+            self._open_context(lease)
+        self.counters['browser_restarts'] += 1
+        self.watchdog.restarted()
+        print(f"♻️ Restarted {self.browser_count} browser(s) to release memory")
+
+    def stats(self):
+        """Current pool state and lifetime counters"""
+        stats = dict(self.counters)
+        stats['navigations'] += sum(lease.navigations for lease in self.leases)
+        stats['browsers'] = len(self.browsers)
+        stats['active_leases'] = len(self.leases)
+        stats['leases_by_site'] = {}
+        for lease in self.leases:
+            site = lease.site or 'unknown'
+            stats['leases_by_site'][site] = stats['leases_by_site'].get(site, 0) + 1
+        return stats
+
+    def close(self):
+        """Close every context, browser and the driver"""
+        for lease in list(self.leases):
+            self.release(lease)
+        for browser in self.browsers:
+            try:
+                browser.close()
+            except Exception:
+                pass
+        self.browsers = []
+        if self.playwright:
+            self.playwright.stop()
+            self.playwright = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,123 @@
+# utils/browser_server.py
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import urllib.request
+
+
+def _version(endpoint, timeout=0.5):
+    """The browser's /json/version answer, or None when nothing listens there"""
+    try:
+        with urllib.request.urlopen(f"{endpoint}/json/version", timeout=timeout) as response:
+            return json.loads(response.read())
+    except (OSError, ValueError):
+        return None
+
+
+class BrowserServer:
+    """A long-lived Chromium that short runs attach to over CDP instead of launching their own.
+
+    Python Playwright has no launch_server(), so this starts the Playwright
+    Chromium build directly with a remote-debugging port and records the
+    endpoint in BROWSER_SERVER_FILE; browser_endpoint() finds it there.
+    """
+
+    def __init__(self, port=9222, headless=True, info_file=None, use_stealth=True):
+        self.port = port
+        self.headless = headless
+        self.info_file = info_file
+        self.use_stealth = use_stealth
+        self.endpoint = f"http://127.0.0.1:{port}"
+        self.process = None
+        self.profile_dir = None
+
+    @classmethod
+    def from_settings(cls, port=None):
+        from config import settings
+
+        return cls(port or settings.BROWSER_SERVER_PORT, info_file=settings.BROWSER_SERVER_FILE)
+
+    @staticmethod
+    def executable():
+        """Path of the Chromium build Playwright installed"""
+        from playwright.sync_api import sync_playwright
+
+        with sync_playwright() as playwright:
+            return playwright.chromium.executable_path
+
+    def start(self, timeout=30):
+        """Launch the browser and wait until its debugging endpoint answers"""
+        from utils.anti_detection import BrowserLauncher
+
+        if _version(self.endpoint):
+            raise RuntimeError(f"Something is already listening on {self.endpoint}")
+
+        self.profile_dir = tempfile.mkdtemp(prefix='price-tracker-browser-')
+        command = [
+            self.executable(),
+            f'--remote-debugging-port={self.port}',
+            '--remote-debugging-address=127.0.0.1',
+            f'--user-data-dir={self.profile_dir}',
+            '--no-first-run',
+            '--no-default-browser-check',
+            *BrowserLauncher.chromium_args(self.use_stealth),
+        ]
+        if self.headless:
+            command.append('--headless=new')
+        self.process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        deadline = time.monotonic() + timeout
+        while not _version(self.endpoint):
+            if self.process.poll() is not None or time.monotonic() > deadline:
+                self.stop()
+                raise RuntimeError(f"Browser did not start on {self.endpoint}")
+            time.sleep(0.2)
+
+        if self.info_file:
+            os.makedirs(os.path.dirname(self.info_file) or '.', exist_ok=True)
+            tmp_path = f"{self.info_file}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump({'endpoint': self.endpoint, 'pid': self.process.pid, 'started': time.time()}, f)
+            os.replace(tmp_path, self.info_file)
+        return self
+
+    def wait(self):
+        """Block until the browser exits"""
+        if self.process:
+            self.process.wait()
+
+    def stop(self):
+        """Shut the browser down and forget its endpoint"""
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self.process = None
+        if self.info_file and os.path.exists(self.info_file):
+            os.remove(self.info_file)
+        if self.profile_dir:
+            shutil.rmtree(self.profile_dir, ignore_errors=True)
+            self.profile_dir = None
+
+
+def browser_endpoint():
+    """CDP endpoint of a running browser server to attach to, or None to launch as usual"""
+    from config import settings
+
+    if getattr(settings, 'BROWSER_SERVER_URL', None):
+        return settings.BROWSER_SERVER_URL
+    info_file = getattr(settings, 'BROWSER_SERVER_FILE', None)
+    if not info_file or not os.path.exists(info_file):
+        return None
+    try:
+        with open(info_file) as f:
+            endpoint = json.load(f)['endpoint']
+    except (OSError, ValueError, KeyError):
+        return None
+    # A stale file from a server that died is ignored rather than trusted
+    return endpoint if _version(endpoint) else None
@@ -0,0 +1,116 @@
+# utils/catalog.py
+import csv
+import json
+import os
+import sqlite3
+
+from utils.urls import parse_product_url
+
+
+class Catalog:
+    """Tracked products, streamed one at a time from settings.PRODUCTS or a catalog file.
+
+    The source is a list of dicts, a .csv file, a .jsonl file or a SQLite
+    database (its `products` table), each with name, url, target_price and
+    optionally site columns. Every product gets an 'id' - its canonical
+    product key - and URL variants of the same product (tracking params,
+    different slugs) are merged into the first one seen. Products without
+    a site are matched to one through the registry's domain map.
+    """
+
+    def __init__(self, source, table='products'):
+        self.source = source
+        self.table = table
+        self.stats = {'rows': 0, 'products': 0, 'duplicates': 0, 'skipped': 0}
+
+    @classmethod
+    def from_settings(cls):
+        """CATALOG_FILE when set, else the PRODUCTS list"""
+        from config import settings
+
+        return cls(getattr(settings, 'CATALOG_FILE', None) or settings.PRODUCTS,
+                   getattr(settings, 'CATALOG_TABLE', 'products'))
+
+    @property
+    def label(self):
+        return self.source if isinstance(self.source, str) else 'settings.PRODUCTS'
+
+    def rows(self):
+        """Raw rows from the source, as dicts, without checks"""
+        if not isinstance(self.source, str):
+            yield from self.source
+            return
+
+        extension = os.path.splitext(self.source)[1].lower()
+        if extension == '.csv':
+            with open(self.source, newline='', encoding='utf-8') as f:
+                yield from csv.DictReader(f)
+        elif extension in ('.jsonl', '.ndjson'):
+            with open(self.source, encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+        elif extension in ('.db', '.sqlite', '.sqlite3'):
+            conn = sqlite3.connect(f"file:{self.source}?mode=ro", uri=True)
+            try:
+                cursor = conn.execute(f'SELECT * FROM "{self.table}"')
+                columns = [column[0] for column in cursor.description]
+                for row in cursor:
+                    yield dict(zip(columns, row))
+            finally:
+                conn.close()
+        else:
+            raise ValueError(f"Unknown catalog format: {self.source} (use .csv, .jsonl or .db)")
+
+    def __iter__(self):
+        """Checked, de-duplicated products: {'id', 'name', 'url', 'target_price', 'site'}"""
+        from scrapers import registry
+
+        domain_sites = registry.domain_sites()
+        seen = set()
+        self.stats = {'rows': 0, 'products': 0, 'duplicates': 0, 'skipped': 0}
+        for row in self.rows():
+            self.stats['rows'] += 1
+            product = normalize_product(row, domain_sites)
+            if product is None:
+                self.stats['skipped'] += 1
+                continue
+            if product['id'] in seen:
+                self.stats['duplicates'] += 1
+                continue
+            seen.add(product['id'])
+            self.stats['products'] += 1
+            yield product
+
+    def count(self):
+        """Products after de-duplication (one pass over the source)"""
+        return sum(1 for _ in self)
+
+
+def normalize_product(row, domain_sites):
+    """Product dict for a catalog row, or None if it has no usable URL or site"""
+    from scrapers import registry
+
+    url = (row.get('url') or '').strip()
+    if not url.startswith(('http://', 'https://')):
+        return None
+    domain, product_id, url = parse_product_url(url)
+    # Rows may leave the site out; a site that contradicts the URL's domain is a mistake
+    site = domain_sites.get(domain)
+    if row.get('site'):
+        if (site and row['site'] != site) or row['site'] not in registry.SITES:
+            return None
+        site = row['site']
+    if site is None:
+        return None
+    try:
+        target_price = float(row['target_price']) if row.get('target_price') not in (None, '') else None
+    except (TypeError, ValueError):
+        target_price = None
+    return {
+        'id': product_id,
+        'name': row.get('name') or product_id,
+        'url': url,
+        'target_price': target_price,
+        'site': site,
+    }
@@ -0,0 +1,145 @@
+# utils/fetch_cache.py
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# Markup that carries the price on each site. Only these slices are hashed,
+# so ads, recommendations and session tokens elsewhere don't change the fingerprint.
+PRICE_REGION_PATTERNS = {
+    'Amazon': [
+        re.compile(r'<div[^>]+id="corePrice[^"]*"[^>]*>.{0,4000}?</div>', re.DOTALL),
+        re.compile(r'"priceAmount"\s*:\s*[\d.]+'),
+        re.compile(r'<span class="a-offscreen">[^<]*</span>'),
+    ],
+    'Walmart': [
+        re.compile(r'"priceInfo"\s*:\s*\{.{0,2000}?"currentPrice"\s*:\s*\{[^}]*\}', re.DOTALL),
+        re.compile(r'<[^>]+itemprop=["\']price["\'][^>]*>[^<]*'),
+    ],
+}
+DEFAULT_REGION_PATTERNS = [
+    re.compile(r'"offers"\s*:\s*\{[^}]*\}'),
+    re.compile(r'<[^>]+itemprop=["\']price["\'][^>]*>[^<]*'),
+]
+
+
+def price_fingerprint(page_html, site=None):
+    """Hash of the price-bearing parts of a page, or None if none were found"""
+    pieces = []
+    for pattern in PRICE_REGION_PATTERNS.get(site, DEFAULT_REGION_PATTERNS):
+        match = pattern.search(page_html)
+        if match:
+            pieces.append(match.group(0))
+    if not pieces:
+        return None
+    return hashlib.sha1('\n'.join(pieces).encode('utf-8', 'replace')).hexdigest()
+
+
+class FetchCache:
+    """Validators, fingerprints and last results per canonical product ID.
+
+    Entries expire after `ttl` seconds and the least recently used ones are
+    evicted past `max_entries`. Safe to share between threads.
+    """
+
+    _shared = None
+
+    def __init__(self, path=None, ttl=6 * 3600, max_entries=10000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.counters = {
+            'hits_not_modified': 0,
+            'hits_fingerprint': 0,
+            'misses': 0,
+            'expired': 0,
+            'evictions': 0,
+        }
+        if path and os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self.entries = OrderedDict(json.load(f))
+            except (OSError, ValueError):
+                self.entries = OrderedDict()
+
+    @classmethod
+    def shared(cls):
+        """Cache configured in settings, or None when disabled"""
+        if cls._shared is None:
+            from config import settings
+
+            if not getattr(settings, 'FETCH_CACHE_ENABLED', True):
+                return None
+            cls._shared = cls(
+                settings.FETCH_CACHE_FILE,
+                ttl=settings.FETCH_CACHE_TTL,
+                max_entries=settings.FETCH_CACHE_MAX_ENTRIES
+            )
+        return cls._shared
+
+    def get(self, key):
+        """Fresh entry for key, or None"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry['stored_at'] > self.ttl:
+                del self.entries[key]
+                self.counters['expired'] += 1
+                return None
+            self.entries.move_to_end(key)
+            return entry
+
+    def conditional_headers(self, entry):
+        """If-None-Match / If-Modified-Since for a cached entry"""
+        headers = {}
+        if entry and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def put(self, key, result, etag=None, last_modified=None, fingerprint=None):
+        """Remember the result a page produced along with its validators"""
+        with self.lock:
+            self.entries[key] = {
+                'etag': etag,
+                'last_modified': last_modified,
+                'fingerprint': fingerprint,
+                'result': {k: v for k, v in result.items() if k not in ('timestamp', 'tier')},
+                'stored_at': time.time(),
+            }
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.counters['evictions'] += 1
+
+    def record(self, outcome):
+        """Count a hit ('hits_not_modified' / 'hits_fingerprint') or a 'misses'"""
+        with self.lock:
+            self.counters[outcome] += 1
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+            stats['entries'] = len(self.entries)
+        lookups = stats['hits_not_modified'] + stats['hits_fingerprint'] + stats['misses']
+        stats['hit_rate'] = (lookups - stats['misses']) / lookups if lookups else 0.0
+        return stats
+
+    def save(self):
+        """Persist entries so the next run starts warm"""
+        if not self.path:
+            return
+        with self.lock:
+            data = list(self.entries.items())
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,254 @@
+# utils/history.py
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+
+KEY = ['product_id']
+# Rows compaction folds into intervals; failed checks (no price) stay raw in `prices`
+COMPACTABLE = "price IS NOT NULL AND product_id IS NOT NULL"
+# Carried along with each run and bar; the latest value wins
+DETAILS = ['product_name', 'site', 'url', 'target_price']
+
+
+def month_of(timestamp):
+    """Partition key ('YYYY-MM') for a timestamp string"""
+    return str(timestamp)[:7]
+
+
+def week_of(day):
+    """Monday of the ISO week a 'YYYY-MM-DD' day falls in"""
+    date = datetime.strptime(day, '%Y-%m-%d')
+    return (date - timedelta(days=date.weekday())).strftime('%Y-%m-%d')
+
+
+def compact_runs(df):
+    """Collapse consecutive identical prices per product into intervals.
+
+    df needs product_id, product_name, site, url, target_price, timestamp, price
+    sorted by product_id then time.
+    """
+    if df.empty:
+        return pd.DataFrame(columns=KEY + DETAILS + ['price', 'start_ts', 'end_ts', 'samples'])
+
+    new_key = df['product_id'].ne(df['product_id'].shift())
+    new_price = df['price'].ne(df['price'].shift())
+    run_id = (new_key | new_price).cumsum()
+
+    runs = df.groupby(run_id, sort=False).agg(
+        product_id=('product_id', 'first'),
+        product_name=('product_name', 'last'),
+        site=('site', 'last'),
+        url=('url', 'last'),
+        target_price=('target_price', 'last'),
+        price=('price', 'first'),
+        start_ts=('timestamp', 'first'),
+        end_ts=('timestamp', 'last'),
+        samples=('price', 'size'),
+    )
+    return runs.reset_index(drop=True)
+
+
+def ohlc(df, period_column):
+    """Open/high/low/close per product and period from time-sorted rows"""
+    bars = df.groupby(KEY + [period_column], sort=False).agg(
+        product_name=('product_name', 'last'),
+        site=('site', 'last'),
+        open=('price', 'first'),
+        high=('price', 'max'),
+        low=('price', 'min'),
+        close=('price', 'last'),
+        samples=('price', 'size'),
+    )
+    return bars.reset_index().rename(columns={period_column: 'period'})
+
+
+class PriceHistory:
+    """Month-partitioned, compacted history with OHLC rollups on top of SQLiteStore.
+
+    Recent rows stay raw in `prices` (the hot partition). compact() moves
+    older whole days into `price_intervals`, keyed by month and product id,
+    as runs of unchanged price, and records their daily and weekly OHLC bars
+    in `price_ohlc`; failed checks, which have no price, stay in `prices`.
+    The store reads the intervals back through its price_points view, so
+    nothing else loses compacted rows. Queries only touch the partitions and
+    level they need.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS price_ohlc (
+            level TEXT NOT NULL,
+            period TEXT NOT NULL,
+            product_id TEXT NOT NULL,
+            product_name TEXT NOT NULL,
+            site TEXT NOT NULL DEFAULT '',
+            open REAL NOT NULL,
+            high REAL NOT NULL,
+            low REAL NOT NULL,
+            close REAL NOT NULL,
+            samples INTEGER NOT NULL,
+            PRIMARY KEY (level, product_id, period)
+        );
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.conn = store.conn
+        legacy = self._upgrade_bars()
+        self.conn.executescript(self.SCHEMA)
+        if legacy:
+            self._move_legacy_bars()
+
+    def _upgrade_bars(self):
+        """Rollups keyed by name and site: set them aside to be re-keyed by product id"""
+        columns = [row[1] for row in self.conn.execute('PRAGMA table_info(price_ohlc)')]
+        if not columns or 'product_id' in columns:
+            return False
+        with self.conn:
+            self.conn.execute('ALTER TABLE price_ohlc RENAME TO price_ohlc_legacy')
+        return True
+
+    def _move_legacy_bars(self):
+        from utils.storage import product_id
+
+        ids = self.store.product_ids_by_name()
+        bars = pd.read_sql_query('SELECT * FROM price_ohlc_legacy ORDER BY level, period', self.conn)
+        bars['product_id'] = [ids.get((name, site), product_id({'site': site, 'product_name': name}))
+                              for name, site in zip(bars['product_name'], bars['site'])]
+        with self.conn:
+            for level, level_bars in bars.groupby('level'):
+                self._merge_bars(level, level_bars)
+            self.conn.execute('DROP TABLE price_ohlc_legacy')
+
+    def _raw_rows(self, where, params=()):
+        return pd.read_sql_query(
+            "SELECT product_id, product_name, COALESCE(site, '') AS site, url, target_price, timestamp, price "
+            f"FROM prices WHERE {COMPACTABLE} AND {where} ORDER BY product_id, timestamp, id",
+            self.conn, params=params
+        )
+
+    def compact(self, hot_days=7):
+        """Compact every whole day older than hot_days, one month partition at a time"""
+        self.store.flush()
+        cutoff = (datetime.now() - timedelta(days=hot_days)).strftime('%Y-%m-%d')
+        months = [row[0] for row in self.conn.execute(
+            f"SELECT DISTINCT substr(timestamp, 1, 7) FROM prices WHERE {COMPACTABLE} AND timestamp < ? "
+            "ORDER BY 1",
+            (cutoff,)
+        )]
+
+        summary = {'rows': 0, 'intervals': 0, 'months': months}
+        for month in months:
+            rows, intervals = self._compact_month(month, cutoff)
+            summary['rows'] += rows
+            summary['intervals'] += intervals
+        return summary
+
+    def _compact_month(self, month, cutoff):
+        df = self._raw_rows("timestamp >= ? AND timestamp < ? AND timestamp < ?",
+                            (month, month + '~', cutoff))
+        runs = compact_runs(df)
+
+        # A run that continues the partition's last stored interval just extends it
+        last = pd.read_sql_query(
+            """SELECT product_id, price, start_ts, end_ts, samples FROM price_intervals i
+               WHERE month = ? AND end_ts = (SELECT MAX(end_ts) FROM price_intervals
+                                             WHERE month = i.month AND product_id = i.product_id)""",
+            self.conn, params=(month,)
+        )
+        if not runs.empty and not last.empty:
+            first_runs = runs.drop_duplicates(KEY, keep='first')
+            merged = first_runs.reset_index().merge(last, on=KEY, suffixes=('', '_prev'))
+            merged = merged[np.isclose(merged['price'], merged['price_prev'])]
+            runs.loc[merged['index'], 'start_ts'] = merged['start_ts_prev'].values
+            runs.loc[merged['index'], 'samples'] += merged['samples_prev'].values
+
+        df['day'] = df['timestamp'].str[:10]
+        daily = ohlc(df, 'day')
+        weekly_source = df.assign(week=df['day'].map(week_of))
+
+        with self.conn:
+            self.conn.executemany(
+                """INSERT OR REPLACE INTO price_intervals
+                   (month, product_id, product_name, site, url, target_price, price, start_ts, end_ts, samples)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                [(month, r.product_id, r.product_name, r.site, r.url,
+                  None if pd.isna(r.target_price) else float(r.target_price),
+                  float(r.price), r.start_ts, r.end_ts, int(r.samples))
+                 for r in runs.itertuples(index=False)]
+            )
+            self._merge_bars('daily', daily)
+            self._merge_bars('weekly', ohlc(weekly_source, 'week'))
+            deleted = self.conn.execute(
+                f"DELETE FROM prices WHERE {COMPACTABLE} AND timestamp >= ? AND timestamp < ? AND timestamp < ?",
+                (month, month + '~', cutoff)
+            ).rowcount
+        return deleted, len(runs)
+
+    def _merge_bars(self, level, bars):
+        """Upsert bars, folding into any bar already stored for the same period"""
+        self.conn.executemany(
+            """INSERT INTO price_ohlc
+               (level, period, product_id, product_name, site, open, high, low, close, samples)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT (level, product_id, period) DO UPDATE SET
+                   product_name = excluded.product_name,
+                   site = excluded.site,
+                   high = MAX(high, excluded.high),
+                   low = MIN(low, excluded.low),
+                   close = excluded.close,
+                   samples = samples + excluded.samples""",
+            [(level, b.period, b.product_id, b.product_name, b.site, float(b.open), float(b.high),
+              float(b.low), float(b.close), int(b.samples))
+             for b in bars.itertuples(index=False)]
+        )
+
+    def query(self, product_id, start, end, level='auto'):
+        """Price history for one product id between two 'YYYY-MM-DD[ HH:MM:SS]' bounds.
+
+        level is 'raw', 'daily', 'weekly' or 'auto' (picked from the range length).
+        Raw results merge compacted intervals (as their first and last
+        observation) with the hot rows.
+        """
+        self.store.flush()
+        if level == 'auto':
+            days = (datetime.strptime(end[:10], '%Y-%m-%d') - datetime.strptime(start[:10], '%Y-%m-%d')).days
+            level = 'raw' if days <= 7 else 'daily' if days <= 180 else 'weekly'
+
+        if level == 'raw':
+            intervals = pd.read_sql_query(
+                """SELECT start_ts, end_ts, price FROM price_intervals
+                   WHERE month BETWEEN ? AND ? AND product_id = ?
+                   AND end_ts >= ? AND start_ts <= ?""",
+                self.conn, params=(month_of(start), month_of(end), product_id, start, end)
+            )
+            points = pd.concat([
+                intervals[['start_ts', 'price']].rename(columns={'start_ts': 'timestamp'}),
+                intervals[['end_ts', 'price']].rename(columns={'end_ts': 'timestamp'}),
+                self._raw_rows("product_id = ? AND timestamp BETWEEN ? AND ?",
+                               (product_id, start, end))[['timestamp', 'price']],
+            ], ignore_index=True)
+            points = points[(points['timestamp'] >= start) & (points['timestamp'] <= end)]
+            return points.drop_duplicates().sort_values('timestamp').reset_index(drop=True)
+
+        stored = pd.read_sql_query(
+            """SELECT period, open, high, low, close, samples FROM price_ohlc
+               WHERE level = ? AND product_id = ? AND period BETWEEN ? AND ?
+               ORDER BY period""",
+            self.conn, params=(level, product_id,
+                               start[:10] if level == 'daily' else week_of(start[:10]), end[:10])
+        )
+
+        # Days still in the hot partition haven't been rolled up yet
+        hot = self._raw_rows("product_id = ? AND timestamp BETWEEN ? AND ?", (product_id, start, end))
+        if not hot.empty:
+            hot['day'] = hot['timestamp'].str[:10]
+            if level == 'weekly':
+                hot['day'] = hot['day'].map(week_of)
+            hot_bars = ohlc(hot, 'day')[['period', 'open', 'high', 'low', 'close', 'samples']]
+            stored = pd.concat([stored, hot_bars], ignore_index=True)
+            stored = stored.groupby('period', sort=True).agg(
+                open=('open', 'first'), high=('high', 'max'), low=('low', 'min'),
+                close=('close', 'last'), samples=('samples', 'sum')
+            ).reset_index()
+
+        return stored.sort_values('period').reset_index(drop=True)
@@ -0,0 +1,196 @@
+# utils/html_query.py
+"""Just enough DOM to run extraction plans over saved HTML without a browser.
+
+parse_html() builds an element tree with the stdlib parser and
+select_one() answers document.querySelector for the selector subset the
+extraction plans use: tag, #id, .class, [attr], [attr="v"] (also ~= ^= $=
+*=), compounds of those, and descendant / child (>) combinators.
+"""
+import re
+from functools import lru_cache
+from html.parser import HTMLParser
+
+VOID_TAGS = {
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta',
+    'param', 'source', 'track', 'wbr',
+}
+
+# Closing one of these implicitly closes an open <p>, <li> etc. - enough for product pages
+IMPLIED_END = {
+    'p': {'p'},
+    'li': {'li'},
+    'option': {'option'},
+    'tr': {'tr', 'td', 'th'},
+    'td': {'td', 'th'},
+    'th': {'td', 'th'},
+}
+
+COMPOUND_RE = re.compile(
+    r'(?P<tag>[a-zA-Z][\w-]*|\*)?'
+    r'(?P<rest>(?:#[\w-]+|\.[\w-]+|\[\s*[\w-]+\s*(?:[~^$*]?=\s*(?:"[^"]*"|\'[^\']*\'|[\w-]+)\s*)?\])*)$'
+)
+PART_RE = re.compile(
+    r'#(?P<id>[\w-]+)|\.(?P<cls>[\w-]+)|'
+    r'\[\s*(?P<attr>[\w-]+)\s*(?:(?P<op>[~^$*]?=)\s*(?:"(?P<dq>[^"]*)"|\'(?P<sq>[^\']*)\'|(?P<bare>[\w-]+))\s*)?\]'
+)
+
+
+class Element:
+    __slots__ = ('tag', 'attrs', 'children', 'parent')
+
+    def __init__(self, tag, attrs, parent=None):
+        self.tag = tag
+        self.attrs = attrs
+        self.children = []
+        self.parent = parent
+
+    def get(self, name):
+        """getAttribute"""
+        return self.attrs.get(name)
+
+    @property
+    def text(self):
+        """textContent"""
+        parts = []
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, str):
+                parts.append(node)
+            else:
+                stack.extend(reversed(node.children))
+        return ''.join(parts)
+
+    def iter(self):
+        """Descendant elements in document order"""
+        stack = list(reversed(self.children))
+        while stack:
+            node = stack.pop()
+            if isinstance(node, Element):
+                yield node
+                stack.extend(reversed(node.children))
+
+
+class _TreeBuilder(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = Element('#document', {})
+        self.stack = [self.root]
+
+    def handle_starttag(self, tag, attrs):
+        closes = IMPLIED_END.get(tag)
+        if closes and self.stack[-1].tag in closes:
+            self.stack.pop()
+        element = Element(tag, {name: value if value is not None else '' for name, value in attrs},
+                          self.stack[-1])
+        self.stack[-1].children.append(element)
+        if tag not in VOID_TAGS:
+            self.stack.append(element)
+
+    def handle_startendtag(self, tag, attrs):
+        element = Element(tag, {name: value if value is not None else '' for name, value in attrs},
+                          self.stack[-1])
+        self.stack[-1].children.append(element)
+
+    def handle_endtag(self, tag):
+        # Close up to the matching open element; stray end tags are ignored like browsers do
+        for index in range(len(self.stack) - 1, 0, -1):
+            if self.stack[index].tag == tag:
+                del self.stack[index:]
+                return
+
+    def handle_data(self, data):
+        self.stack[-1].children.append(data)
+
+
+def parse_html(page_html):
+    """Element tree for a document; the root stands in for `document`"""
+    builder = _TreeBuilder()
+    builder.feed(page_html)
+    builder.close()
+    return builder.root
+
+
+def _compile_compound(text):
+    match = COMPOUND_RE.match(text)
+    if not match:
+        raise ValueError(f"Unsupported selector: {text}")
+    tag = match.group('tag')
+    tests = []
+    for part in PART_RE.finditer(match.group('rest')):
+        if part.group('id'):
+            tests.append(('id', '=', part.group('id')))
+        elif part.group('cls'):
+            tests.append(('class', '~=', part.group('cls')))
+        else:
+            value = next((v for v in (part.group('dq'), part.group('sq'), part.group('bare')) if v is not None),
+                         None)
+            tests.append((part.group('attr').lower(), part.group('op'), value))
+    return (tag.lower() if tag and tag != '*' else None), tests
+
+
+@lru_cache(maxsize=256)
+def compile_selector(selector):
+    """[(combinator, tag, tests)] right to left; combinator links to the compound on the left"""
+    tokens = re.findall(r'\s*(>)\s*|\s+|([^\s>]+)', selector.strip())
+    compounds, combinator = [], ' '
+    pending = None
+    for child, compound in tokens:
+        if child:
+            pending = '>'
+        elif compound:
+            if compounds or pending:
+                combinator = pending or ' '
+            compounds.append((combinator, *_compile_compound(compound)))
+            pending = None
+    if not compounds or pending:
+        raise ValueError(f"Unsupported selector: {selector}")
+    # compounds[i][0] is how compound i attaches to compound i-1
+    return list(reversed(compounds))
+
+
+def _matches_compound(element, tag, tests):
+    if tag and element.tag != tag:
+        return False
+    for name, op, value in tests:
+        actual = element.attrs.get(name)
+        if actual is None:
+            return False
+        if op is None:
+            continue
+        if op == '=' and actual != value:
+            return False
+        if op == '~=' and value not in actual.split():
+            return False
+        if op == '^=' and not (value and actual.startswith(value)):
+            return False
+        if op == '$=' and not (value and actual.endswith(value)):
+            return False
+        if op == '*=' and not (value and value in actual):
+            return False
+    return True
+
+
+def _matches(element, compiled, index=0):
+    combinator, tag, tests = compiled[index]
+    if not _matches_compound(element, tag, tests):
+        return False
+    if index + 1 == len(compiled):
+        return True
+    parent = element.parent
+    if combinator == '>':
+        return parent is not None and parent.tag != '#document' and _matches(parent, compiled, index + 1)
+    while parent is not None and parent.tag != '#document':
+        if _matches(parent, compiled, index + 1):
+            return True
+        parent = parent.parent
+    return False
+
+
+def select_one(root, selector):
+    """First element in document order matching selector (querySelector), or None"""
+    compiled = compile_selector(selector)
+    for element in root.iter():
+        if _matches(element, compiled):
+            return element
+    return None
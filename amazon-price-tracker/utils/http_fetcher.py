@@ -0,0 +1,300 @@
+# utils/http_fetcher.py
+import html as html_lib
+import json
+import re
+from datetime import datetime
+import requests
+from requests.adapters import HTTPAdapter
+from utils.anti_detection import AntiDetection, PageValidator
+from utils.fetch_cache import FetchCache, price_fingerprint
+from utils.metrics import metrics
+from utils.page_archive import PageArchive
+from utils.urls import canonical_id
+
+JSON_LD_RE = re.compile(
+    r'<script[^>]+type=["\']application/ld\+json["\'][^>]*>(.*?)</script>',
+    re.IGNORECASE | re.DOTALL
+)
+NEXT_DATA_RE = re.compile(
+    r'<script[^>]+id=["\']__NEXT_DATA__["\'][^>]*>(.*?)</script>',
+    re.IGNORECASE | re.DOTALL
+)
+ITEMPROP_PRICE_RE = re.compile(
+    r'<[^>]+itemprop=["\']price["\'][^>]*?(?:content=["\']([\d.,]+)["\'][^>]*)?>([^<]*)',
+    re.IGNORECASE
+)
+AMAZON_PRICE_AMOUNT_RE = re.compile(r'"priceAmount"\s*:\s*([\d.]+)')
+AMAZON_OFFSCREEN_RE = re.compile(
+    r'<span class="a-offscreen">\s*\$?([\d,]+\.?\d*)\s*</span>', re.IGNORECASE
+)
+AMAZON_TITLE_RE = re.compile(r'<span[^>]+id="productTitle"[^>]*>(.*?)</span>', re.DOTALL)
+TITLE_TAG_RE = re.compile(r'<title[^>]*>(.*?)</title>', re.IGNORECASE | re.DOTALL)
+NUMBER_RE = re.compile(r'(\d+\.?\d*)')
+
+
+def _to_price(value):
+    """Turn a JSON/HTML price value into a float"""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value) if value > 0 else None
+    match = NUMBER_RE.search(str(value).replace(',', ''))
+    return float(match.group(1)) if match else None
+
+
+def _clean_title(title):
+    if not title:
+        return None
+    title = ' '.join(html_lib.unescape(re.sub(r'<[^>]+>', '', title)).split())
+    return title[:50] + '...' if len(title) > 50 else title
+
+
+def _walk(node):
+    """Yield every dict inside a JSON document"""
+    if isinstance(node, dict):
+        yield node
+        for value in node.values():
+            yield from _walk(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from _walk(value)
+
+
+def parse_json_ld(page_html):
+    """Price, currency and name from schema.org Product offers"""
+    for block in JSON_LD_RE.findall(page_html):
+        try:
+            data = json.loads(block.strip())
+        except ValueError:
+            continue
+        for node in _walk(data):
+            offers = node.get('offers')
+            if not offers:
+                continue
+            for offer in offers if isinstance(offers, list) else [offers]:
+                if not isinstance(offer, dict):
+                    continue
+                price = _to_price(offer.get('price') or offer.get('lowPrice'))
+                if price:
+                    return {
+                        'price': price,
+                        'currency': offer.get('priceCurrency'),
+                        'title': node.get('name')
+                    }
+    return None
+
+
+def parse_next_data(page_html):
+    """Price and name from Walmart's embedded __NEXT_DATA__ payload"""
+    match = NEXT_DATA_RE.search(page_html)
+    if not match:
+        return None
+    try:
+        data = json.loads(match.group(1))
+    except ValueError:
+        return None
+
+    try:
+        product = data['props']['pageProps']['initialData']['data']['product']
+    except (KeyError, TypeError):
+        product = None
+
+    nodes = [product] if isinstance(product, dict) else []
+    nodes.extend(_walk(data))
+    for node in nodes:
+        price_info = node.get('priceInfo')
+        if not isinstance(price_info, dict):
+            continue
+        current = price_info.get('currentPrice') or {}
+        price = _to_price(current.get('price') if isinstance(current, dict) else current)
+        if price:
+            return {
+                'price': price,
+                'currency': current.get('currencyUnit') if isinstance(current, dict) else None,
+                'title': node.get('name')
+            }
+    return None
+
+
+def parse_itemprop(page_html):
+    """Price from microdata itemprop="price" """
+    match = ITEMPROP_PRICE_RE.search(page_html)
+    if not match:
+        return None
+    price = _to_price(match.group(1) or match.group(2))
+    return {'price': price, 'currency': None, 'title': None} if price else None
+
+
+def parse_amazon_markup(page_html):
+    """Price from Amazon's server-rendered buybox markup"""
+    match = AMAZON_PRICE_AMOUNT_RE.search(page_html) or AMAZON_OFFSCREEN_RE.search(page_html)
+    if not match:
+        return None
+    price = _to_price(match.group(1))
+    return {'price': price, 'currency': None, 'title': None} if price else None
+
+
+# Parsers tried in order for each site
+SITE_PARSERS = {
+    'Amazon': [('json-ld', parse_json_ld), ('itemprop', parse_itemprop), ('markup', parse_amazon_markup)],
+    'Walmart': [('next-data', parse_next_data), ('json-ld', parse_json_ld), ('itemprop', parse_itemprop)],
+}
+
+
+def parse_title(page_html):
+    """Product title from the page markup"""
+    match = AMAZON_TITLE_RE.search(page_html) or TITLE_TAG_RE.search(page_html)
+    return _clean_title(match.group(1)) if match else None
+
+
+class HttpPriceFetcher:
+    """Fast path: plain keep-alive HTTP plus embedded-JSON parsing, no browser"""
+
+    _shared = None
+
+    def __init__(self, timeout=10, pool_size=10, cache=None, archive=None):
+        self.timeout = timeout
+        self.cache = cache
+        self.archive = archive
+        # canonical id -> validators seen by a fetch that escalated to the browser
+        self.pending = {}
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'User-Agent': AntiDetection.get_random_user_agent(),
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+            'Accept-Language': 'en-US,en;q=0.9',
+            'Accept-Encoding': 'gzip, deflate',
+        })
+
+    @classmethod
+    def shared(cls):
+        """Process-wide fetcher so every scraper reuses the same connections"""
+        if cls._shared is None:
+            from config import settings
+
+            cls._shared = cls(
+                timeout=getattr(settings, 'HTTP_TIMEOUT', 10),
+                pool_size=getattr(settings, 'HTTP_POOL_SIZE', 10),
+                cache=FetchCache.shared(),
+                archive=PageArchive.shared()
+            )
+        return cls._shared
+
+    def parse(self, page_html, site):
+        """Run the site's parsers over raw HTML, returning (source, data) or (None, None)"""
+        for source, parser in SITE_PARSERS.get(site, []):
+            data = parser(page_html)
+            if data:
+                if not data.get('title'):
+                    data['title'] = parse_title(page_html)
+                return source, data
+        return None, None
+
+    def _from_cache(self, entry, url, outcome):
+        """Cached result re-stamped as a fresh observation"""
+        self.cache.record(outcome)
+        result = dict(entry['result'])
+        result.update(
+            url=url,
+            timestamp=datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            tier='cache',
+            cache=outcome
+        )
+        return result
+
+    def _archive(self, url, site, page_html, price=None, status='ok'):
+        """Keep the raw page for offline replay when archiving is on"""
+        if not self.archive:
+            return
+        try:
+            self.archive.add(url, site, 'http', page_html, price=price, status=status)
+        except Exception as e:
+            print(f"⚠️ Could not archive {url}: {str(e)}")
+
+    def get_price(self, url, site):
+        """Try to price a product over plain HTTP.
+
+        Returns a result dict tagged tier='http' (or 'cache' when the page
+        is unchanged since the last fetch), or None when the caller should
+        escalate to the browser.
+        """
+        key = canonical_id(url)
+        entry = self.cache.get(key) if self.cache else None
+        headers = self.cache.conditional_headers(entry) if entry else {}
+        
+        try:
+            with metrics.span('http_fetch', site=site):
+                response = self.session.get(url, timeout=self.timeout, headers=headers)
+        except requests.RequestException as e:
+            print(f"⚠️ HTTP tier failed for {url}: {str(e)}")
+            metrics.incr('http_tier', site=site, outcome='error')
+            return None
+
+        if response.status_code == 304 and entry:
+            metrics.incr('http_tier', site=site, outcome='not_modified')
+            return self._from_cache(entry, url, 'hits_not_modified')
+
+        if response.status_code >= 400:
+            print(f"⚠️ HTTP tier got {response.status_code}, escalating to browser")
+            metrics.incr('http_tier', site=site, outcome=f'http_{response.status_code}')
+            return None
+
+        page_html = response.text
+        if PageValidator.is_blocked_html(page_html, response.url):
+            metrics.event('blocked', site=site, tier='http', url=url)
+            metrics.incr('http_tier', site=site, outcome='blocked')
+            self._archive(url, site, page_html, status='blocked')
+            return None
+
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        fingerprint = price_fingerprint(page_html, site) if self.cache else None
+        
+        # Price region unchanged: skip extraction (and the browser) entirely
+        if entry and fingerprint and fingerprint == entry.get('fingerprint'):
+            metrics.incr('http_tier', site=site, outcome='unchanged')
+            self._archive(url, site, page_html, price=entry['result'].get('price'), status='unchanged')
+            return self._from_cache(entry, url, 'hits_fingerprint')
+        if self.cache:
+            self.cache.record('misses')
+
+        with metrics.span('http_parse', site=site):
+            source, data = self.parse(page_html, site)
+        if not data:
+            metrics.incr('http_tier', site=site, outcome='no_price')
+            self._archive(url, site, page_html, status='no_price')
+            if self.cache:
+                self.pending[key] = (etag, last_modified, fingerprint)
+            return None
+
+        result = {
+            'success': True,
+            'price': data['price'],
+            'currency': data.get('currency'),
+            'title': _clean_title(data.get('title')),
+            'url': url,
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'site': site,
+            'tier': 'http',
+            'source': source
+        }
+        metrics.incr('http_tier', site=site, outcome='priced')
+        self._archive(url, site, page_html, price=data['price'])
+        if self.cache:
+            self.cache.put(key, result, etag, last_modified, fingerprint)
+        return result
+
+    def remember(self, url, result):
+        """Cache a browser-tier result under the validators the HTTP pre-check saw"""
+        if not self.cache:
+            return
+        key = canonical_id(url)
+        etag, last_modified, fingerprint = self.pending.pop(key, (None, None, None))
+        if result.get('success') and result.get('price'):
+            self.cache.put(key, result, etag, last_modified, fingerprint)
+
+    def close(self):
+        self.session.close()
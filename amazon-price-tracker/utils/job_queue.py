@@ -0,0 +1,322 @@
+# utils/job_queue.py
+import hmac
+import json
+import os
+import sqlite3
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class JobQueue:
+    """Durable SQLite work queue with leases, acks, visibility timeouts and a dead-letter state.
+
+    Any number of processes on the same machine can open the same file.
+    Hosts that can't share the file go through QueueServer/RemoteJobQueue.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY,
+            dedupe_key TEXT,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'ready',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL,
+            visible_at REAL NOT NULL,
+            lease_owner TEXT,
+            lease_expires REAL,
+            last_error TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, visible_at);
+        -- Only one live (ready or leased) job per key
+        CREATE UNIQUE INDEX IF NOT EXISTS jobs_live_key ON jobs (dedupe_key)
+            WHERE status IN ('ready', 'leased');
+    """
+
+    COLUMNS = ['id', 'dedupe_key', 'payload', 'status', 'attempts', 'max_attempts',
+               'visible_at', 'lease_owner', 'lease_expires', 'last_error']
+
+    def __init__(self, path, visibility_timeout=180, max_attempts=3):
+        self.path = path
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # isolation_level=None: we issue BEGIN IMMEDIATE ourselves so leasing is atomic
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(self.SCHEMA)
+
+    def _row(self, row):
+        job = dict(zip(self.COLUMNS, row))
+        job['payload'] = json.loads(job['payload'])
+        return job
+
+    def enqueue(self, payload, key=None, delay=0, max_attempts=None):
+        """Add a job; returns False if a live job with the same key already exists"""
+        now = time.time()
+        cursor = self.conn.execute(
+            """INSERT OR IGNORE INTO jobs
+               (dedupe_key, payload, max_attempts, visible_at, created_at, updated_at)
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            (key, json.dumps(payload), max_attempts or self.max_attempts, now + delay, now, now)
+        )
+        return cursor.rowcount == 1
+
+    def enqueue_many(self, jobs, max_attempts=None):
+        """Add [(payload, key)] in one transaction; returns how many were new"""
+        now = time.time()
+        before = self.conn.total_changes
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            self.conn.executemany(
+                """INSERT OR IGNORE INTO jobs
+                   (dedupe_key, payload, max_attempts, visible_at, created_at, updated_at)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                [(key, json.dumps(payload), max_attempts or self.max_attempts, now, now, now)
+                 for payload, key in jobs]
+            )
+            self.conn.execute('COMMIT')
+        except Exception:
+            self.conn.execute('ROLLBACK')
+            raise
+        return self.conn.total_changes - before
+
+    def lease(self, worker_id, visibility_timeout=None):
+        """Claim the next visible job (or one whose lease expired), or None"""
+        now = time.time()
+        timeout = visibility_timeout or self.visibility_timeout
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Leases that ran out on their last attempt go to the dead-letter state
+            self.conn.execute(
+                """UPDATE jobs SET status = 'dead', last_error = 'lease expired', updated_at = ?
+                   WHERE status = 'leased' AND lease_expires <= ? AND attempts >= max_attempts""",
+                (now, now)
+            )
+            row = self.conn.execute(
+                f"""SELECT {', '.join(self.COLUMNS)} FROM jobs
+                    WHERE (status = 'ready' AND visible_at <= ?)
+                       OR (status = 'leased' AND lease_expires <= ?)
+                    ORDER BY visible_at LIMIT 1""",
+                (now, now)
+            ).fetchone()
+            if row is None:
+                self.conn.execute('COMMIT')
+                return None
+            job = self._row(row)
+            self.conn.execute(
+                """UPDATE jobs SET status = 'leased', lease_owner = ?, lease_expires = ?,
+                   attempts = attempts + 1, updated_at = ? WHERE id = ?""",
+                (worker_id, now + timeout, now, job['id'])
+            )
+            self.conn.execute('COMMIT')
+        except Exception:
+            self.conn.execute('ROLLBACK')
+            raise
+        job.update(status='leased', lease_owner=worker_id, lease_expires=now + timeout,
+                   attempts=job['attempts'] + 1)
+        return job
+
+    def _owned(self, sql, params):
+        """Run an update that only applies while the worker still holds the lease"""
+        cursor = self.conn.execute(sql + " AND status = 'leased' AND lease_owner = ?", params)
+        return cursor.rowcount == 1
+
+    def ack(self, job_id, worker_id):
+        """Mark a leased job done"""
+        return self._owned(
+            "UPDATE jobs SET status = 'done', updated_at = ? WHERE id = ?",
+            (time.time(), job_id, worker_id)
+        )
+
+    def nack(self, job_id, worker_id, error=None, delay=0):
+        """Give a job back for retry after `delay` seconds, or dead-letter it when out of attempts"""
+        now = time.time()
+        return self._owned(
+            """UPDATE jobs SET
+                   status = CASE WHEN attempts >= max_attempts THEN 'dead' ELSE 'ready' END,
+                   visible_at = ?, last_error = ?, lease_owner = NULL, lease_expires = NULL,
+                   updated_at = ?
+               WHERE id = ?""",
+            (now + delay, error, now, job_id, worker_id)
+        )
+
+    def defer(self, job_id, worker_id, delay=0):
+        """Hand a job back untried (e.g. its site is shed), without using up an attempt"""
+        now = time.time()
+        return self._owned(
+            """UPDATE jobs SET
+                   status = 'ready', attempts = MAX(0, attempts - 1), visible_at = ?,
+                   lease_owner = NULL, lease_expires = NULL, updated_at = ?
+               WHERE id = ?""",
+            (now + delay, now, job_id, worker_id)
+        )
+
+    def extend(self, job_id, worker_id, visibility_timeout=None):
+        """Heartbeat: push a lease's expiry out for long jobs"""
+        expires = time.time() + (visibility_timeout or self.visibility_timeout)
+        return self._owned(
+            "UPDATE jobs SET lease_expires = ? WHERE id = ?",
+            (expires, job_id, worker_id)
+        )
+
+    def stats(self):
+        """Job counts by status"""
+        counts = {'ready': 0, 'leased': 0, 'done': 0, 'dead': 0}
+        for status, count in self.conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status'):
+            counts[status] = count
+        return counts
+
+    def dead_letters(self, limit=100):
+        rows = self.conn.execute(
+            f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE status = 'dead' "
+            "ORDER BY updated_at DESC LIMIT ?", (limit,)
+        )
+        return [self._row(row) for row in rows]
+
+    def requeue_dead(self):
+        """Give every dead-lettered job a fresh set of attempts"""
+        now = time.time()
+        cursor = self.conn.execute(
+            """UPDATE OR IGNORE jobs SET status = 'ready', attempts = 0, visible_at = ?, updated_at = ?
+               WHERE status = 'dead'""",
+            (now, now)
+        )
+        return cursor.rowcount
+
+    def purge_done(self, older_than=7 * 86400):
+        cursor = self.conn.execute(
+            "DELETE FROM jobs WHERE status = 'done' AND updated_at < ?",
+            (time.time() - older_than,)
+        )
+        return cursor.rowcount
+
+    def close(self):
+        self.conn.close()
+
+    @classmethod
+    def from_settings(cls):
+        from config import settings
+
+        return cls(
+            settings.QUEUE_FILE,
+            visibility_timeout=settings.QUEUE_VISIBILITY_TIMEOUT,
+            max_attempts=settings.QUEUE_MAX_ATTEMPTS
+        )
+
+
+class QueueServer:
+    """Tiny JSON-over-HTTP front for a JobQueue so workers on other hosts can attach.
+
+    Listens on loopback only unless given another host, and any other host
+    needs a shared token that clients send as a bearer Authorization header.
+    """
+
+    METHODS = {'enqueue', 'enqueue_many', 'lease', 'ack', 'nack', 'defer', 'extend', 'stats'}
+    LOOPBACK = {'127.0.0.1', 'localhost', '::1'}
+
+    def __init__(self, queue, host='127.0.0.1', port=8765, token=None):
+        if host not in self.LOOPBACK and not token:
+            raise ValueError(f"Refusing to serve the job queue on {host} without a token (QUEUE_SERVER_TOKEN)")
+        self.queue = queue
+        server = self
+        expected = f"Bearer {token}" if token else None
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                method = self.path.strip('/')
+                if expected and not hmac.compare_digest(self.headers.get('Authorization') or '', expected):
+                    self.send_error(401)
+                    return
+                if method not in QueueServer.METHODS:
+                    self.send_error(404)
+                    return
+                length = int(self.headers.get('Content-Length') or 0)
+                try:
+                    kwargs = json.loads(self.rfile.read(length) or b'{}')
+                    # One SQLite connection: serialize requests through the lock
+                    with server.lock:
+                        result = getattr(server.queue, method)(**kwargs)
+                    body = json.dumps({'result': result}).encode()
+                    self.send_response(200)
+                except Exception as e:
+                    body = json.dumps({'error': str(e)}).encode()
+                    self.send_response(500)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def shutdown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class RemoteJobQueue:
+    """Client for QueueServer with the same methods as JobQueue"""
+
+    def __init__(self, base_url, timeout=30, token=None):
+        import requests
+
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session()
+        if token:
+            self.session.headers['Authorization'] = f"Bearer {token}"
+
+    def _call(self, method, **kwargs):
+        response = self.session.post(f"{self.base_url}/{method}", json=kwargs, timeout=self.timeout)
+        data = response.json()
+        if 'error' in data:
+            raise RuntimeError(f"Queue server error: {data['error']}")
+        return data['result']
+
+    def enqueue(self, payload, key=None, delay=0, max_attempts=None):
+        return self._call('enqueue', payload=payload, key=key, delay=delay, max_attempts=max_attempts)
+
+    def enqueue_many(self, jobs, max_attempts=None):
+        return self._call('enqueue_many', jobs=[list(job) for job in jobs], max_attempts=max_attempts)
+
+    def lease(self, worker_id, visibility_timeout=None):
+        return self._call('lease', worker_id=worker_id, visibility_timeout=visibility_timeout)
+
+    def ack(self, job_id, worker_id):
+        return self._call('ack', job_id=job_id, worker_id=worker_id)
+
+    def nack(self, job_id, worker_id, error=None, delay=0):
+        return self._call('nack', job_id=job_id, worker_id=worker_id, error=error, delay=delay)
+
+    def defer(self, job_id, worker_id, delay=0):
+        return self._call('defer', job_id=job_id, worker_id=worker_id, delay=delay)
+
+    def extend(self, job_id, worker_id, visibility_timeout=None):
+        return self._call('extend', job_id=job_id, worker_id=worker_id,
+                          visibility_timeout=visibility_timeout)
+
+    def stats(self):
+        return self._call('stats')
+
+    def close(self):
+        self.session.close()
+
+
+def open_queue(queue_url=None):
+    """Local queue file from settings, or a remote QueueServer when a URL is given"""
+    if queue_url:
+        from config import settings
+
+        return RemoteJobQueue(queue_url, token=getattr(settings, 'QUEUE_SERVER_TOKEN', None))
+    return JobQueue.from_settings()
@@ -0,0 +1,299 @@
+# utils/metrics.py
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PREFIX = 'price_tracker'
+
+# Histogram buckets in seconds: selector probes are milliseconds, navigations tens of seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _label_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items() if value is not None))
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class _NoopSpan:
+    """What span() hands out while metrics are off - nothing to time or record"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def label(self, **labels):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ('metrics', 'name', 'labels', 'start')
+
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe(self.name, time.perf_counter() - self.start, error=exc_type is not None,
+                             **self.labels)
+        return False
+
+    def label(self, **labels):
+        """Add labels known only once the work is done (e.g. the outcome)"""
+        self.labels.update(labels)
+
+
+class Metrics:
+    """Span timings and counters for finding hot spots under real load.
+
+    `with metrics.span('navigation', site='Amazon'):` times a phase into a
+    histogram; metrics.incr('blocked', site='Walmart') bumps a counter.
+    Disabled (the default) both return immediately. Exports Prometheus
+    text (a file for node_exporter's textfile collector, or a /metrics
+    endpoint) and, optionally, one JSON log line per span and event.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.path = None
+        self.log_file = None
+        self.static_labels = {}
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.server = None
+
+    def configure(self, enabled=True, path=None, log_path=None, port=None, **static_labels):
+        """Turn collection on (or off) and choose where it goes"""
+        self.enabled = enabled
+        self.path = path
+        self.static_labels = static_labels
+        if self.log_file is not None:
+            self.log_file.close()
+            self.log_file = None
+        if enabled and log_path:
+            os.makedirs(os.path.dirname(log_path) or '.', exist_ok=True)
+            self.log_file = open(log_path, 'a', buffering=1)
+        if enabled and port:
+            self.serve(port)
+        return self
+
+    def configure_from_settings(self, enabled=None, **static_labels):
+        from config import settings
+
+        enabled = settings.METRICS_ENABLED if enabled is None else enabled
+        return self.configure(
+            enabled=enabled,
+            path=settings.METRICS_FILE,
+            log_path=settings.METRICS_LOG_FILE,
+            port=settings.METRICS_PORT,
+            **static_labels
+        )
+
+    def span(self, name, **labels):
+        """Context manager timing one phase into the `name` histogram"""
+        if not self.enabled:
+            return _NOOP_SPAN
+        return _Span(self, name, labels)
+
+    def timed(self, name, **labels):
+        """Decorator form of span()"""
+        def decorate(func):
+            def wrapper(*args, **kwargs):
+                with self.span(name, **labels):
+                    return func(*args, **kwargs)
+            wrapper.__name__ = func.__name__
+            wrapper.__doc__ = func.__doc__
+            return wrapper
+        return decorate
+
+    def observe(self, name, seconds, error=False, **labels):
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {'buckets': [0] * len(BUCKETS), 'count': 0,
+                                                    'sum': 0.0, 'max': 0.0, 'errors': 0}
+            for index, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    histogram['buckets'][index] += 1
+                    break
+            histogram['count'] += 1
+            histogram['sum'] += seconds
+            histogram['max'] = max(histogram['max'], seconds)
+            if error:
+                histogram['errors'] += 1
+        if self.log_file is not None:
+            self._log({'span': name, 'duration_ms': round(seconds * 1000, 3), 'error': error, **labels})
+
+    def incr(self, name, value=1, **labels):
+        """Add to the `name` counter"""
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def gauge(self, name, value, **labels):
+        """Set the `name` gauge to its current value"""
+        if not self.enabled:
+            return
+        with self.lock:
+            self.gauges[(name, _label_key(labels))] = value
+
+    def event(self, name, site=None, **details):
+        """Count an event per site and write it to the JSON log with its details"""
+        if not self.enabled:
+            return
+        self.incr(name, site=site)
+        if self.log_file is not None:
+            self._log({'event': name, 'site': site, **details})
+
+    def _log(self, record):
+        record = {'ts': round(time.time(), 3), **self.static_labels, **record}
+        line = json.dumps(record, default=str)
+        with self.lock:
+            if self.log_file is not None:
+                self.log_file.write(line + '\n')
+
+    def prometheus_text(self):
+        """Everything collected so far in the Prometheus text exposition format"""
+        static = tuple(sorted((name, str(value)) for name, value in self.static_labels.items()))
+        lines = []
+        with self.lock:
+            counters = dict(self.counters)
+            gauges = dict(self.gauges)
+            histograms = {key: dict(value, buckets=list(value['buckets']))
+                          for key, value in self.histograms.items()}
+
+        for name in sorted({name for name, _ in counters}):
+            metric = f"{PREFIX}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            for (counter_name, key), value in sorted(counters.items()):
+                if counter_name == name:
+                    lines.append(f"{metric}{_format_labels(key, static)} {value}")
+
+        for name in sorted({name for name, _ in gauges}):
+            metric = f"{PREFIX}_{name}"
+            lines.append(f"# TYPE {metric} gauge")
+            for (gauge_name, key), value in sorted(gauges.items()):
+                if gauge_name == name:
+                    lines.append(f"{metric}{_format_labels(key, static)} {value}")
+
+        for name in sorted({name for name, _ in histograms}):
+            metric = f"{PREFIX}_{name}_seconds"
+            lines.append(f"# TYPE {metric} histogram")
+            for (histogram_name, key), histogram in sorted(histograms.items()):
+                if histogram_name != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(BUCKETS, histogram['buckets']):
+                    cumulative += count
+                    lines.append(f"{metric}_bucket{_format_labels(key, static + (('le', str(bound)),))} "
+                                 f"{cumulative}")
+                lines.append(f"{metric}_bucket{_format_labels(key, static + (('le', '+Inf'),))} "
+                             f"{histogram['count']}")
+                lines.append(f"{metric}_sum{_format_labels(key, static)} {histogram['sum']:.6f}")
+                lines.append(f"{metric}_count{_format_labels(key, static)} {histogram['count']}")
+            errors = [(key, histogram['errors']) for (histogram_name, key), histogram
+                      in sorted(histograms.items()) if histogram_name == name]
+            lines.append(f"# TYPE {PREFIX}_{name}_errors_total counter")
+            for key, count in errors:
+                lines.append(f"{PREFIX}_{name}_errors_total{_format_labels(key, static)} {count}")
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path=None):
+        """Write the Prometheus text file (atomically, so a scrape never sees half of it)"""
+        path = path or self.path
+        if not self.enabled or not path:
+            return None
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+        return path
+
+    def serve(self, port, host='0.0.0.0'):
+        """Serve /metrics from a background thread"""
+        if self.server is not None:
+            return self.server
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus_text().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name='metrics-server', daemon=True).start()
+        return self.server
+
+    def summary(self):
+        """Per-span totals, most time first: [(name, labels, count, total_s, mean_s, max_s, errors)]"""
+        with self.lock:
+            rows = [
+                (name, dict(key), histogram['count'], histogram['sum'],
+                 histogram['sum'] / histogram['count'], histogram['max'], histogram['errors'])
+                for (name, key), histogram in self.histograms.items() if histogram['count']
+            ]
+        return sorted(rows, key=lambda row: -row[3])
+
+    def counter_totals(self):
+        """{name: total across labels}"""
+        totals = {}
+        with self.lock:
+            for (name, _), value in self.counters.items():
+                totals[name] = totals.get(name, 0) + value
+        return totals
+
+    def close(self):
+        self.write()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        if self.log_file is not None:
+            self.log_file.close()
+            self.log_file = None
+
+
+# Process-wide collector; instrumented code calls metrics.span()/incr() unconditionally
+metrics = Metrics()
@@ -0,0 +1,339 @@
+# utils/page_archive.py
+import hashlib
+import json
+import mmap
+import os
+import sqlite3
+import struct
+import threading
+import zlib
+from datetime import datetime
+
+from utils.metrics import metrics
+from utils.urls import canonical_id
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process appends only
+    fcntl = None
+
+# Record: magic, header length, body length, JSON header, zlib-compressed HTML.
+# A repeat of a stored page is a header-only record (body length 0) naming its content hash.
+MAGIC = b'PGA1'
+RECORD_HEADER = struct.Struct('>4sII')
+
+
+class PageArchive:
+    """Append-only, compressed archive of fetched pages with a SQLite index.
+
+    Every page goes into one data file as a self-describing record (so the
+    index can be rebuilt from the data alone); identical pages are stored
+    once, and each repeat fetch adds only a small header record pointing at
+    that copy by content hash. The index maps product, site, tier and fetch time to the record's
+    offset, and keeps the price the scraper got at the time so a replay
+    can show what a parser fix changes.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS pages (
+            id INTEGER PRIMARY KEY,
+            product_key TEXT NOT NULL,
+            site TEXT,
+            url TEXT NOT NULL,
+            tier TEXT NOT NULL,
+            status TEXT NOT NULL,
+            fetched_at TEXT NOT NULL,
+            price REAL,
+            content_hash TEXT NOT NULL,
+            offset INTEGER NOT NULL,
+            length INTEGER NOT NULL,
+            raw_size INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS pages_product ON pages (product_key, fetched_at);
+        CREATE INDEX IF NOT EXISTS pages_hash ON pages (content_hash);
+    """
+
+    COLUMNS = ['id', 'product_key', 'site', 'url', 'tier', 'status', 'fetched_at', 'price',
+               'content_hash', 'offset', 'length', 'raw_size']
+
+    _shared = None
+
+    def __init__(self, directory, compression_level=6):
+        self.directory = directory
+        self.compression_level = compression_level
+        os.makedirs(directory, exist_ok=True)
+        self.data_path = os.path.join(directory, 'pages.bin')
+        self.index_path = os.path.join(directory, 'pages.db')
+        self.conn = sqlite3.connect(self.index_path, timeout=30, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(self.SCHEMA)
+        self.lock = threading.Lock()
+        self.data = None
+        self.map = None
+
+    @classmethod
+    def shared(cls):
+        """Archive configured in settings, or None when archiving is off"""
+        if cls._shared is None:
+            from config import settings
+
+            if not getattr(settings, 'ARCHIVE_ENABLED', False):
+                return None
+            cls._shared = cls(settings.ARCHIVE_DIR, settings.ARCHIVE_COMPRESSION_LEVEL)
+        return cls._shared
+
+    @classmethod
+    def enable(cls, directory=None):
+        """Turn archiving on for this process (run --archive)"""
+        from config import settings
+
+        settings.ARCHIVE_ENABLED = True
+        if directory:
+            settings.ARCHIVE_DIR = directory
+        cls._shared = None
+        return cls.shared()
+
+    def add(self, url, site, tier, page_html, price=None, status='ok', fetched_at=None):
+        """Archive one fetched page; returns its index id"""
+        fetched_at = fetched_at or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        body = page_html.encode('utf-8')
+        content_hash = hashlib.sha1(body).hexdigest()
+        entry = {
+            'product_key': canonical_id(url), 'site': site, 'url': url, 'tier': tier,
+            'status': status, 'fetched_at': fetched_at, 'price': price,
+            'content_hash': content_hash, 'raw_size': len(body),
+        }
+
+        with metrics.span('archive_write', tier=tier), self.lock:
+            same = self.conn.execute(
+                'SELECT offset, length FROM pages WHERE content_hash = ? LIMIT 1', (content_hash,)
+            ).fetchone()
+            if same:
+                entry['offset'], entry['length'] = same
+                # Header only, so a rebuilt index still has this fetch and its price
+                self._append(entry, None)
+            else:
+                entry['offset'], entry['length'] = self._append(entry, body)
+            with self.conn:
+                cursor = self.conn.execute(
+                    """INSERT INTO pages (product_key, site, url, tier, status, fetched_at, price,
+                                          content_hash, offset, length, raw_size)
+                       VALUES (:product_key, :site, :url, :tier, :status, :fetched_at, :price,
+                               :content_hash, :offset, :length, :raw_size)""",
+                    entry
+                )
+        metrics.incr('archived_pages', tier=tier, stored='duplicate' if same else 'new')
+        return cursor.lastrowid
+
+    def _append(self, entry, body):
+        """Write one record (header only when body is None) at the end of the data file;
+        returns (offset, length) of the record"""
+        header = json.dumps({key: entry[key] for key in
+                             ('product_key', 'site', 'url', 'tier', 'status', 'fetched_at', 'price',
+                              'content_hash')}).encode()
+        compressed = zlib.compress(body, self.compression_level) if body is not None else b''
+        record = RECORD_HEADER.pack(MAGIC, len(header), len(compressed)) + header + compressed
+        with open(self.data_path, 'ab') as f:
+            # Worker processes append to the same file; the lock keeps offsets honest
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0, os.SEEK_END)
+                offset = f.tell()
+                f.write(record)
+                f.flush()
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+        return offset, len(record)
+
+    def capture(self, page, url, site, result=None, status='ok'):
+        """Archive a browser page's rendered HTML (sync API); never breaks the scrape"""
+        try:
+            self.add(url, site, 'browser', page.content(), price=(result or {}).get('price'), status=status)
+        except Exception as e:
+            print(f"⚠️ Could not archive {url}: {str(e)}")
+
+    async def capture_async(self, page, url, site, result=None, status='ok'):
+        """capture() for async API pages"""
+        import asyncio
+
+        try:
+            page_html = await page.content()
+            await asyncio.to_thread(self.add, url, site, 'browser', page_html,
+                                    (result or {}).get('price'), status)
+        except Exception as e:
+            print(f"⚠️ Could not archive {url}: {str(e)}")
+
+    def _mapped(self, needed=1):
+        """Read-only memory map of the data file, remapped once a record lies past its end"""
+        if self.map is None or len(self.map) < needed:
+            self._unmap()
+            if not os.path.exists(self.data_path) or os.path.getsize(self.data_path) == 0:
+                return None
+            self.data = open(self.data_path, 'rb')
+            self.map = mmap.mmap(self.data.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.map
+
+    def _unmap(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        if self.data is not None:
+            self.data.close()
+            self.data = None
+
+    def read_record(self, offset, length):
+        """(header dict, page HTML) for the record at offset"""
+        view = self._mapped(offset + length)
+        magic, header_size, body_size = RECORD_HEADER.unpack_from(view, offset)
+        if magic != MAGIC or RECORD_HEADER.size + header_size + body_size != length:
+            raise ValueError(f"Corrupt archive record at offset {offset}")
+        start = offset + RECORD_HEADER.size
+        header = json.loads(view[start:start + header_size])
+        body = zlib.decompress(view[start + header_size:start + header_size + body_size]) if body_size else b''
+        return header, body.decode('utf-8')
+
+    def read(self, entry):
+        """Page HTML for an index entry"""
+        return self.read_record(entry['offset'], entry['length'])[1]
+
+    def entries(self, site=None, product=None, since=None, until=None, tier=None, latest_only=False):
+        """Index entries matching the filters, oldest first"""
+        clauses, params = [], []
+        if site:
+            clauses.append('site = ?')
+            params.append(site)
+        if product:
+            clauses.append('(product_key = ? OR url LIKE ?)')
+            params.extend([product, f'%{product}%'])
+        if since:
+            clauses.append('fetched_at >= ?')
+            params.append(since)
+        if until:
+            clauses.append('fetched_at <= ?')
+            params.append(until)
+        if tier:
+            clauses.append('tier = ?')
+            params.append(tier)
+        if latest_only:
+            clauses.append('id IN (SELECT MAX(id) FROM pages GROUP BY product_key)')
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        rows = self.conn.execute(f"SELECT {', '.join(self.COLUMNS)} FROM pages {where} ORDER BY id", params)
+        return [dict(zip(self.COLUMNS, row)) for row in rows]
+
+    def stats(self):
+        pages, products, raw_size = self.conn.execute(
+            'SELECT COUNT(*), COUNT(DISTINCT product_key), COALESCE(SUM(raw_size), 0) FROM pages'
+        ).fetchone()
+        stored = os.path.getsize(self.data_path) if os.path.exists(self.data_path) else 0
+        return {
+            'pages': pages,
+            'products': products,
+            'raw_bytes': raw_size,
+            'stored_bytes': stored,
+            'ratio': raw_size / stored if stored else 0.0,
+        }
+
+    def rebuild_index(self):
+        """Recreate the index from the data file (after losing or corrupting pages.db)"""
+        self._unmap()
+        view = self._mapped()
+        entries = []
+        stored = {}
+        lost = 0
+        offset = 0
+        while view is not None and offset + RECORD_HEADER.size <= len(view):
+            magic, header_size, body_size = RECORD_HEADER.unpack_from(view, offset)
+            length = RECORD_HEADER.size + header_size + body_size
+            if magic != MAGIC or offset + length > len(view):
+                print(f"⚠️ Archive ends with a partial record at offset {offset}; ignoring the rest")
+                break
+            header, page_html = self.read_record(offset, length)
+            if body_size == 0 and header.get('content_hash'):
+                # A repeat fetch: index it against the record that holds the page
+                copy = stored.get(header['content_hash'])
+                if copy:
+                    entries.append({**header, **copy})
+                else:
+                    lost += 1
+            else:
+                body = page_html.encode('utf-8')
+                copy = {'content_hash': hashlib.sha1(body).hexdigest(), 'offset': offset,
+                        'length': length, 'raw_size': len(body)}
+                stored.setdefault(copy['content_hash'], copy)
+                entries.append({**header, **copy})
+            offset += length
+        with self.lock, self.conn:
+            self.conn.execute('DELETE FROM pages')
+            self.conn.executemany(
+                """INSERT INTO pages (product_key, site, url, tier, status, fetched_at, price,
+                                      content_hash, offset, length, raw_size)
+                   VALUES (:product_key, :site, :url, :tier, :status, :fetched_at, :price,
+                           :content_hash, :offset, :length, :raw_size)""",
+                entries
+            )
+        if lost:
+            print(f"⚠️ {lost} repeat fetches point at pages missing from the data file; left out")
+        return len(entries)
+
+    def close(self):
+        self._unmap()
+        self.conn.close()
+
+
+_replay_archive = None
+
+
+def _replay_init(directory):
+    global _replay_archive
+    _replay_archive = PageArchive(directory)
+
+
+def _replay_one(entry):
+    """Re-extract one archived page in a replay worker process"""
+    from scrapers import registry
+    from utils.anti_detection import PageValidator
+
+    page_html = _replay_archive.read(entry)
+    site = entry['site']
+    verdict = PageValidator.check_html(page_html, entry['url'])
+    if verdict.blocked:
+        return {**entry, 'new_price': None, 'source': 'blocked'}
+
+    result = None
+    if entry['tier'] == 'http':
+        # What the HTTP tier saw: its embedded-JSON/markup parsers first
+        from utils.http_fetcher import SITE_PARSERS
+
+        for source, parser in SITE_PARSERS.get(site, []):
+            data = parser(page_html)
+            if data and data.get('price'):
+                result = {'price': data['price'], 'source': source}
+                break
+    if result is None:
+        extraction = registry.extraction(site)
+        if extraction is not None:
+            plan, build_result = extraction
+            built = build_result(entry['url'], plan.run_html(page_html))
+            if built.get('success') and built.get('price'):
+                result = {'price': built['price'], 'source': built.get('matched_selector')}
+    result = result or {'price': None, 'source': None}
+    return {**entry, 'new_price': result['price'], 'source': result['source']}
+
+
+def replay(directory, entries, jobs=None, chunksize=16):
+    """Re-run the current extraction over archived pages on every core; yields results as they finish"""
+    import multiprocessing
+
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or len(entries) < 2 * chunksize:
+        _replay_init(directory)
+        for entry in entries:
+            yield _replay_one(entry)
+        return
+
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(jobs, initializer=_replay_init, initargs=(directory,)) as pool:
+        yield from pool.imap_unordered(_replay_one, entries, chunksize=chunksize)
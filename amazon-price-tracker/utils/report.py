@@ -0,0 +1,356 @@
+# utils/report.py
+import hashlib
+import html as html_lib
+import json
+import os
+import numpy as np
+import pandas as pd
+
+KEY = ['product_name', 'site']
+DAY_KEY = KEY + ['day']
+
+SUMMARY_HEADER = ['Product', 'Site', 'Current', 'Min', 'Max', 'Average', 'Target',
+                  '% vs Target', '7-Day Avg', 'Trend', 'Samples', 'First Seen', 'Last Seen']
+DAILY_HEADER = ['Date', 'Product', 'Open', 'Low', 'High', 'Close', 'Samples']
+
+HISTORY_COLUMNS = ['product_name', 'site', 'timestamp', 'price', 'target_price']
+
+# Bump when the sheet layout changes so old cached rows aren't reused
+REPORT_VERSION = 1
+
+
+def _chunk_partials(chunk):
+    """Per product and day aggregates for one chunk of rows"""
+    if 'samples' not in chunk:
+        chunk = chunk.assign(samples=1)
+    # datetime64 sorts and groups far faster than timestamp strings
+    timestamp = pd.to_datetime(chunk['timestamp'], format='ISO8601', errors='coerce')
+    chunk = chunk.assign(
+        site=chunk['site'].fillna(''),
+        timestamp=timestamp,
+        day=timestamp.dt.floor('D'),
+        weighted=chunk['price'] * chunk['samples'],
+    ).dropna(subset=['price', 'timestamp'])
+    if chunk.empty:
+        return None
+    chunk = chunk.sort_values('timestamp', kind='stable')
+
+    grouped = chunk.groupby(DAY_KEY, sort=False)
+    return grouped.agg(
+        low=('price', 'min'),
+        high=('price', 'max'),
+        total=('weighted', 'sum'),
+        samples=('samples', 'sum'),
+        open_ts=('timestamp', 'first'),
+        open=('price', 'first'),
+        close_ts=('timestamp', 'last'),
+        close=('price', 'last'),
+        target=('target_price', 'last'),
+    ).reset_index()
+
+
+def combine_partials(parts):
+    """Merge per-chunk daily aggregates into one row per product and day"""
+    parts = [part for part in parts if part is not None]
+    if not parts:
+        return pd.DataFrame(columns=DAY_KEY + ['low', 'high', 'total', 'samples', 'open_ts',
+                                               'open', 'close_ts', 'close', 'target'])
+    df = pd.concat(parts, ignore_index=True)
+    by_close = df.sort_values('close_ts', kind='stable').groupby(DAY_KEY, sort=False)
+    daily = by_close.agg(
+        low=('low', 'min'),
+        high=('high', 'max'),
+        total=('total', 'sum'),
+        samples=('samples', 'sum'),
+        close_ts=('close_ts', 'last'),
+        close=('close', 'last'),
+        target=('target', 'last'),
+    )
+    opens = df.sort_values('open_ts', kind='stable').groupby(DAY_KEY, sort=False).agg(
+        open_ts=('open_ts', 'first'), open=('open', 'first')
+    )
+    return daily.join(opens).reset_index().sort_values(DAY_KEY, ignore_index=True)
+
+
+def daily_aggregates(chunks):
+    """One pass over history chunks; memory grows with products x days, not rows"""
+    parts = []
+    for chunk in chunks:
+        parts.append(_chunk_partials(chunk))
+        # Fold partials as we go so a long history never holds every chunk's output
+        if len(parts) >= 8:
+            parts = [combine_partials(parts)]
+    return combine_partials(parts)
+
+
+def recent_days(daily, days):
+    """Rows from each product's own last `days` observed days"""
+    last_day = daily.groupby(KEY)['day'].transform('max')
+    return daily[(last_day - daily['day']).dt.days < days]
+
+
+def summarize(daily, targets=None):
+    """Per-product stats from daily aggregates (all vectorized)"""
+    if daily.empty:
+        return pd.DataFrame(columns=KEY + ['current', 'min', 'max', 'average', 'target',
+                                           'vs_target', 'avg_7d', 'trend', 'samples',
+                                           'first_seen', 'last_seen'])
+
+    grouped = daily.groupby(KEY, sort=True)
+    summary = grouped.agg(
+        current=('close', 'last'),
+        min=('low', 'min'),
+        max=('high', 'max'),
+        total=('total', 'sum'),
+        samples=('samples', 'sum'),
+        first_seen=('open_ts', 'first'),
+        last_seen=('close_ts', 'last'),
+        last_day=('day', 'last'),
+        target=('target', 'last'),
+    ).reset_index()
+    summary['average'] = summary['total'] / summary['samples']
+
+    recent = recent_days(daily, 7).groupby(KEY).agg(total=('total', 'sum'), samples=('samples', 'sum'))
+    summary = summary.merge((recent['total'] / recent['samples']).rename('avg_7d').reset_index(),
+                            on=KEY, how='left')
+
+    if targets:
+        configured = pd.Series(
+            [targets.get((name, site)) for name, site in zip(summary['product_name'], summary['site'])],
+            dtype='float64'
+        )
+        summary['target'] = configured.fillna(summary['target'].astype('float64'))
+    summary['vs_target'] = (summary['current'] - summary['target']) / summary['target']
+    summary['trend'] = (summary['current'] - summary['avg_7d']) / summary['avg_7d']
+    return summary.drop(columns=['total', 'last_day'])
+
+
+def trend_label(change):
+    if change is None or np.isnan(change):
+        return ''
+    if abs(change) < 0.01:
+        return '→ flat'
+    return f"{'↑' if change > 0 else '↓'} {abs(change):.1%}"
+
+
+def sheet_name(site):
+    """Worksheet title for a site's daily sheet"""
+    return (site or 'Unknown site')[:31]
+
+
+def _ts(value):
+    return value.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def summary_rows(summary):
+    def value(v):
+        return None if v is None or (isinstance(v, float) and np.isnan(v)) else v
+
+    return [
+        [r.product_name, r.site, value(r.current), value(r.min), value(r.max),
+         value(round(r.average, 2)), value(r.target), value(r.vs_target), value(r.avg_7d),
+         trend_label(r.trend), int(r.samples), _ts(r.first_seen), _ts(r.last_seen)]
+        for r in summary.itertuples(index=False)
+    ]
+
+
+def daily_rows(daily):
+    return [
+        [r.day.strftime('%Y-%m-%d'), r.product_name, r.open, r.low, r.high, r.close, int(r.samples)]
+        for r in daily.itertuples(index=False)
+    ]
+
+
+class ReportGenerator:
+    """Writes REPORT_FILE from the history store in bounded memory.
+
+    History is read in chunks and reduced to per-product daily aggregates,
+    from which the Summary sheet (whole history) and one sheet per site
+    with each product's last `daily_days` days of daily bars are built.
+    The workbook is streamed with openpyxl's write-only mode. Each sheet's
+    rows are cached next to the report with a fingerprint of its inputs, so
+    sheets whose data hasn't changed are copied from the cache rather than
+    recomputed, and an unchanged report isn't rewritten at all.
+    """
+
+    def __init__(self, store, path, products=None, chunksize=250000, daily_days=90):
+        self.store = store
+        self.path = path
+        self.chunksize = chunksize
+        self.daily_days = daily_days
+        self.targets = {(p['name'], p['site']): p['target_price'] for p in products or []}
+        self.state_path = os.path.splitext(path)[0] + '.state.json'
+
+    def _load_state(self):
+        if os.path.exists(self.state_path):
+            try:
+                with open(self.state_path) as f:
+                    state = json.load(f)
+                if state.get('version') == REPORT_VERSION:
+                    return state
+            except (OSError, ValueError):
+                pass
+        return {'version': REPORT_VERSION, 'sheets': {}}
+
+    def _save_state(self, state):
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+
+    def site_versions(self):
+        """Cheap per-site data version from the latest-price index (or the CSV file)"""
+        self.store.flush()
+        if not hasattr(self.store, 'conn'):
+            stat = os.stat(self.store.path) if os.path.exists(self.store.path) else None
+            version = [stat.st_size, stat.st_mtime] if stat else None
+            return {None: version}
+
+        rows = self.store.conn.execute(
+            "SELECT site, COUNT(*), SUM(samples), MAX(last_seen) FROM latest_prices GROUP BY site"
+        )
+        versions = {site: [products, samples, last_seen] for site, products, samples, last_seen in rows}
+        # Compaction rewrites history without adding samples
+        compacted = self.store.conn.execute(
+            "SELECT name FROM sqlite_master WHERE name = 'price_intervals'"
+        ).fetchone()
+        if compacted:
+            versions['_intervals'] = self.store.conn.execute(
+                'SELECT COUNT(*), MAX(end_ts) FROM price_intervals'
+            ).fetchone()
+        return versions
+
+    def _fingerprint(self, *parts):
+        return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _chunks(self):
+        yield from self.store.iter_history(self.chunksize, columns=HISTORY_COLUMNS)
+        if not hasattr(self.store, 'conn'):
+            return
+        has_intervals = self.store.conn.execute(
+            "SELECT name FROM sqlite_master WHERE name = 'price_intervals'"
+        ).fetchone()
+        if not has_intervals:
+            return
+        # Compacted runs count as their first observation plus the rest at their end
+        yield from pd.read_sql_query(
+            """SELECT product_name, site, start_ts AS timestamp, price, NULL AS target_price,
+                      1 AS samples FROM price_intervals
+               UNION ALL
+               SELECT product_name, site, end_ts, price, NULL, samples - 1
+               FROM price_intervals WHERE samples > 1""",
+            self.store.conn, chunksize=self.chunksize
+        )
+
+    def _plan(self, cached):
+        """Fingerprint of every sheet's inputs, and which sheets must be recomputed"""
+        versions = self.site_versions()
+        targets = sorted(self.targets.items(), key=str)
+        if None in versions:
+            # CSV: one file version covers every sheet
+            fingerprint = self._fingerprint(versions[None], targets, self.daily_days)
+            names = list(cached) or ['Summary']
+            if any(cached.get(name, {}).get('fingerprint') != fingerprint for name in names):
+                return None, fingerprint
+            return {name: fingerprint for name in names}, fingerprint
+
+        intervals = versions.pop('_intervals', None)
+        wanted = {'Summary': self._fingerprint(versions, intervals, targets)}
+        for site in sorted(versions):
+            wanted[sheet_name(site)] = self._fingerprint(versions[site], intervals, self.daily_days)
+        return wanted, None
+
+    def generate(self, force=False, html_path=None):
+        """Build the report; returns the names of the sheets that were recomputed"""
+        state = {'version': REPORT_VERSION, 'sheets': {}} if force else self._load_state()
+        cached = state['sheets']
+        wanted, csv_fingerprint = self._plan(cached)
+        if wanted is None:
+            stale = None  # everything, sheet list comes from the data
+        else:
+            stale = [name for name, fingerprint in wanted.items()
+                     if cached.get(name, {}).get('fingerprint') != fingerprint]
+
+        sheets = {}
+        if stale is None or stale:
+            daily = daily_aggregates(self._chunks())
+            daily['sheet'] = daily['site'].map(sheet_name)
+            if stale is None:
+                wanted = {name: csv_fingerprint for name in ['Summary'] + sorted(daily['sheet'].unique())}
+                stale = list(wanted)
+            if 'Summary' in stale:
+                sheets['Summary'] = summary_rows(summarize(daily, self.targets))
+            recent = recent_days(daily, self.daily_days)
+            for name in stale:
+                if name != 'Summary':
+                    sheets[name] = daily_rows(recent[recent['sheet'] == name])
+        elif os.path.exists(self.path) and set(cached) == set(wanted):
+            if html_path:
+                self.write_html(cached['Summary']['rows'], html_path)
+            print(f"📄 Report up to date: {self.path}")
+            return []
+
+        for name in wanted:
+            if name not in sheets:
+                sheets[name] = cached[name]['rows']
+        self.write_workbook(wanted, sheets)
+        if html_path:
+            self.write_html(sheets['Summary'], html_path)
+
+        self._save_state({
+            'version': REPORT_VERSION,
+            'sheets': {name: {'fingerprint': wanted[name], 'rows': sheets[name]} for name in wanted}
+        })
+        print(f"📄 Report written to {self.path} (recomputed: {', '.join(stale) or 'none'})")
+        return stale
+
+    def write_workbook(self, names, sheets):
+        """Stream every sheet through a write-only workbook, then swap it into place"""
+        from openpyxl import Workbook
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Font
+
+        workbook = Workbook(write_only=True)
+        bold = Font(bold=True)
+        for name in names:
+            sheet = workbook.create_sheet(title=name[:31])
+            header = SUMMARY_HEADER if name == 'Summary' else DAILY_HEADER
+            cells = []
+            for label in header:
+                cell = WriteOnlyCell(sheet, value=label)
+                cell.font = bold
+                cells.append(cell)
+            sheet.append(cells)
+            for row in sheets[name]:
+                sheet.append(row)
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        workbook.save(tmp_path)
+        os.replace(tmp_path, self.path)
+
+    def write_html(self, rows, path):
+        """Summary table as a standalone HTML page"""
+        def cell(index, value):
+            if value is None:
+                return ''
+            if SUMMARY_HEADER[index] == '% vs Target':
+                return f"{value:+.1%}"
+            if isinstance(value, float):
+                return f"${value:,.2f}"
+            return html_lib.escape(str(value))
+
+        body = '\n'.join(
+            '<tr>' + ''.join(f'<td>{cell(i, v)}</td>' for i, v in enumerate(row)) + '</tr>'
+            for row in rows
+        )
+        head = ''.join(f'<th>{label}</th>' for label in SUMMARY_HEADER)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(
+                '<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>Price Report</title>'
+                '<style>body{font-family:sans-serif}table{border-collapse:collapse}'
+                'td,th{border:1px solid #ccc;padding:4px 8px}</style></head><body>\n'
+                f'<h1>Price Report</h1>\n<table>\n<tr>{head}</tr>\n{body}\n</table>\n</body></html>\n'
+            )
+        print(f"🌐 HTML report written to {path}")
@@ -0,0 +1,127 @@
+# utils/resource_blocker.py
+from urllib.parse import urlsplit
+
+# Rough transfer size of a typical request of each type, used to estimate savings
+AVERAGE_BYTES = {
+    'image': 60000,
+    'media': 500000,
+    'font': 40000,
+    'stylesheet': 30000,
+    'script': 80000,
+    'xhr': 5000,
+    'fetch': 5000,
+    'other': 5000,
+}
+
+
+def _host_matches(host, domains):
+    """True if host is one of domains or a subdomain of one"""
+    for domain in domains:
+        if host == domain or host.endswith('.' + domain):
+            return True
+    return False
+
+
+class ResourceBlocker:
+    """Abort requests the scrapers don't need (images, fonts, trackers...)"""
+
+    _site_blockers = {}
+
+    def __init__(self, blocked_types=None, blocked_domains=None, allowed_domains=None,
+                 allowed_types=None):
+        self.blocked_types = set(blocked_types or [])
+        self.blocked_domains = list(blocked_domains or [])
+        self.allowed_domains = list(allowed_domains or [])
+        # The document itself is never blocked
+        self.allowed_types = set(allowed_types or []) | {'document'}
+        self.counters = {
+            'requests_allowed': 0,
+            'requests_blocked': 0,
+            'bytes_saved_estimate': 0,
+            'bytes_received': 0,
+            'blocked_by_type': {},
+        }
+
+    @classmethod
+    def for_site(cls, site=None):
+        """Shared blocker built from settings, one per site so counters add up"""
+        if site not in cls._site_blockers:
+            from config import settings
+
+            if not getattr(settings, 'BLOCK_RESOURCES', True):
+                cls._site_blockers[site] = None
+            else:
+                rules = getattr(settings, 'SITE_RESOURCE_RULES', {}).get(site, {})
+                cls._site_blockers[site] = cls(
+                    blocked_types=rules.get('block_types', settings.BLOCKED_RESOURCE_TYPES),
+                    blocked_domains=list(settings.BLOCKED_DOMAINS) + rules.get('block_domains', []),
+                    allowed_domains=rules.get('allow_domains', []),
+                    allowed_types=rules.get('allow_types', []),
+                )
+        return cls._site_blockers[site]
+
+    @classmethod
+    def all_stats(cls):
+        """Counters for every site blocker created so far"""
+        return {site or 'default': blocker.stats()
+                for site, blocker in cls._site_blockers.items() if blocker}
+
+    def should_block(self, resource_type, url):
+        """Return the reason to block a request, or None to let it through"""
+        if resource_type in self.allowed_types:
+            return None
+        host = (urlsplit(url).hostname or '').lower()
+        if self.allowed_domains and _host_matches(host, self.allowed_domains):
+            return None
+        if resource_type in self.blocked_types:
+            return resource_type
+        if _host_matches(host, self.blocked_domains):
+            return 'domain'
+        return None
+
+    def _record_block(self, resource_type):
+        self.counters['requests_blocked'] += 1
+        self.counters['bytes_saved_estimate'] += AVERAGE_BYTES.get(resource_type, AVERAGE_BYTES['other'])
+        by_type = self.counters['blocked_by_type']
+        by_type[resource_type] = by_type.get(resource_type, 0) + 1
+
+    def _record_response(self, response):
+        length = response.headers.get('content-length')
+        if length and length.isdigit():
+            self.counters['bytes_received'] += int(length)
+
+    def handle(self, route):
+        """Route handler for the sync API"""
+        request = route.request
+        if self.should_block(request.resource_type, request.url):
+            self._record_block(request.resource_type)
+            route.abort()
+        else:
+            self.counters['requests_allowed'] += 1
+            route.continue_()
+
+    async def handle_async(self, route):
+        """Route handler for the async API"""
+        request = route.request
+        if self.should_block(request.resource_type, request.url):
+            self._record_block(request.resource_type)
+            await route.abort()
+        else:
+            self.counters['requests_allowed'] += 1
+            await route.continue_()
+
+    def attach(self, target):
+        """Install on a sync BrowserContext or Page"""
+        target.route('**/*', self.handle)
+        target.on('response', self._record_response)
+
+    async def attach_async(self, target):
+        """Install on an async BrowserContext or Page"""
+        await target.route('**/*', self.handle_async)
+        target.on('response', self._record_response)
+
+    def stats(self):
+        """Copy of the counters"""
+        stats = dict(self.counters)
+        stats['blocked_by_type'] = dict(self.counters['blocked_by_type'])
+        return stats
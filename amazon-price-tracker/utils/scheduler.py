@@ -0,0 +1,527 @@
+# utils/scheduler.py
+import asyncio
+import heapq
+import itertools
+import random
+import sqlite3
+import threading
+import time
+import os
+from utils.metrics import metrics
+from utils.urls import domain_of
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, up to `burst` saved up"""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_take(self):
+        """Take a token if one is available; otherwise return seconds until one is"""
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else float('inf')
+
+
+class DomainLimiter:
+    """Per-domain token buckets plus a cap on in-flight requests per domain"""
+
+    def __init__(self, limits=None, default=None):
+        self.limits = limits or {}
+        self.default = default or {'rate': 0.2, 'burst': 1, 'concurrency': 1}
+        self.buckets = {}
+        self.in_flight = {}
+        self.lock = threading.Lock()
+
+    def _limit(self, domain):
+        return self.limits.get(domain, self.default)
+
+    def try_acquire(self, domain):
+        """Take a slot and a token for domain, or return seconds to wait before retrying"""
+        with self.lock:
+            limit = self._limit(domain)
+            if self.in_flight.get(domain, 0) >= limit.get('concurrency', 1):
+                return 0.1
+            bucket = self.buckets.get(domain)
+            if bucket is None:
+                bucket = self.buckets[domain] = TokenBucket(limit['rate'], limit.get('burst', 1))
+            wait = bucket.try_take()
+            if wait == 0:
+                self.in_flight[domain] = self.in_flight.get(domain, 0) + 1
+            return wait
+
+    def acquire(self, domain, heartbeat=None, every=60):
+        """Blocking acquire for sequential code; heartbeat() runs every `every` seconds of waiting"""
+        beat = time.monotonic()
+        while True:
+            wait = self.try_acquire(domain)
+            if wait == 0:
+                return
+            if heartbeat and time.monotonic() - beat >= every:
+                heartbeat()
+                beat = time.monotonic()
+            time.sleep(min(wait, every))
+
+    async def acquire_async(self, domain):
+        """Acquire without blocking the event loop"""
+        while True:
+            wait = self.try_acquire(domain)
+            if wait == 0:
+                return
+            await asyncio.sleep(wait)
+
+    def release(self, domain):
+        with self.lock:
+            self.in_flight[domain] = max(0, self.in_flight.get(domain, 0) - 1)
+
+    @classmethod
+    def from_settings(cls, share=1):
+        """Limiter from settings; with share=N each of N worker processes gets 1/N of the budget"""
+        from config import settings
+
+        def split(limit):
+            return {
+                'rate': limit['rate'] / share,
+                'burst': max(1, limit.get('burst', 1) // share),
+                'concurrency': max(1, limit.get('concurrency', 1) // share)
+            }
+
+        limits = {domain: split(limit) for domain, limit in settings.DOMAIN_LIMITS.items()}
+        return cls(limits, split(settings.DEFAULT_DOMAIN_LIMIT))
+
+
+def failure_kind(result):
+    """None for a priced result, else 'blocked', 'timeout', 'no_price' or 'error'"""
+    if result.get('success') and result.get('price'):
+        return None
+    error = str(result.get('error') or '').lower()
+    if 'blocked' in error or 'captcha' in error:
+        return 'blocked'
+    if 'timeout' in error or 'timed out' in error:
+        return 'timeout'
+    if result.get('success'):
+        # A wall the scraper didn't catch still "succeeds" with no price; its title or URL gives it away
+        from utils.anti_detection import PageValidator
+        
+        verdict = PageValidator.check_text('', result.get('title') or '', result.get('url') or '')
+        return 'blocked' if verdict.blocked else 'no_price'
+    if not error or 'not found' in error:
+        return 'no_price'
+    return 'error'
+
+
+class RetryPolicy:
+    """Exponential backoff with jitter: attempt n waits about base * 2**(n-1), capped"""
+
+    def __init__(self, max_attempts=3, base_delay=30, max_delay=600, jitter=0.5):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+
+    def delay(self, attempt):
+        """Seconds to wait after failed attempt number `attempt` (1-based)"""
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        # Spread retries out so failures from one burst don't come back as another burst
+        return min(self.max_delay, delay * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+    def should_retry(self, attempt, kind):
+        return kind is not None and attempt < self.max_attempts
+
+    @classmethod
+    def from_settings(cls, base_delay=None):
+        from config import settings
+
+        return cls(
+            max_attempts=settings.RETRY_MAX_ATTEMPTS,
+            base_delay=settings.RETRY_BASE_DELAY if base_delay is None else base_delay,
+            max_delay=settings.RETRY_MAX_DELAY
+        )
+
+
+class RetryQueue:
+    """Failed jobs waiting out their backoff, earliest due first"""
+
+    def __init__(self):
+        self.heap = []
+        self.counter = itertools.count()
+
+    def push(self, item, delay):
+        heapq.heappush(self.heap, (time.monotonic() + delay, next(self.counter), item))
+
+    def pop_ready(self):
+        """A job whose backoff has passed, or None"""
+        if self.heap and self.heap[0][0] <= time.monotonic():
+            return heapq.heappop(self.heap)[2]
+        return None
+
+    def seconds_until_next(self):
+        return max(0.0, self.heap[0][0] - time.monotonic()) if self.heap else None
+
+    def __len__(self):
+        return len(self.heap)
+
+
+class DomainBreakers:
+    """Per-domain circuit breakers against a site that is currently walling us.
+
+    `threshold` consecutive blocks or timeouts open a domain's breaker: its
+    jobs are shed for `cooldown` seconds. After that one probe request is
+    let through (half-open); success closes the breaker, failure opens it
+    again with the cooldown doubled, up to `max_cooldown`. Other failures
+    (missing price, network errors) neither trip nor reset it.
+    """
+
+    CLOSED, HALF_OPEN, OPEN = 'closed', 'half_open', 'open'
+    STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+    TRIPPING = ('blocked', 'timeout')
+
+    def __init__(self, threshold=3, cooldown=300, max_cooldown=3600, probes=1):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.probes = probes
+        self.domains = {}
+        self.lock = threading.Lock()
+
+    def _breaker(self, domain):
+        breaker = self.domains.get(domain)
+        if breaker is None:
+            breaker = self.domains[domain] = {'state': self.CLOSED, 'failures': 0, 'opened_at': 0.0,
+                                              'cooldown': self.cooldown, 'probing': 0}
+        return breaker
+
+    def _set_state(self, domain, breaker, state):
+        if breaker['state'] == state:
+            return
+        breaker['state'] = state
+        metrics.gauge('breaker_state', self.STATE_VALUES[state], domain=domain)
+        metrics.incr('breaker_transitions', domain=domain, state=state)
+        if state == self.OPEN:
+            print(f"🔌 Circuit open for {domain}: shedding its jobs for {breaker['cooldown']:.0f}s")
+        elif state == self.HALF_OPEN:
+            print(f"🔌 Circuit half-open for {domain}: sending a probe")
+        else:
+            print(f"🔌 Circuit closed for {domain}")
+
+    def allow(self, domain):
+        """0 if a request to domain may go now, else seconds until it might"""
+        with self.lock:
+            breaker = self._breaker(domain)
+            if breaker['state'] == self.OPEN:
+                remaining = breaker['opened_at'] + breaker['cooldown'] - time.monotonic()
+                if remaining > 0:
+                    metrics.incr('breaker_shed', domain=domain)
+                    return remaining
+                self._set_state(domain, breaker, self.HALF_OPEN)
+            if breaker['state'] == self.HALF_OPEN:
+                if breaker['probing'] >= self.probes:
+                    metrics.incr('breaker_shed', domain=domain)
+                    return 1.0
+                breaker['probing'] += 1
+            return 0.0
+
+    def record(self, domain, kind):
+        """Feed back a request's outcome: kind from failure_kind() (None = success)"""
+        with self.lock:
+            breaker = self._breaker(domain)
+            probe = breaker['state'] == self.HALF_OPEN
+            if probe:
+                breaker['probing'] = max(0, breaker['probing'] - 1)
+            if kind is None:
+                breaker['failures'] = 0
+                breaker['cooldown'] = self.cooldown
+                self._set_state(domain, breaker, self.CLOSED)
+            elif kind in self.TRIPPING:
+                breaker['failures'] += 1
+                if probe or breaker['failures'] >= self.threshold:
+                    if probe:
+                        breaker['cooldown'] = min(self.max_cooldown, breaker['cooldown'] * 2)
+                    breaker['opened_at'] = time.monotonic()
+                    self._set_state(domain, breaker, self.OPEN)
+            # Any other failure is inconclusive: state unchanged, the next request probes
+
+    def state(self, domain):
+        with self.lock:
+            return self._breaker(domain)['state']
+
+    def snapshot(self):
+        """{domain: (state, consecutive failures)}"""
+        with self.lock:
+            return {domain: (breaker['state'], breaker['failures']) for domain, breaker in self.domains.items()}
+
+    @classmethod
+    def from_settings(cls):
+        from config import settings
+
+        return cls(
+            threshold=settings.BREAKER_THRESHOLD,
+            cooldown=settings.BREAKER_COOLDOWN,
+            max_cooldown=settings.BREAKER_MAX_COOLDOWN
+        )
+
+
+class PollSchedule:
+    """Persistent priority queue of products ordered by when they are next due.
+
+    State lives in SQLite so a restarted daemon picks up where it stopped;
+    a heap of (next_due, product_id) is kept in memory for cheap peeks.
+    Jobs are keyed by canonical product id like the store and the job
+    queue, so a catalog URL change keeps the product's polling history.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS schedule (
+            product_id TEXT PRIMARY KEY,
+            url TEXT NOT NULL,
+            name TEXT NOT NULL,
+            site TEXT NOT NULL,
+            target_price REAL,
+            next_due REAL NOT NULL,
+            interval REAL NOT NULL,
+            volatility REAL NOT NULL DEFAULT 0,
+            last_price REAL,
+            failures INTEGER NOT NULL DEFAULT 0
+        );
+    """
+
+    COLUMNS = ['product_id', 'url', 'name', 'site', 'target_price', 'next_due', 'interval',
+               'volatility', 'last_price', 'failures']
+
+    def __init__(self, path, min_interval=900, max_interval=86400, default_interval=3600,
+                 target_proximity=0.1):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.default_interval = default_interval
+        self.target_proximity = target_proximity
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        legacy = self._upgrade_schema()
+        self.conn.executescript(self.SCHEMA)
+        self.jobs = {}
+        self.heap = []
+        for row in self.conn.execute(f"SELECT {', '.join(self.COLUMNS)} FROM schedule"):
+            job = dict(zip(self.COLUMNS, row))
+            self.jobs[job['product_id']] = job
+            heapq.heappush(self.heap, (job['next_due'], job['product_id']))
+        if legacy:
+            self._move_legacy(legacy)
+
+    def _upgrade_schema(self):
+        """Schedules keyed by URL: read the old jobs out to be re-keyed by product id"""
+        columns = [row[1] for row in self.conn.execute('PRAGMA table_info(schedule)')]
+        if not columns or 'product_id' in columns:
+            return None
+        legacy = [dict(zip(columns, row)) for row in self.conn.execute('SELECT * FROM schedule')]
+        with self.conn:
+            self.conn.execute('ALTER TABLE schedule RENAME TO schedule_legacy')
+        return legacy
+
+    def _move_legacy(self, jobs):
+        from utils.urls import parse_product_url
+
+        with self.conn:
+            # URL variants of one product collapse into the job that is due first
+            for job in sorted(jobs, key=lambda job: job['next_due']):
+                _, key, url = parse_product_url(job['url'])
+                if key in self.jobs:
+                    continue
+                job.update(product_id=key, url=url)
+                self.jobs[key] = job
+                heapq.heappush(self.heap, (job['next_due'], key))
+                self._save(job)
+            self.conn.execute('DROP TABLE schedule_legacy')
+
+    def sync_products(self, products):
+        """Add new products (due now) and drop ones no longer tracked"""
+        now = time.time()
+        wanted = {product['id']: product for product in products}
+        with self.conn:
+            for key in set(self.jobs) - set(wanted):
+                del self.jobs[key]
+                self.conn.execute('DELETE FROM schedule WHERE product_id = ?', (key,))
+            for key, product in wanted.items():
+                job = self.jobs.get(key)
+                if job is None:
+                    job = {'product_id': key, 'next_due': now, 'interval': self.default_interval,
+                           'volatility': 0.0, 'last_price': None, 'failures': 0}
+                    self.jobs[key] = job
+                    heapq.heappush(self.heap, (now, key))
+                job.update(url=product['url'], name=product['name'], site=product['site'],
+                           target_price=product.get('target_price'))
+                self._save(job)
+        return len(self.jobs)
+
+    def _save(self, job):
+        self.conn.execute(
+            """INSERT OR REPLACE INTO schedule
+               (product_id, url, name, site, target_price, next_due, interval, volatility, last_price,
+                failures)
+               VALUES (:product_id, :url, :name, :site, :target_price, :next_due, :interval, :volatility,
+                       :last_price, :failures)""",
+            job
+        )
+
+    def seconds_until_next(self):
+        """Seconds until the earliest job is due (None if empty)"""
+        while self.heap:
+            due, key = self.heap[0]
+            job = self.jobs.get(key)
+            if job is None or job['next_due'] != due:
+                heapq.heappop(self.heap)  # stale entry
+                continue
+            return max(0.0, due - time.time())
+        return None
+
+    def pop_due(self, limit=None):
+        """Remove and return jobs that are due now, earliest first"""
+        now = time.time()
+        due_jobs = []
+        while self.heap and (limit is None or len(due_jobs) < limit):
+            due, key = self.heap[0]
+            job = self.jobs.get(key)
+            if job is None or job['next_due'] != due:
+                heapq.heappop(self.heap)
+                continue
+            if due > now:
+                break
+            heapq.heappop(self.heap)
+            due_jobs.append(job)
+        return due_jobs
+
+    def defer(self, job, delay):
+        """Push a job back by `delay` seconds without counting a poll (its site is shed)"""
+        job['next_due'] = time.time() + delay
+        if job['product_id'] in self.jobs:
+            heapq.heappush(self.heap, (job['next_due'], job['product_id']))
+            with self.conn:
+                self._save(job)
+
+    def next_interval(self, job, price):
+        """Adapt the polling interval to volatility and distance from target"""
+        interval = job['interval']
+        last = job['last_price']
+        if price is None:
+            # Failed fetch: back off, but never past the max
+            return min(self.max_interval, interval * 2)
+
+        change = abs(price - last) / last if last else 0.0
+        job['volatility'] = 0.7 * job['volatility'] + 0.3 * change
+        if change > 0:
+            interval /= 2           # price moved: look again sooner
+        elif job['volatility'] < 0.01:
+            interval *= 1.5         # stable: back off
+
+        target = job.get('target_price')
+        if target and price <= target * (1 + self.target_proximity):
+            # Close to (or under) target: keep a close eye on it
+            interval = min(interval, self.min_interval * 2)
+
+        return max(self.min_interval, min(self.max_interval, interval))
+
+    def reschedule(self, job, price):
+        """Record a poll result and push the job back with its new interval"""
+        job['interval'] = self.next_interval(job, price)
+        if price is None:
+            job['failures'] += 1
+        else:
+            job['failures'] = 0
+            job['last_price'] = price
+        job['next_due'] = time.time() + job['interval']
+        if job['product_id'] in self.jobs:
+            heapq.heappush(self.heap, (job['next_due'], job['product_id']))
+            with self.conn:
+                self._save(job)
+        return job['interval']
+
+    def close(self):
+        self.conn.close()
+
+    @classmethod
+    def from_settings(cls):
+        from config import settings
+
+        return cls(
+            settings.SCHEDULE_FILE,
+            min_interval=settings.MIN_POLL_INTERVAL,
+            max_interval=settings.MAX_POLL_INTERVAL,
+            default_interval=settings.DEFAULT_POLL_INTERVAL,
+            target_proximity=settings.TARGET_PROXIMITY
+        )
+
+
+class PollingDaemon:
+    """Long-running loop: poll due products through the async engine within domain limits"""
+
+    def __init__(self, engine, schedule, limiter, on_result=None, max_in_flight=8, breakers=None):
+        self.engine = engine
+        self.schedule = schedule
+        self.limiter = limiter
+        self.breakers = breakers
+        self.on_result = on_result
+        self.max_in_flight = max_in_flight
+        self.in_flight = set()
+        self.stopped = False
+
+    async def _poll(self, browser, job):
+        product = {'id': job['product_id'], 'name': job['name'], 'url': job['url'], 'site': job['site'],
+                   'target_price': job['target_price']}
+        domain = domain_of(job['url'])
+        if self.breakers:
+            wait = self.breakers.allow(domain)
+            if wait:
+                self.schedule.defer(job, wait)
+                return
+        await self.limiter.acquire_async(domain)
+        try:
+            result = await self.engine.fetch(browser, product)
+        except Exception as e:
+            result = {'success': False, 'error': str(e)}
+        finally:
+            self.limiter.release(domain)
+        if self.breakers:
+            self.breakers.record(domain, failure_kind(result))
+
+        price = result.get('price') if result.get('success') else None
+        try:
+            if self.on_result:
+                self.on_result(product, result)
+        finally:
+            # Always requeue, even if saving the result failed
+            interval = self.schedule.reschedule(job, price)
+            print(f"⏱️ Next check of {job['name']} in {interval / 60:.0f} min")
+
+    async def run(self):
+        """Poll until stop() is called"""
+        from playwright.async_api import async_playwright
+
+        async with async_playwright() as playwright:
+            browser = await self.engine.launch(playwright)
+            try:
+                while not self.stopped:
+                    free = self.max_in_flight - len(self.in_flight)
+                    for job in self.schedule.pop_due(limit=free) if free > 0 else []:
+                        task = asyncio.create_task(self._poll(browser, job))
+                        self.in_flight.add(task)
+                        task.add_done_callback(self.in_flight.discard)
+
+                    wait = self.schedule.seconds_until_next()
+                    await asyncio.sleep(max(0.1, min(wait if wait is not None else 5.0, 5.0)))
+            finally:
+                if self.in_flight:
+                    await asyncio.gather(*self.in_flight, return_exceptions=True)
+                await self.engine.close(browser)
+
+    def stop(self):
+        self.stopped = True
@@ -0,0 +1,168 @@
+# utils/session_store.py
+import json
+import os
+import re
+import threading
+import time
+
+from utils.metrics import metrics
+
+
+class SessionStore:
+    """Per-site browser sessions (cookies + localStorage) kept on disk between runs.
+
+    Each site has a few session slots so requests are spread over several
+    returning visitors instead of one. checkout() hands out the least
+    recently used slot with its Playwright storage_state and the context
+    options it was created with (same viewport and user agent as last
+    time); save() writes the context's state back. A slot is rotated out
+    (started fresh) once it is older than `max_age` or used `max_uses`
+    times, and invalidate() drops it as soon as a page behind it is blocked.
+    """
+
+    def __init__(self, directory, slots=3, max_age=12 * 3600, max_uses=200):
+        self.directory = directory
+        self.slots = max(1, slots)
+        self.max_age = max_age
+        self.max_uses = max_uses
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls):
+        """Store configured in settings, or None when sessions aren't kept"""
+        from config import settings
+
+        if not getattr(settings, 'SESSIONS_ENABLED', False):
+            return None
+        return cls(
+            settings.SESSION_DIR,
+            slots=settings.SESSION_SLOTS,
+            max_age=settings.SESSION_MAX_AGE,
+            max_uses=settings.SESSION_MAX_USES
+        )
+
+    @staticmethod
+    def _slug(site):
+        return re.sub(r'[^a-z0-9]+', '-', (site or 'default').lower())
+
+    def _path(self, site, slot):
+        return os.path.join(self.directory, f"{self._slug(site)}-{slot}.json")
+
+    def _load(self, site, slot):
+        path = self._path(site, slot)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, site, slot, entry):
+        path = self._path(site, slot)
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+
+    def _remove(self, site, slot):
+        try:
+            os.remove(self._path(site, slot))
+        except FileNotFoundError:
+            pass
+
+    def _expired(self, entry, now):
+        return now - entry['created'] > self.max_age or entry['uses'] >= self.max_uses
+
+    def checkout(self, site):
+        """Session for a new context: {'site', 'slot', 'state', 'options'} (state None = fresh visitor)"""
+        now = time.time()
+        with self.lock:
+            candidates = []
+            for slot in range(self.slots):
+                entry = self._load(site, slot)
+                if entry is not None and self._expired(entry, now):
+                    self._remove(site, slot)
+                    metrics.incr('sessions', site=site, outcome='rotated')
+                    entry = None
+                candidates.append((entry['last_used'] if entry else 0.0, slot, entry))
+            _, slot, entry = min(candidates, key=lambda candidate: candidate[:2])
+
+            if entry is None:
+                entry = {'created': now, 'uses': 0, 'options': None, 'state': None}
+                metrics.incr('sessions', site=site, outcome='fresh')
+            else:
+                metrics.incr('sessions', site=site, outcome='reused')
+            entry['uses'] += 1
+            entry['last_used'] = now
+            self._write(site, slot, entry)
+        return {'site': site, 'slot': slot, 'state': entry['state'], 'options': entry['options'],
+                'created': entry['created'], 'uses': entry['uses']}
+
+    def save(self, session, state, options=None):
+        """Keep a context's storage_state (and the options it ran with) for the next checkout"""
+        with self.lock:
+            current = self._load(session['site'], session['slot']) or {}
+            if current.get('created', session['created']) != session['created']:
+                return  # the slot was rotated or dropped while this context ran
+            entry = {
+                'created': session['created'],
+                'uses': max(session['uses'], current.get('uses', 0)),
+                'last_used': time.time(),
+                'options': options or session['options'],
+                'state': state,
+            }
+            self._write(session['site'], session['slot'], entry)
+
+    def invalidate(self, session):
+        """Forget a session whose page was blocked - the next checkout starts fresh"""
+        with self.lock:
+            self._remove(session['site'], session['slot'])
+        metrics.incr('sessions', site=session['site'], outcome='invalidated')
+        print(f"🍪 Dropped {session['site']} session {session['slot']} after a block")
+
+    def clear(self, site=None):
+        """Delete stored sessions (all sites, or one); returns how many"""
+        prefix = f"{self._slug(site)}-" if site else ''
+        removed = 0
+        if not os.path.isdir(self.directory):
+            return removed
+        for name in os.listdir(self.directory):
+            if name.endswith('.json') and name.startswith(prefix):
+                os.remove(os.path.join(self.directory, name))
+                removed += 1
+        return removed
+
+    def summary(self, sites):
+        """[(site, slot, age_s, uses, cookies)] for stored sessions"""
+        now = time.time()
+        rows = []
+        for site in sites:
+            for slot in range(self.slots):
+                entry = self._load(site, slot)
+                if entry and entry.get('state'):
+                    rows.append((site, slot, now - entry['created'], entry['uses'],
+                                 len(entry['state'].get('cookies', []))))
+        return rows
+
+
+# Context options pinned per session so a returning visitor keeps its fingerprint
+PINNED_OPTIONS = ('viewport', 'user_agent', 'locale', 'timezone_id')
+
+
+def session_options(session, options):
+    """Apply a session's pinned options and saved state to new-context options"""
+    if session is None:
+        return options
+    options = dict(options)
+    if session['options']:
+        options.update(session['options'])
+    if session['state']:
+        options['storage_state'] = session['state']
+    return options
+
+
+def pinned_options(options):
+    """The part of a context's options a session keeps between runs"""
+    return {key: options[key] for key in PINNED_OPTIONS if key in options}
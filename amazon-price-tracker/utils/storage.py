@@ -0,0 +1,699 @@
+# utils/storage.py
+import csv
+import os
+import sqlite3
+from abc import ABC, abstractmethod
+
+from utils.metrics import metrics
+from utils.urls import canonical_id
+
+COLUMNS = ['timestamp', 'product_name', 'price', 'url', 'target_price', 'site']
+QUARANTINE_COLUMNS = COLUMNS + ['product_id', 'reason', 'z', 'suggested_price', 'quarantined_at']
+
+
+def infer_site(url):
+    """Site name from a product URL, for old rows saved without one"""
+    url = (url or '').lower()
+    if 'amazon.' in url:
+        return 'Amazon'
+    if 'walmart.' in url:
+        return 'Walmart'
+    return None
+
+
+def _to_float(value):
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def product_id(record):
+    """Key a row's product is tracked under: its canonical id, or site:name for rows without a URL"""
+    if record.get('url'):
+        return canonical_id(record['url'])
+    return f"{record.get('site') or ''}:{record.get('product_name')}"
+
+
+def normalize_record(record):
+    """Typed row with every column present"""
+    return {
+        'timestamp': str(record.get('timestamp') or ''),
+        'product_name': record.get('product_name'),
+        'price': _to_float(record.get('price')),
+        'url': record.get('url'),
+        'target_price': _to_float(record.get('target_price')),
+        'site': record.get('site') or infer_site(record.get('url')),
+    }
+
+
+class LatestPriceIndex:
+    """In-memory latest/previous/min/max per product id, updated as rows are written"""
+
+    def __init__(self):
+        self.entries = {}
+
+    def update(self, record):
+        if record['price'] is None:
+            return
+        key = product_id(record)
+        entry = self.entries.get(key)
+        if entry is None:
+            self.entries[key] = {
+                'product_id': key,
+                'product_name': record['product_name'],
+                'site': record['site'] or '',
+                'last_price': record['price'],
+                'previous_price': None,
+                'min_price': record['price'],
+                'max_price': record['price'],
+                'last_seen': record['timestamp'],
+                'samples': 1,
+            }
+            return
+        if record['timestamp'] >= entry['last_seen']:
+            entry['product_name'] = record['product_name']
+            entry['site'] = record['site'] or ''
+            entry['previous_price'] = entry['last_price']
+            entry['last_price'] = record['price']
+            entry['last_seen'] = record['timestamp']
+        entry['min_price'] = min(entry['min_price'], record['price'])
+        entry['max_price'] = max(entry['max_price'], record['price'])
+        entry['samples'] += 1
+
+    def get(self, product_id):
+        return self.entries.get(product_id)
+
+    def all(self):
+        return sorted(self.entries.values(), key=lambda e: (e['site'], e['product_name']))
+
+
+class PriceStore(ABC):
+    """Append-only price history with batched writes.
+
+    With a validator, each batch is screened before it is written: suspect
+    rows go to quarantine instead of the history. on_write(records) is
+    called with the rows that were written (main hangs alerts off it, so
+    quarantined prices never alert).
+    """
+
+    def __init__(self, batch_size=50, validator=None):
+        self.batch_size = max(1, batch_size)
+        self.pending = []
+        self.validator = validator
+        self.on_write = None
+
+    def add(self, record):
+        """Queue a record, writing the batch once it is full"""
+        self.pending.append(normalize_record(record))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Write queued records (quarantining suspect ones); returns how many were written"""
+        if not self.pending:
+            return 0
+        records = self.pending
+        if self.validator is not None:
+            records, quarantined = self.validator.split(records, self.recent_prices)
+            if quarantined:
+                self._quarantine(quarantined)
+                for record in quarantined:
+                    price = f" at ${record['price']:.2f}" if record['price'] is not None else ''
+                    print(f"🧪 Quarantined {record['product_name']}{price} ({record['reason']})")
+        if records:
+            with metrics.span('persist', backend=self.__class__.__name__):
+                self._write(records)
+            metrics.incr('records_written', len(records))
+        self.pending = []
+        if self.on_write and records:
+            self.on_write(records)
+        return len(records)
+
+    @abstractmethod
+    def _write(self, records):
+        """Append validated records to the history"""
+
+    @abstractmethod
+    def _quarantine(self, records):
+        """Keep rows the validator rejected, with its reason, for review"""
+
+    @abstractmethod
+    def quarantined(self, limit=50):
+        """Most recently quarantined rows"""
+
+    @abstractmethod
+    def recent_prices(self, product_ids, limit):
+        """{product_id: [(price, target_price)]} - the last `limit` stored prices of each product"""
+
+    @abstractmethod
+    def read_history(self):
+        """Full history as a DataFrame"""
+
+    @abstractmethod
+    def iter_history(self, chunksize=250000, columns=None):
+        """History as DataFrame chunks of at most chunksize rows, in no particular order"""
+
+    @abstractmethod
+    def count(self):
+        """Number of stored observations"""
+
+    @abstractmethod
+    def latest(self, product_id):
+        """Last, previous, min and max price for one product id (O(1) lookup)"""
+
+    @abstractmethod
+    def latest_prices(self):
+        """Index entries for every product"""
+
+    @abstractmethod
+    def rebuild_latest_index(self):
+        """Regenerate the latest-price index from the full history"""
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CsvStore(PriceStore):
+    """Appends rows to the CSV instead of rewriting it"""
+
+    def __init__(self, path, batch_size=50, validator=None):
+        super().__init__(batch_size, validator)
+        self.path = path
+        self.quarantine_path = os.path.splitext(path)[0] + '.quarantine.csv'
+        self.index = None
+        self.recent = None
+        self._upgrade_header()
+
+    def _upgrade_header(self):
+        """One-time rewrite of files saved before every column existed (e.g. no 'site')"""
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return
+        with open(self.path, newline='', encoding='utf-8') as f:
+            header = next(csv.reader(f), [])
+        if header == COLUMNS:
+            return
+
+        print(f"🔧 Upgrading {self.path} to columns: {', '.join(COLUMNS)}")
+        tmp_path = self.path + '.tmp'
+        with open(self.path, newline='', encoding='utf-8') as src, \
+                open(tmp_path, 'w', newline='', encoding='utf-8') as dst:
+            writer = csv.DictWriter(dst, fieldnames=COLUMNS)
+            writer.writeheader()
+            for row in csv.DictReader(src):
+                writer.writerow(normalize_record(row))
+        os.replace(tmp_path, self.path)
+
+    def _write(self, records):
+        new_file = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'a', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=COLUMNS)
+            if new_file:
+                writer.writeheader()
+            writer.writerows(records)
+            f.flush()
+            os.fsync(f.fileno())
+        if self.index is not None:
+            for record in records:
+                self.index.update(record)
+
+    def _quarantine(self, records):
+        from datetime import datetime
+
+        new_file = not os.path.exists(self.quarantine_path)
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with open(self.quarantine_path, 'a', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=QUARANTINE_COLUMNS, extrasaction='ignore')
+            if new_file:
+                writer.writeheader()
+            writer.writerows({**record, 'quarantined_at': now} for record in records)
+
+    def quarantined(self, limit=50):
+        if not os.path.exists(self.quarantine_path):
+            return []
+        with open(self.quarantine_path, newline='', encoding='utf-8') as f:
+            return list(csv.DictReader(f))[-limit:][::-1]
+
+    def recent_prices(self, product_ids, limit):
+        # One pass over the file, kept for the rest of the run (the validator tracks new rows itself)
+        if self.recent is None:
+            from collections import deque
+
+            self.recent = {}
+            if os.path.exists(self.path):
+                with open(self.path, newline='', encoding='utf-8') as f:
+                    for row in csv.DictReader(f):
+                        record = normalize_record(row)
+                        if record['price'] is not None:
+                            self.recent.setdefault(product_id(record), deque(maxlen=limit)).append(
+                                (record['price'], record['target_price']))
+        return {key: list(self.recent[key]) for key in product_ids if key in self.recent}
+
+    def read_history(self):
+        import pandas as pd
+
+        self.flush()
+        if os.path.exists(self.path):
+            return pd.read_csv(self.path)
+        return pd.DataFrame(columns=COLUMNS)
+
+    def iter_history(self, chunksize=250000, columns=None):
+        import pandas as pd
+
+        self.flush()
+        if os.path.exists(self.path):
+            yield from pd.read_csv(self.path, chunksize=chunksize, usecols=columns)
+
+    def count(self):
+        self.flush()
+        if not os.path.exists(self.path):
+            return 0
+        with open(self.path, newline='', encoding='utf-8') as f:
+            return max(0, sum(1 for _ in csv.reader(f)) - 1)
+
+    def _latest_index(self):
+        # A CSV has nowhere to keep the index, so it is built on first use
+        if self.index is None:
+            self.rebuild_latest_index()
+        return self.index
+
+    def latest(self, product_id):
+        self.flush()
+        return self._latest_index().get(product_id)
+
+    def latest_prices(self):
+        self.flush()
+        return self._latest_index().all()
+
+    def rebuild_latest_index(self):
+        self.flush()
+        index = LatestPriceIndex()
+        if os.path.exists(self.path):
+            with open(self.path, newline='', encoding='utf-8') as f:
+                for row in csv.DictReader(f):
+                    index.update(normalize_record(row))
+        self.index = index
+        return len(index.entries)
+
+
+class SQLiteStore(PriceStore):
+    """SQLite history in WAL mode - each batch is one transaction"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS prices (
+            id INTEGER PRIMARY KEY,
+            timestamp TEXT NOT NULL,
+            product_name TEXT NOT NULL,
+            site TEXT,
+            price REAL,
+            target_price REAL,
+            url TEXT,
+            product_id TEXT
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS prices_timestamp_url ON prices (timestamp, url);
+        CREATE INDEX IF NOT EXISTS prices_product ON prices (product_name, site, timestamp);
+        CREATE INDEX IF NOT EXISTS prices_product_id ON prices (product_id, timestamp);
+
+        CREATE TABLE IF NOT EXISTS latest_prices (
+            product_id TEXT PRIMARY KEY,
+            product_name TEXT NOT NULL,
+            site TEXT NOT NULL DEFAULT '',
+            last_price REAL NOT NULL,
+            previous_price REAL,
+            min_price REAL NOT NULL,
+            max_price REAL NOT NULL,
+            last_seen TEXT NOT NULL,
+            samples INTEGER NOT NULL
+        );
+
+        -- Runs of unchanged price that utils.history compacted out of `prices`
+        CREATE TABLE IF NOT EXISTS price_intervals (
+            month TEXT NOT NULL,
+            product_id TEXT NOT NULL,
+            product_name TEXT NOT NULL,
+            site TEXT NOT NULL DEFAULT '',
+            url TEXT,
+            target_price REAL,
+            price REAL NOT NULL,
+            start_ts TEXT NOT NULL,
+            end_ts TEXT NOT NULL,
+            samples INTEGER NOT NULL,
+            PRIMARY KEY (month, product_id, start_ts)
+        );
+        CREATE INDEX IF NOT EXISTS price_intervals_product ON price_intervals (product_id, start_ts);
+
+        -- Every observation, raw or compacted; an interval counts as its first sample
+        -- plus the rest at its end
+        CREATE VIEW IF NOT EXISTS price_points AS
+            SELECT id, timestamp, product_name, site, price, target_price, url, product_id, 1 AS samples
+            FROM prices
+            UNION ALL
+            SELECT NULL, start_ts, product_name, site, price, target_price, url, product_id, 1
+            FROM price_intervals
+            UNION ALL
+            SELECT NULL, end_ts, product_name, site, price, target_price, url, product_id, samples - 1
+            FROM price_intervals WHERE samples > 1;
+
+        -- Prices the validator held back, for review
+        CREATE TABLE IF NOT EXISTS quarantine (
+            id INTEGER PRIMARY KEY,
+            timestamp TEXT NOT NULL,
+            product_name TEXT NOT NULL,
+            site TEXT,
+            price REAL,
+            target_price REAL,
+            url TEXT,
+            product_id TEXT,
+            reason TEXT NOT NULL,
+            z REAL,
+            suggested_price REAL,
+            quarantined_at TEXT NOT NULL
+        );
+
+        -- Keeps latest_prices current inside the same transaction as every insert
+        CREATE TRIGGER IF NOT EXISTS prices_update_latest
+        AFTER INSERT ON prices WHEN NEW.price IS NOT NULL
+        BEGIN
+            INSERT INTO latest_prices
+                (product_id, product_name, site, last_price, previous_price, min_price, max_price,
+                 last_seen, samples)
+            VALUES
+                (NEW.product_id, NEW.product_name, COALESCE(NEW.site, ''), NEW.price, NULL, NEW.price,
+                 NEW.price, NEW.timestamp, 1)
+            ON CONFLICT (product_id) DO UPDATE SET
+                product_name = CASE WHEN excluded.last_seen >= last_seen THEN excluded.product_name
+                                    ELSE product_name END,
+                site = CASE WHEN excluded.last_seen >= last_seen THEN excluded.site ELSE site END,
+                previous_price = CASE WHEN excluded.last_seen >= last_seen THEN last_price ELSE previous_price END,
+                last_price = CASE WHEN excluded.last_seen >= last_seen THEN excluded.last_price ELSE last_price END,
+                last_seen = MAX(last_seen, excluded.last_seen),
+                min_price = MIN(min_price, excluded.min_price),
+                max_price = MAX(max_price, excluded.max_price),
+                samples = samples + 1;
+        END;
+    """
+
+    LATEST_COLUMNS = [
+        'product_id', 'product_name', 'site', 'last_price', 'previous_price',
+        'min_price', 'max_price', 'last_seen', 'samples'
+    ]
+
+    def __init__(self, path, batch_size=50, validator=None):
+        super().__init__(batch_size, validator)
+        self.path = path
+        self.created = not os.path.exists(path)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # Worker processes share the file; wait on each other's write locks
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        needs_ids = self._upgrade_schema()
+        legacy_intervals = self._upgrade_intervals()
+        self.conn.executescript(self.SCHEMA)
+        if needs_ids:
+            self._fill_product_ids()
+        if legacy_intervals:
+            self._move_legacy_intervals()
+        # Databases created before the index existed get it filled in once
+        if (self.conn.execute('SELECT 1 FROM latest_prices LIMIT 1').fetchone() is None
+                and self.conn.execute('SELECT 1 FROM price_points LIMIT 1').fetchone() is not None):
+            self.rebuild_latest_index()
+
+    def _upgrade_schema(self):
+        """Databases from before product ids: add the column, re-key latest_prices (rebuilt after)"""
+        columns = [row[1] for row in self.conn.execute('PRAGMA table_info(prices)')]
+        if not columns or 'product_id' in columns:
+            return False
+        print(f"🔧 Upgrading {self.path}: keying prices by product id")
+        with self.conn:
+            self.conn.execute('ALTER TABLE prices ADD COLUMN product_id TEXT')
+            self.conn.execute('DROP TRIGGER IF EXISTS prices_update_latest')
+            self.conn.execute('DROP TABLE IF EXISTS latest_prices')
+        return True
+
+    def _upgrade_intervals(self):
+        """Compacted history keyed by name and site: set it aside to be re-keyed (after the schema)"""
+        columns = [row[1] for row in self.conn.execute('PRAGMA table_info(price_intervals)')]
+        if not columns or 'product_id' in columns:
+            return False
+        print(f"🔧 Upgrading {self.path}: keying compacted history by product id")
+        with self.conn:
+            self.conn.execute('DROP VIEW IF EXISTS price_points')
+            self.conn.execute('ALTER TABLE price_intervals RENAME TO price_intervals_legacy')
+        return True
+
+    def _move_legacy_intervals(self):
+        ids = self.product_ids_by_name()
+        rows = self.conn.execute(
+            'SELECT month, product_name, site, url, target_price, price, start_ts, end_ts, samples '
+            'FROM price_intervals_legacy'
+        ).fetchall()
+        with self.conn:
+            # Variants of one product may now share a key; their runs are folded together
+            self.conn.executemany(
+                """INSERT INTO price_intervals
+                   (month, product_id, product_name, site, url, target_price, price, start_ts, end_ts,
+                    samples)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (month, product_id, start_ts) DO UPDATE SET
+                       end_ts = MAX(end_ts, excluded.end_ts),
+                       samples = samples + excluded.samples""",
+                [(month, ids.get((name, site or ''),
+                                  product_id({'url': url, 'site': site, 'product_name': name})),
+                  name, site or '', url, target_price, price, start_ts, end_ts, samples)
+                 for month, name, site, url, target_price, price, start_ts, end_ts, samples in rows]
+            )
+            self.conn.execute('DROP TABLE price_intervals_legacy')
+
+    def product_ids_by_name(self):
+        """{(product_name, site): product_id} for rows stored before history was keyed by product id"""
+        ids = {}
+        for name, site, url in self.conn.execute(
+                'SELECT product_name, COALESCE(site, \'\'), MAX(url) FROM prices WHERE url IS NOT NULL '
+                'GROUP BY product_name, site'):
+            ids[(name, site)] = product_id({'url': url})
+        for key, name, site in self.conn.execute('SELECT product_id, product_name, site FROM latest_prices'):
+            ids.setdefault((name, site), key)
+        return ids
+
+    def _fill_product_ids(self):
+        rows = self.conn.execute(
+            'SELECT id, url, site, product_name FROM prices WHERE product_id IS NULL'
+        ).fetchall()
+        with self.conn:
+            self.conn.executemany(
+                'UPDATE prices SET product_id = ? WHERE id = ?',
+                [(product_id({'url': url, 'site': site, 'product_name': name}), row_id)
+                 for row_id, url, site, name in rows]
+            )
+
+    def _write(self, records):
+        with self.conn:
+            self.conn.executemany(
+                """INSERT OR IGNORE INTO prices
+                   (timestamp, product_name, site, price, target_price, url, product_id)
+                   VALUES (:timestamp, :product_name, :site, :price, :target_price, :url, :product_id)""",
+                [{**record, 'product_id': product_id(record)} for record in records]
+            )
+
+    def _quarantine(self, records):
+        from datetime import datetime
+
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with self.conn:
+            self.conn.executemany(
+                """INSERT INTO quarantine
+                   (timestamp, product_name, site, price, target_price, url, product_id, reason, z,
+                    suggested_price, quarantined_at)
+                   VALUES (:timestamp, :product_name, :site, :price, :target_price, :url, :product_id,
+                           :reason, :z, :suggested_price, :quarantined_at)""",
+                [{**record, 'quarantined_at': now} for record in records]
+            )
+
+    def quarantined(self, limit=50):
+        columns = QUARANTINE_COLUMNS
+        rows = self.conn.execute(
+            f"SELECT {', '.join(columns)} FROM quarantine ORDER BY id DESC LIMIT ?", (limit,)
+        )
+        return [dict(zip(columns, row)) for row in rows]
+
+    def recent_prices(self, product_ids, limit):
+        recent = {}
+        product_ids = list(product_ids)
+        # Stay under SQLite's bound-variable limit
+        for start in range(0, len(product_ids), 500):
+            chunk = product_ids[start:start + 500]
+            rows = self.conn.execute(
+                f"""SELECT product_id, price, target_price FROM (
+                        SELECT product_id, price, target_price,
+                               ROW_NUMBER() OVER (PARTITION BY product_id ORDER BY timestamp DESC, id DESC) AS rn
+                        FROM price_points
+                        WHERE price IS NOT NULL AND product_id IN ({', '.join('?' * len(chunk))})
+                    ) WHERE rn <= ?""",
+                [*chunk, limit]
+            )
+            for key, price, target_price in rows:
+                recent.setdefault(key, []).append((price, target_price))
+        return recent
+
+    def import_csv(self, csv_path):
+        """Migrate an existing price_history.csv; safe to run more than once.
+        Rows the validator rejects go to quarantine, as new prices would."""
+        self.flush()
+        before = self.count()
+        held = blank = 0
+        with open(csv_path, newline='', encoding='utf-8') as f:
+            batch = []
+            for row in csv.DictReader(f):
+                batch.append(normalize_record(row))
+                if len(batch) >= 1000:
+                    batch_held, batch_blank = self._import_batch(batch)
+                    held, blank = held + batch_held, blank + batch_blank
+                    batch = []
+            if batch:
+                batch_held, batch_blank = self._import_batch(batch)
+                held, blank = held + batch_held, blank + batch_blank
+        imported = self.count() - before
+        notes = [f"{blank} failed checks without a price"] if blank else []
+        if held:
+            notes.append(f"{held} suspect rows quarantined - see main.py quarantine")
+        print(f"📥 Imported {imported} rows from {csv_path}" + (f" ({'; '.join(notes)})" if notes else ''))
+        return imported
+
+    def _import_batch(self, records):
+        """Write one import batch; returns (rows quarantined, rows without a price)"""
+        # Rows an earlier run already stored, compacted or quarantined are not imported twice
+        records = self._not_imported(records)
+        # Old trackers logged failed checks with a blank price: kept as history, not screened
+        blank = [record for record in records if record['price'] is None]
+        records = [record for record in records if record['price'] is not None]
+        quarantined = []
+        if self.validator is not None:
+            records, quarantined = self.validator.split(records, self.recent_prices)
+            if quarantined:
+                self._quarantine(quarantined)
+        if records or blank:
+            self._write(records + blank)
+        return len(quarantined), len(blank)
+
+    def _not_imported(self, records):
+        seen = set()
+        keys = [(record['timestamp'], record['url']) for record in records]
+        for start in range(0, len(keys), 400):
+            chunk = keys[start:start + 400]
+            wanted = '(timestamp, url) IN (VALUES ' + ', '.join('(?, ?)' for _ in chunk) + ')'
+            values = [value for key in chunk for value in key]
+            seen.update(self.conn.execute(
+                f"SELECT timestamp, url FROM prices WHERE {wanted} "
+                f"UNION SELECT timestamp, url FROM quarantine WHERE {wanted}",
+                values + values
+            ))
+        fresh = [record for record, key in zip(records, keys) if key not in seen]
+        return [record for record in fresh if not self._compacted(record)]
+
+    def _compacted(self, record):
+        """True if the row falls inside a run compaction already folded into price_intervals"""
+        if record['price'] is None:
+            return False
+        return self.conn.execute(
+            """SELECT 1 FROM price_intervals
+               WHERE product_id = ? AND price = ? AND start_ts <= ? AND end_ts >= ? LIMIT 1""",
+            (product_id(record), record['price'], record['timestamp'], record['timestamp'])
+        ).fetchone() is not None
+
+    def read_history(self):
+        """Raw rows plus compacted runs (as their first and last observation)"""
+        import pandas as pd
+
+        self.flush()
+        return pd.read_sql_query(
+            f"SELECT {', '.join(COLUMNS)} FROM price_points ORDER BY timestamp, id", self.conn
+        )
+
+    def iter_history(self, chunksize=250000, columns=None):
+        import pandas as pd
+
+        self.flush()
+        yield from pd.read_sql_query(
+            f"SELECT {', '.join(columns or COLUMNS)} FROM price_points ORDER BY timestamp, id", self.conn,
+            chunksize=chunksize
+        )
+
+    def count(self):
+        self.flush()
+        return self.conn.execute('SELECT COALESCE(SUM(samples), 0) FROM price_points').fetchone()[0]
+
+    def latest(self, product_id):
+        self.flush()
+        row = self.conn.execute(
+            f"SELECT {', '.join(self.LATEST_COLUMNS)} FROM latest_prices WHERE product_id = ?",
+            (product_id,)
+        ).fetchone()
+        return dict(zip(self.LATEST_COLUMNS, row)) if row else None
+
+    def latest_prices(self):
+        self.flush()
+        rows = self.conn.execute(
+            f"SELECT {', '.join(self.LATEST_COLUMNS)} FROM latest_prices ORDER BY site, product_name"
+        )
+        return [dict(zip(self.LATEST_COLUMNS, row)) for row in rows]
+
+    def rebuild_latest_index(self):
+        self.flush()
+        with self.conn:
+            self.conn.execute('DELETE FROM latest_prices')
+            self.conn.execute("""
+                WITH ranked AS (
+                    SELECT product_id, product_name, COALESCE(site, '') AS site, price, timestamp,
+                           ROW_NUMBER() OVER (w ORDER BY timestamp DESC, id DESC) AS rn,
+                           MIN(price) OVER w AS min_price,
+                           MAX(price) OVER w AS max_price,
+                           SUM(samples) OVER w AS samples
+                    FROM price_points
+                    WHERE price IS NOT NULL
+                    WINDOW w AS (PARTITION BY product_id)
+                )
+                INSERT INTO latest_prices
+                    (product_id, product_name, site, last_price, previous_price, min_price, max_price,
+                     last_seen, samples)
+                SELECT cur.product_id, cur.product_name, cur.site, cur.price, prev.price,
+                       cur.min_price, cur.max_price, cur.timestamp, cur.samples
+                FROM ranked cur
+                LEFT JOIN ranked prev ON prev.product_id = cur.product_id AND prev.rn = 2
+                WHERE cur.rn = 1
+            """)
+        return self.conn.execute('SELECT COUNT(*) FROM latest_prices').fetchone()[0]
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+
+def open_store(backend=None, path=None, batch_size=None):
+    """Store configured in settings (STORAGE_BACKEND, DB_FILE/DATA_FILE)"""
+    from config import settings
+
+    backend = backend or getattr(settings, 'STORAGE_BACKEND', 'csv')
+    batch_size = batch_size or getattr(settings, 'STORAGE_BATCH_SIZE', 50)
+
+    from utils.validation import PriceValidator
+
+    validator = PriceValidator.from_settings()
+    if backend == 'csv':
+        return CsvStore(path or settings.DATA_FILE, batch_size, validator)
+    if backend == 'sqlite':
+        store = SQLiteStore(path or settings.DB_FILE, batch_size, validator)
+        # First run on SQLite: bring the old CSV history along
+        if store.created and os.path.exists(settings.DATA_FILE):
+            store.import_csv(settings.DATA_FILE)
+        return store
+    raise ValueError(f"Unknown storage backend: {backend}")
@@ -0,0 +1,55 @@
+# utils/urls.py
+import re
+from urllib.parse import urlsplit, urlunsplit
+
+AMAZON_ASIN_RE = re.compile(r'/(?:dp|gp/product|gp/aw/d)/([A-Z0-9]{10})(?:[/?]|$)', re.IGNORECASE)
+WALMART_ITEM_RE = re.compile(r'/ip/(?:[^/?]+/)?(\d+)(?:[/?]|$)')
+
+
+# Second-level labels country TLDs register under (amazon.co.uk, amazon.com.au, amazon.com.mx)
+SECOND_LEVEL = {'co', 'com', 'net', 'org', 'ac', 'gov', 'edu', 'ne', 'or', 'gob'}
+
+
+def _domain(host):
+    parts = host.split('.')
+    # A country TLD (two letters) under a generic second level is a public suffix itself
+    labels = 3 if len(parts) >= 3 and len(parts[-1]) == 2 and parts[-2] in SECOND_LEVEL else 2
+    return '.'.join(parts[-labels:]) if len(parts) >= labels else host
+
+
+def domain_of(url):
+    """Registrable domain used for rate limiting (www.amazon.com -> amazon.com,
+    www.amazon.co.uk -> amazon.co.uk)"""
+    return _domain((urlsplit(url).hostname or '').lower())
+
+
+def canonical_id(url):
+    """Stable product key: 'amazon:<ASIN>', 'walmart:<item id>', else the bare URL"""
+    return _canonical_id(urlsplit(url))
+
+
+def _canonical_id(parts):
+    host = (parts.hostname or '').lower()
+
+    if 'amazon.' in host:
+        match = AMAZON_ASIN_RE.search(parts.path)
+        if match:
+            return f"amazon:{match.group(1).upper()}"
+    elif 'walmart.' in host:
+        match = WALMART_ITEM_RE.search(parts.path)
+        if match:
+            return f"walmart:{match.group(1)}"
+
+    # Unknown layout: drop query and fragment so tracking params don't split the key
+    return f"{host}{parts.path.rstrip('/')}"
+
+
+def parse_product_url(url):
+    """(domain, canonical id, URL) parsed once; the URL loses its query and fragment
+    (tracking params) when its layout is known"""
+    url = url.strip()
+    parts = urlsplit(url)
+    key = _canonical_id(parts)
+    if key.startswith(('amazon:', 'walmart:')):
+        url = urlunsplit((parts.scheme, parts.netloc, parts.path, '', ''))
+    return _domain((parts.hostname or '').lower()), key, url
@@ -0,0 +1,172 @@
+# utils/validation.py
+from utils.metrics import metrics
+
+# Checked in this order; a row is quarantined for the first one it fails
+REASONS = ['invalid', 'cents_concatenated', 'off_target', 'outlier']
+
+
+class PriceValidator:
+    """Screens each batch of new prices before it is stored or alerted on.
+
+    A price is suspect when it is not a positive number, when it looks like
+    the whole and cent parts run together (26430 for 264.30), when it is
+    wildly off the product's target price, or when it is a robust outlier
+    (median/MAD z-score) against the product's recent accepted prices.
+    The checks are NumPy/pandas column operations over the whole batch, so
+    they cost about the same for one row as for thousands.
+    """
+
+    def __init__(self, window=20, min_history=5, max_z=6.0, min_change=0.3, target_ratio=(0.05, 10.0),
+                 cents_tolerance=0.5):
+        self.window = window
+        self.min_history = min_history
+        self.max_z = max_z
+        # A flat history has a tiny MAD; ignore moves smaller than this fraction of the median
+        self.min_change = min_change
+        self.target_ratio = target_ratio
+        self.cents_tolerance = cents_tolerance
+        self.recent = {}
+        self.counts = {reason: 0 for reason in REASONS}
+
+    @classmethod
+    def from_settings(cls):
+        """Validator configured in settings, or None when validation is off"""
+        from config import settings
+
+        if not getattr(settings, 'VALIDATION_ENABLED', False):
+            return None
+        return cls(
+            window=settings.VALIDATION_WINDOW,
+            min_history=settings.VALIDATION_MIN_HISTORY,
+            max_z=settings.VALIDATION_MAX_Z,
+            min_change=settings.VALIDATION_MIN_CHANGE,
+            target_ratio=settings.VALIDATION_TARGET_RATIO
+        )
+
+    def _seed(self, product_ids, load_history):
+        """Recent prices for products not seen yet; stored values off their target are left out"""
+        missing = [product_id for product_id in product_ids if product_id not in self.recent]
+        if not missing:
+            return
+        history = load_history(missing, self.window) if load_history else {}
+        low, high = self.target_ratio
+        for product_id in missing:
+            self.recent[product_id] = [
+                price for price, target in history.get(product_id, [])
+                if price and price > 0 and not (target and not low <= price / target <= high)
+            ]
+
+    def flag(self, frame):
+        """Reason column (None = fine) for a frame with price, target_price, median, mad, samples"""
+        import numpy as np
+
+        price = frame['price'].to_numpy(dtype=float)
+        target = frame['target_price'].to_numpy(dtype=float)
+        median = frame['median'].to_numpy(dtype=float)
+        mad = frame['mad'].to_numpy(dtype=float)
+        enough = frame['samples'].to_numpy() >= self.min_history
+        low, high = self.target_ratio
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            invalid = ~np.isfinite(price) | (price <= 0)
+            target_ratio = np.where(target > 0, price / target, np.nan)
+            off_target = (target_ratio > high) | (target_ratio < low)
+
+            # Whole and fraction text joined: a whole number ~100x what the product costs
+            reference = np.where(enough, median, target)
+            cents = price / 100
+            cents_concatenated = (
+                (price == np.floor(price))
+                & (price / reference > high)
+                & (np.abs(cents / reference - 1) <= self.cents_tolerance)
+            )
+
+            scale = np.maximum(1.4826 * mad, 0.01 * median)
+            z = np.abs(price - median) / scale
+            outlier = enough & (z > self.max_z) & (np.abs(price / median - 1) > self.min_change)
+
+        reasons = np.select([invalid, cents_concatenated, off_target, outlier], REASONS, default='')
+        return frame.assign(
+            reason=np.where(reasons == '', None, reasons),
+            z=np.round(np.where(enough, z, np.nan), 2),
+            suggested_price=np.where(cents_concatenated, np.round(cents, 2), np.nan)
+        )
+
+    def split(self, records, load_history=None):
+        """(accepted, quarantined) records; quarantined ones carry reason, z and suggested_price.
+
+        load_history(product_ids, limit) -> {product_id: [(price, target_price)]} seeds
+        products the validator hasn't seen yet in this process.
+        """
+        import pandas as pd
+        from utils.storage import product_id
+
+        if not records:
+            return [], []
+        with metrics.span('validate'):
+            ids = [product_id(record) for record in records]
+            self._seed(set(ids), load_history)
+
+            # Median and MAD of every batch product's window, in one groupby each
+            history = pd.DataFrame(
+                [(key, price) for key in set(ids) for price in self.recent[key]],
+                columns=['product_id', 'price']
+            )
+            grouped = history.groupby('product_id')['price']
+            medians = grouped.median()
+            history['deviation'] = (history['price'] - history['product_id'].map(medians)).abs()
+            mads = history.groupby('product_id')['deviation'].median()
+
+            frame = pd.DataFrame({
+                'price': [record['price'] for record in records],
+                'target_price': [record.get('target_price') for record in records],
+                'product_id': ids,
+            })
+            frame['median'] = frame['product_id'].map(medians)
+            frame['mad'] = frame['product_id'].map(mads)
+            frame['samples'] = frame['product_id'].map(grouped.size()).fillna(0)
+            frame = self.flag(frame.astype({'price': float, 'target_price': float}))
+
+        accepted, quarantined = [], []
+        for record, key, reason, z, suggested in zip(records, ids, frame['reason'], frame['z'],
+                                                     frame['suggested_price']):
+            if reason is None:
+                accepted.append(record)
+                window = self.recent[key]
+                window.append(record['price'])
+                del window[:-self.window]
+                continue
+            self.counts[reason] += 1
+            metrics.incr('quarantined', site=record.get('site'), reason=reason)
+            quarantined.append({**record, 'product_id': key, 'reason': reason,
+                                'z': None if pd.isna(z) else float(z),
+                                'suggested_price': None if pd.isna(suggested) else float(suggested)})
+        return accepted, quarantined
+
+    def scan(self, history):
+        """Flag stored history (product_name, site, url, timestamp, price, target_price rows) the way
+        new batches would be: rolling median/MAD of each product's previous `window` prices"""
+        from utils.storage import product_id
+
+        frame = history.dropna(subset=['price']).copy()
+        frame['product_id'] = [product_id(row) for row in
+                               frame[['url', 'site', 'product_name']].to_dict('records')]
+        frame = frame.sort_values(['product_id', 'timestamp'], kind='stable')
+
+        # Only values that pass the checks needing no history may shape the window
+        frame['median'] = frame['mad'] = float('nan')
+        frame['samples'] = 0
+        clean = frame['price'].where(self.flag(frame)['reason'].isna())
+
+        # Each row is judged against the window before it, like a new batch would be
+        keys = frame['product_id']
+        previous = clean.groupby(keys).shift()
+        frame['median'] = self._rolling(previous, keys, 'median')
+        frame['samples'] = self._rolling(previous, keys, 'count').fillna(0)
+        deviation = (previous - frame['median']).abs()
+        frame['mad'] = self._rolling(deviation, keys, 'median')
+        return self.flag(frame)
+
+    def _rolling(self, values, keys, how):
+        rolling = values.groupby(keys).rolling(self.window, min_periods=1)
+        return getattr(rolling, how)().reset_index(level=0, drop=True)
@@ -0,0 +1,144 @@
+# utils/watchdog.py
+import os
+import time
+
+from utils.metrics import metrics
+
+# Chromium-only; undefined elsewhere, which reads as "unknown"
+HEAP_JS = "() => performance.memory ? performance.memory.usedJSHeapSize : null"
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+
+
+def tree_usage(pid):
+    """RSS bytes, CPU seconds and process count of every descendant of pid (Playwright
+    driver, browsers, renderers) from one pass over /proc; None where /proc doesn't exist"""
+    if not os.path.isdir('/proc'):
+        return None
+    processes = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # The command name may contain spaces; fields resume after its ')'
+                fields = f.read().rsplit(')', 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        # fields[1] ppid, [11] utime, [12] stime, [21] rss (pages)
+        processes[int(entry)] = (int(fields[1]), int(fields[11]) + int(fields[12]), int(fields[21]))
+
+    children = {}
+    for child, (parent, _, _) in processes.items():
+        children.setdefault(parent, []).append(child)
+    usage = {'rss_bytes': 0, 'cpu_seconds': 0.0, 'processes': 0}
+    stack = [pid]
+    while stack:
+        for child in children.get(stack.pop(), []):
+            _, ticks, rss_pages = processes[child]
+            usage['rss_bytes'] += rss_pages * PAGE_SIZE
+            usage['cpu_seconds'] += ticks / CLOCK_TICKS
+            usage['processes'] += 1
+            stack.append(child)
+    return usage
+
+
+class ResourceWatchdog:
+    """Watches browser memory so long runs recycle before the OOM killer does it for them.
+
+    Samples the RSS and CPU of this process's children (the Playwright driver
+    and every browser process below it) at most once per `interval`, and
+    the JS heap of a page on request. browser_over_limit() and
+    page_over_limit() tell the pool or engine to restart a browser or recycle
+    a context between jobs; every sample is also exported as a gauge.
+    """
+
+    def __init__(self, browser_rss_mb=1536, context_heap_mb=256, interval=30, heap_check_every=10,
+                 root_pid=None):
+        self.browser_rss_mb = browser_rss_mb
+        self.context_heap_mb = context_heap_mb
+        self.interval = interval
+        # Pages are asked for their heap every N navigations (it costs a round-trip)
+        self.heap_check_every = max(1, heap_check_every)
+        self.root_pid = root_pid or os.getpid()
+        self.last = None
+        self.last_sampled = 0.0
+        self.quiet_until = 0.0
+        self.peak_rss_bytes = 0
+
+    @classmethod
+    def from_settings(cls):
+        """Watchdog configured in settings, or None when it is off"""
+        from config import settings
+
+        if not getattr(settings, 'WATCHDOG_ENABLED', False):
+            return None
+        return cls(
+            browser_rss_mb=settings.WATCHDOG_BROWSER_RSS_MB,
+            context_heap_mb=settings.WATCHDOG_CONTEXT_HEAP_MB,
+            interval=settings.WATCHDOG_INTERVAL,
+            heap_check_every=settings.WATCHDOG_HEAP_CHECK_EVERY
+        )
+
+    def sample(self, force=False):
+        """Latest {'rss_mb', 'cpu_percent', 'processes'} of the browser tree, re-read once per interval"""
+        now = time.monotonic()
+        if not force and self.last is not None and now - self.last_sampled < self.interval:
+            return self.last
+        usage = tree_usage(self.root_pid)
+        if usage is None:
+            return None
+
+        cpu_percent = 0.0
+        if self.last is not None and now > self.last_sampled:
+            # Processes that exited take their CPU time with them; don't report a negative
+            cpu_percent = max(0.0, (usage['cpu_seconds'] - self.last['cpu_seconds'])
+                              / (now - self.last_sampled) * 100)
+        self.last = {
+            'rss_mb': usage['rss_bytes'] / 1_048_576,
+            'cpu_percent': cpu_percent,
+            'cpu_seconds': usage['cpu_seconds'],
+            'processes': usage['processes'],
+        }
+        self.last_sampled = now
+        self.peak_rss_bytes = max(self.peak_rss_bytes, usage['rss_bytes'])
+        metrics.gauge('browser_rss_bytes', usage['rss_bytes'])
+        metrics.gauge('browser_cpu_percent', round(cpu_percent, 1))
+        metrics.gauge('browser_processes', usage['processes'])
+        return self.last
+
+    def browser_over_limit(self):
+        """True when the browser tree has outgrown WATCHDOG_BROWSER_RSS_MB"""
+        if not self.browser_rss_mb or time.monotonic() < self.quiet_until:
+            return False
+        sample = self.sample()
+        return sample is not None and sample['rss_mb'] > self.browser_rss_mb
+
+    def restarted(self):
+        """A browser was replaced; let the old one's memory drain before judging again"""
+        metrics.incr('browser_restarts', reason='memory')
+        self.quiet_until = time.monotonic() + 2 * self.interval
+        self.last = None
+
+    def heap_check_due(self, navigations):
+        return bool(self.context_heap_mb) and navigations > 0 and navigations % self.heap_check_every == 0
+
+    def page_over_limit(self, page, site=None):
+        """True when a page's JS heap is over WATCHDOG_CONTEXT_HEAP_MB"""
+        try:
+            heap = page.evaluate(HEAP_JS)
+        except Exception:
+            return False
+        if heap is None:
+            return False
+        metrics.gauge('context_heap_bytes', heap, site=site)
+        return heap / 1_048_576 > self.context_heap_mb
+
+    def stats(self):
+        sample = self.last or self.sample(force=True) or {}
+        return {
+            'rss_mb': sample.get('rss_mb'),
+            'peak_rss_mb': self.peak_rss_bytes / 1_048_576,
+            'processes': sample.get('processes'),
+        }